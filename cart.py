@@ -0,0 +1,379 @@
+"""The cart and the pricing rules. Money is kept in whole cents."""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+# --- CART ---
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """Converts a price (Decimal from MySQL, float from SQLite, str, ...) to whole cents."""
+    cents = Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP) * 100
+    return int(cents)
+
+
+def from_cents(cents):
+    """Whole cents back to an exact Decimal amount, for storage."""
+    return Decimal(cents).scaleb(-2)
+
+
+def format_cents(cents):
+    return f"${cents // 100}.{cents % 100:02d}" if cents >= 0 else f"-{format_cents(-cents)}"
+
+
+class CartLine:
+    """One menu item in the cart. Money is whole cents, so totals never drift."""
+    __slots__ = ('item_id', 'name', 'category', 'price_cents', 'quantity')
+
+    def __init__(self, item_id, name, category, price_cents, quantity):
+        self.item_id = item_id
+        self.name = name
+        self.category = category # For category-wide pricing rules
+        self.price_cents = price_cents
+        self.quantity = quantity
+
+    @property
+    def total_cents(self):
+        return self.price_cents * self.quantity
+
+
+class CartSnapshot(namedtuple('CartSnapshot', 'total_cents item_count items')):
+    """Frozen copy of a cart. `items` is in the form create_order takes."""
+    __slots__ = ()
+
+
+class Cart:
+    """The current order: lines by item_id plus a running subtotal and item count.
+
+    Every change is O(1) and adjusts subtotal_cents and item_count as it
+    goes, so nothing ever re-sums the cart. Listeners are called as
+    listener(event, item_id) with 'add', 'update', 'remove' or 'clear'
+    (item_id None), so views can redraw only what changed.
+    """
+    def __init__(self):
+        self._lines = {}  # item_id -> CartLine, in the order they were added
+        self.subtotal_cents = 0
+        self.item_count = 0  # Sum of the quantities
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event, item_id=None):
+        for listener in list(self._listeners):
+            listener(event, item_id)
+
+    def add(self, item, quantity):
+        """Adds `quantity` of a menu row, merging with the line already there."""
+        item_id = item['item_id']
+        line = self._lines.get(item_id)
+        if line is not None:
+            self.set_quantity(item_id, line.quantity + quantity)
+            return line
+        line = self._lines[item_id] = CartLine(item_id, item['name'], item.get('category'),
+                                               to_cents(item['price']), quantity)
+        self.subtotal_cents += line.total_cents
+        self.item_count += quantity
+        self._notify('add', item_id)
+        return line
+
+    def set_quantity(self, item_id, quantity):
+        """Changes a line's quantity; 0 or less removes it."""
+        if quantity <= 0:
+            self.remove(item_id)
+            return
+        line = self._lines.get(item_id)
+        if line is None or line.quantity == quantity:
+            return
+        self.subtotal_cents += line.price_cents * (quantity - line.quantity)
+        self.item_count += quantity - line.quantity
+        line.quantity = quantity
+        self._notify('update', item_id)
+
+    def remove(self, item_id):
+        line = self._lines.pop(item_id, None)
+        if line is None:
+            return
+        self.subtotal_cents -= line.total_cents
+        self.item_count -= line.quantity
+        self._notify('remove', item_id)
+
+    def clear(self):
+        self._lines = {}
+        self.subtotal_cents = 0
+        self.item_count = 0
+        self._notify('clear')
+
+    def get(self, item_id):
+        return self._lines.get(item_id)
+
+    def __contains__(self, item_id):
+        return item_id in self._lines
+
+    def __iter__(self):
+        return iter(self._lines.values())
+
+    def __len__(self):
+        return len(self._lines)
+
+    def snapshot(self):
+        """Copies the cart for create_order, so it can keep changing meanwhile."""
+        items = [{'item_id': line.item_id, 'quantity': line.quantity,
+                  'price': from_cents(line.price_cents)}
+                 for line in self._lines.values()]
+        return CartSnapshot(self.subtotal_cents, self.item_count, items)
+
+
+# --- PRICING RULES ---
+# Rules live in the pricing_rules table and are loaded once at startup:
+#   percent - percentage off each matching line (value = percent)
+#   amount  - money off each matching unit; with no item/category, off the order
+#   combo   - money off per complete set of combo_items ("3,7,12") in the cart
+#   tax     - percentage added to each matching line after its discount
+# A rule matches by item_id, else by category, else every line. Only the
+# best discount applies to a line (discounts don't stack); tax rates add
+# up. starts_at/ends_at (a daily window such as happy hour, may cross
+# midnight) and days ('0' = Monday ... '6' = Sunday) limit when it applies.
+def percent_of(cents, basis_points):
+    """basis_points/100 percent of an amount, rounded half-up to the cent."""
+    return (cents * basis_points + 5000) // 10000
+
+
+def _minutes(value):
+    """Minutes after midnight of a TIME column (timedelta from MySQL, text from SQLite)."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    hours, minutes = str(value).split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class PricingRule:
+    __slots__ = ('rule_id', 'name', 'kind', 'item_id', 'category', 'combo_items',
+                 'value', 'starts_at', 'ends_at', 'days')
+    KINDS = ('percent', 'amount', 'combo', 'tax')
+
+    def __init__(self, row):
+        self.rule_id = row['rule_id']
+        self.name = row['name']
+        self.kind = row['kind']
+        if self.kind not in self.KINDS:
+            raise ValueError(f"unknown pricing rule kind {self.kind!r}")
+        self.item_id = row.get('item_id')
+        self.category = row.get('category')
+        self.combo_items = frozenset(int(part) for part in (row.get('combo_items') or '').split(',')
+                                     if part.strip())
+        # Percentages as basis points, money as cents: integer maths from here on
+        if self.kind in ('percent', 'tax'):
+            self.value = int(Decimal(str(row['value'])) * 100)
+        else:
+            self.value = to_cents(row['value'])
+        self.starts_at = _minutes(row.get('starts_at'))
+        self.ends_at = _minutes(row.get('ends_at'))
+        days = row.get('days')
+        self.days = frozenset(int(day) for day in days) if days else None
+
+    @property
+    def windowed(self):
+        return self.starts_at is not None and self.ends_at is not None
+
+    def active_at(self, now):
+        if self.days is not None and now.weekday() not in self.days:
+            return False
+        if not self.windowed:
+            return True
+        minute = now.hour * 60 + now.minute
+        if self.starts_at <= self.ends_at:
+            return self.starts_at <= minute < self.ends_at
+        return minute >= self.starts_at or minute < self.ends_at # Crosses midnight
+
+
+LinePrice = namedtuple('LinePrice', 'subtotal discount tax')
+
+PricedTotals = namedtuple('PricedTotals', 'subtotal discount tax total')
+
+
+class PricingPlan:
+    """The rules active over one stretch of time, indexed for pricing.
+
+    Line rules are filed by item_id and category; the terms for an
+    (item_id, category) pair are worked out on first use and memoized, so
+    pricing a line is a dict lookup plus a little arithmetic. Combos are
+    indexed by their member items so a change to one line only revisits
+    the combos it belongs to.
+    """
+    def __init__(self, rules, compiled_at, expires):
+        self.compiled_at = compiled_at
+        self.expires = expires # First moment some rule switches on or off
+        self.by_item = {}
+        self.by_category = {}
+        self.everywhere = []
+        self.combos = []
+        self.combos_by_item = {}
+        self.order_discount = 0 # Fixed money off the whole order
+        self._terms = {}
+        for rule in rules:
+            if rule.kind == 'combo':
+                if rule.combo_items:
+                    self.combos.append(rule)
+                    for item_id in rule.combo_items:
+                        self.combos_by_item.setdefault(item_id, []).append(rule)
+            elif rule.item_id is not None:
+                self.by_item.setdefault(rule.item_id, []).append(rule)
+            elif rule.category is not None:
+                self.by_category.setdefault(rule.category, []).append(rule)
+            elif rule.kind == 'amount':
+                self.order_discount += rule.value
+            else:
+                self.everywhere.append(rule)
+
+    def line_terms(self, item_id, category):
+        """Returns (discount rules, total tax in basis points) for a line."""
+        key = (item_id, category)
+        terms = self._terms.get(key)
+        if terms is None:
+            rules = (self.by_item.get(item_id, []) + self.by_category.get(category, [])
+                     + self.everywhere)
+            discounts = tuple((rule.kind, rule.value) for rule in rules if rule.kind != 'tax')
+            tax = sum(rule.value for rule in rules if rule.kind == 'tax')
+            terms = self._terms[key] = (discounts, tax)
+        return terms
+
+    def price_line(self, line):
+        discounts, tax = self.line_terms(line.item_id, line.category)
+        subtotal = line.total_cents
+        discount = 0
+        for kind, value in discounts:
+            if kind == 'percent':
+                amount = percent_of(subtotal, value)
+            else:
+                amount = min(value, line.price_cents) * line.quantity
+            if amount > discount:
+                discount = amount
+        return LinePrice(subtotal, discount, percent_of(subtotal - discount, tax) if tax else 0)
+
+    def combo_discount(self, rule, cart):
+        """Money off for every complete set of the combo's items in the cart."""
+        sets = None
+        for item_id in rule.combo_items:
+            line = cart.get(item_id)
+            if line is None:
+                return 0
+            sets = line.quantity if sets is None else min(sets, line.quantity)
+        return rule.value * sets
+
+
+class PricingEngine:
+    """Holds the pricing rules and hands out the plan for the current time.
+
+    A plan is compiled when the rules are loaded and again only when the
+    clock passes the next happy-hour start or end (or midnight), so pricing
+    never looks at the inactive rules.
+    """
+    def __init__(self, rules=()):
+        self.load(rules)
+
+    def load(self, rows):
+        """Replaces the rules with rows from DatabaseManager.get_pricing_rules."""
+        rules = []
+        for row in rows:
+            try:
+                rules.append(row if isinstance(row, PricingRule) else PricingRule(row))
+            except (KeyError, ValueError, ArithmeticError) as e:
+                print(f"Skipping pricing rule {row.get('rule_id')}: {e}")
+        self.rules = rules
+        self._plan = None
+
+    def plan(self, now=None):
+        now = now or datetime.now()
+        plan = self._plan
+        if plan is None or now >= plan.expires or now < plan.compiled_at:
+            plan = self._plan = self._compile(now)
+        return plan
+
+    def _compile(self, now):
+        active = [rule for rule in self.rules if rule.active_at(now)]
+        # The plan holds until the next window edge today, or midnight
+        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        minute = now.hour * 60 + now.minute
+        edges = [edge for rule in self.rules if rule.windowed
+                 for edge in (rule.starts_at, rule.ends_at) if edge > minute]
+        expires = start_of_day + timedelta(minutes=min(edges, default=24 * 60))
+        return PricingPlan(active, now.replace(second=0, microsecond=0), expires)
+
+
+class CartPricer:
+    """Prices a Cart and keeps the result current as the cart changes.
+
+    A change to one line reprices that line and the combos containing it,
+    adjusting the running totals, so the cost of an edit doesn't grow with
+    the size of the cart. A new plan (rules reloaded, happy hour started)
+    reprices every line once.
+    """
+    def __init__(self, cart, engine):
+        self.cart = cart
+        self.engine = engine
+        self._plan = None
+        self._lines = {}   # item_id -> LinePrice
+        self._combos = {}  # combo rule_id -> discount
+        self.line_discount = 0
+        self.combo_discount = 0
+        self.tax = 0
+        cart.add_listener(self.on_cart_change)
+
+    def on_cart_change(self, event, item_id):
+        plan = self.engine.plan()
+        if plan is not self._plan or event == 'clear':
+            self._reprice_all(plan)
+            return
+        self._reprice_line(item_id)
+        for rule in plan.combos_by_item.get(item_id, ()):
+            self._reprice_combo(rule)
+
+    def totals(self, now=None):
+        plan = self.engine.plan(now)
+        if plan is not self._plan:
+            self._reprice_all(plan)
+        subtotal = self.cart.subtotal_cents
+        # Combo and order discounts come off the taxed amount, never below zero
+        taxed = subtotal - self.line_discount + self.tax
+        extra = self.combo_discount + (plan.order_discount if self.cart else 0)
+        discount = self.line_discount + min(extra, taxed)
+        return PricedTotals(subtotal, discount, self.tax, subtotal - discount + self.tax)
+
+    @property
+    def expires(self):
+        """When the current plan runs out (the totals may change then)."""
+        return self.engine.plan().expires
+
+    def _reprice_all(self, plan):
+        self._plan = plan
+        self._lines, self._combos = {}, {}
+        self.line_discount = self.combo_discount = self.tax = 0
+        for line in self.cart:
+            self._reprice_line(line.item_id)
+        for rule in plan.combos:
+            self._reprice_combo(rule)
+
+    def _reprice_line(self, item_id):
+        old = self._lines.pop(item_id, None)
+        if old is not None:
+            self.line_discount -= old.discount
+            self.tax -= old.tax
+        line = self.cart.get(item_id)
+        if line is None:
+            return
+        price = self._lines[item_id] = self._plan.price_line(line)
+        self.line_discount += price.discount
+        self.tax += price.tax
+
+    def _reprice_combo(self, rule):
+        discount = self._plan.combo_discount(rule, self.cart)
+        self.combo_discount += discount - self._combos.get(rule.rule_id, 0)
+        self._combos[rule.rule_id] = discount
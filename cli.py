@@ -0,0 +1,252 @@
+"""Command line entry point: bulk import, maintenance, reports, exports, the order
+service, and (without a command) the till app.
+"""
+import sys
+import argparse
+import csv
+import itertools
+import json
+import time
+from decimal import Decimal
+
+from cart import from_cents, to_cents
+from database import (BULK_IMPORT_CONFIG, RECOMMEND_CONFIG, ROLLUP_CONFIG, DatabaseStartupError,
+                      open_database)
+from exports import EXPORT_CONFIG, EXPORT_TABLES, export_command
+from reports import PERIOD_REPORT_CONFIG, PERIOD_REPORTS, period_report_command, report_command
+from service import SERVICE_CONFIG, serve_command
+
+# --- BULK ORDER IMPORT ---
+# Orders from delivery partners and offline tills, streamed from a file so
+# memory use stays flat however big the file is.
+def order_from_record(record):
+    """Turns one parsed order into the (user_id, total_amount, items) form.
+
+    Amounts stay exact: prices are parsed as decimals and summed in cents.
+    A total_amount that isn't the sum of the items is rejected.
+    """
+    items, item_cents = [], 0
+    for item in record['items']:
+        price_cents, quantity = to_cents(item['price']), int(item['quantity'])
+        items.append({'item_id': int(item['item_id']), 'quantity': quantity,
+                      'price': from_cents(price_cents)})
+        item_cents += price_cents * quantity
+    if not items:
+        raise ValueError("order has no items")
+    total_amount = record.get('total_amount')
+    total_cents = item_cents if total_amount in (None, '') else to_cents(total_amount)
+    if total_cents != item_cents:
+        raise ValueError(f"total_amount {from_cents(total_cents)} doesn't match "
+                         f"the items' {from_cents(item_cents)}")
+    return (int(record['user_id']), from_cents(total_cents), items)
+
+
+def read_orders_jsonl(path):
+    """Yields orders from a JSON-lines file, one order object per line.
+
+    Each line looks like {"user_id": 1, "total_amount": 12.5,
+    "items": [{"item_id": 3, "quantity": 2, "price": 6.25}]};
+    total_amount may be left out and is then summed from the items; if
+    given, it must match that sum.
+    """
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield order_from_record(json.loads(line, parse_float=Decimal))
+            except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+                print(f"Skipping line {line_no}: {e}")
+
+
+def read_orders_csv(path):
+    """Yields orders from a CSV file with one row per ordered item.
+
+    Columns: order_ref, user_id, item_id, quantity, price and optionally
+    total_amount. Rows of the same order must be next to each other.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        by_order = itertools.groupby(csv.DictReader(f), key=lambda row: row['order_ref'])
+        for order_ref, rows in by_order:
+            rows = list(rows)
+            try:
+                yield order_from_record({
+                    'user_id': rows[0]['user_id'],
+                    'total_amount': rows[0].get('total_amount'),
+                    'items': rows
+                })
+            except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+                print(f"Skipping order {order_ref}: {e}")
+
+
+def import_orders_command(args):
+    reader = read_orders_csv if args.format == 'csv' else read_orders_jsonl
+    try:
+        db = open_database()
+    except DatabaseStartupError as err:
+        print(f"{err.title}: {err}")
+        return 1
+    start = time.perf_counter()
+    saved, failed = db.create_orders(reader(args.path), chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"Imported {saved} order(s) in {elapsed:.1f}s; {failed} failed.")
+    db.close()
+    return 0 if failed == 0 else 1
+
+
+def rollup_sales_command(args):
+    """Adds orders from before the rollup tables existed to the sales rollups."""
+    try:
+        db = open_database()
+    except DatabaseStartupError as err:
+        print(f"{err.title}: {err}")
+        return 1
+    start = time.perf_counter()
+    try:
+        covered = db.catch_up_rollups(
+            chunk_size=args.chunk_size,
+            progress=lambda done_to, history_to: print(
+                f"Rolled up to order {done_to} of {history_to}"))
+    except Exception as err:
+        print(f"Rollup Error: {err}")
+        return 1
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+    print(f"Rolled up {covered} order id(s) in {elapsed:.1f}s; the sales rollups are complete.")
+    return 0
+
+
+def rebuild_pairs_command(args):
+    """Recounts the "frequently ordered together" pairs from every order."""
+    try:
+        db = open_database()
+    except DatabaseStartupError as err:
+        print(f"{err.title}: {err}")
+        return 1
+    start = time.perf_counter()
+    try:
+        pairs = db.rebuild_item_pairs(
+            chunk_size=args.chunk_size,
+            progress=lambda done_to, last_id: print(f"Counted up to order {done_to} of {last_id}"))
+    except Exception as err:
+        print(f"Rebuild Error: {err}")
+        return 1
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+    print(f"Counted {pairs} item pair(s) in {elapsed:.1f}s.")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Restaurant Management System. "
+                                                 "Run without a command to start the app.")
+    parser.add_argument('--startup-profile', action='store_true',
+                        help="Print how long each startup phase took, "
+                             "and connection health on exit")
+    parser.add_argument('--service', metavar='HOST:PORT',
+                        help="Use a running order service instead of connecting to the database")
+    parser.add_argument('--till', metavar='NAME',
+                        help="Name of this till, which picks its order journal "
+                             "(default: the host name)")
+    commands = parser.add_subparsers(dest='command')
+
+    import_parser = commands.add_parser('import-orders',
+                                        help="Bulk-load orders from a CSV or JSON-lines file")
+    import_parser.add_argument('path', help="File to import")
+    import_parser.add_argument('--format', choices=('csv', 'jsonl'),
+                               help="File format (default: from the file extension)")
+    import_parser.add_argument('--chunk-size', type=int, default=BULK_IMPORT_CONFIG['chunk_size'],
+                               help="Orders committed per transaction")
+
+    rollup_parser = commands.add_parser('rollup-sales',
+                                        help="Add orders saved before the sales rollups to them")
+    rollup_parser.add_argument('--chunk-size', type=int, default=ROLLUP_CONFIG['chunk_size'],
+                               help="Order ids rolled up per transaction")
+
+    pairs_parser = commands.add_parser(
+        'rebuild-pairs', help="Recount which items are ordered together from every order")
+    pairs_parser.add_argument('--chunk-size', type=int,
+                              default=RECOMMEND_CONFIG['rebuild_chunk_size'],
+                              help="Order ids counted per statement")
+
+    report_parser = commands.add_parser(
+        'report', help="Margin, basket size and heatmap reports over all order lines")
+    report_parser.add_argument('report', choices=('margins', 'baskets', 'heatmap'))
+    report_parser.add_argument('--since', metavar='YYYY-MM-DD', help="First day to include")
+    report_parser.add_argument('--until', metavar='YYYY-MM-DD', help="Last day to include")
+    report_parser.add_argument('--measure', choices=('revenue_cents', 'quantity', 'orders'),
+                               default='revenue_cents', help="What the heatmap shows")
+    report_parser.add_argument('--no-cache', action='store_true',
+                               help="Read every line from the database instead of the column cache")
+
+    period_parser = commands.add_parser(
+        'period-report', help="Long-range breakdowns computed in parallel, one process per core")
+    period_parser.add_argument('report', choices=tuple(PERIOD_REPORTS))
+    period_parser.add_argument('--since', metavar='YYYY-MM-DD',
+                               help="First day (default: the first order)")
+    period_parser.add_argument('--until', metavar='YYYY-MM-DD',
+                               help="Last day (default: the last order)")
+    period_parser.add_argument('--workers', type=int,
+                               help="Worker processes (default: one per core)")
+    period_parser.add_argument('--shard-days', type=int, default=PERIOD_REPORT_CONFIG['shard_days'],
+                               help="Days of orders per shard")
+    period_parser.add_argument('--output', metavar='PATH',
+                               help="Write the CSV here instead of to stdout")
+
+    export_parser = commands.add_parser(
+        'export', help="Write new orders, order lines and feedback to CSV and .rcol files")
+    export_parser.add_argument('--tables', nargs='+', choices=tuple(EXPORT_TABLES),
+                               default=list(EXPORT_TABLES), help="Tables to export (default: all)")
+    export_parser.add_argument('--format', choices=('csv', 'rcol', 'both'), default='both',
+                               help="File format(s) to write")
+    export_parser.add_argument('--dir', default=EXPORT_CONFIG['dir'],
+                               help="Where to write the files")
+    export_parser.add_argument('--full', action='store_true',
+                               help="Export every row, not just those after the last export")
+    export_parser.add_argument('--chunk-rows', type=int, default=EXPORT_CONFIG['chunk_rows'],
+                               help="Rows read and written at a time")
+    export_parser.add_argument('--grace-seconds', type=int,
+                               default=EXPORT_CONFIG['commit_grace_seconds'],
+                               help="Leave rows written this recently for the next export")
+
+    serve_parser = commands.add_parser(
+        'serve', help="Run the order service that tills connect to with --service")
+    serve_parser.add_argument('--host', default=SERVICE_CONFIG['host'],
+                              help="Address to listen on")
+    serve_parser.add_argument('--port', type=int, default=SERVICE_CONFIG['port'],
+                              help="Port to listen on")
+    serve_parser.add_argument('--group-commit', action='store_true',
+                              help="Write orders arriving together in shared transactions")
+
+    args = parser.parse_args(argv)
+    if args.command == 'import-orders':
+        if args.format is None:
+            args.format = 'csv' if args.path.lower().endswith('.csv') else 'jsonl'
+        return import_orders_command(args)
+    if args.command == 'rollup-sales':
+        return rollup_sales_command(args)
+    if args.command == 'rebuild-pairs':
+        return rebuild_pairs_command(args)
+    if args.command == 'report':
+        return report_command(args)
+    if args.command == 'period-report':
+        return period_report_command(args)
+    if args.command == 'export':
+        return export_command(args)
+    if args.command == 'serve':
+        return serve_command(args)
+
+    service = None
+    if args.service:
+        host, _, port = args.service.rpartition(':')
+        if not host or not port.isdigit():
+            parser.error("--service must look like HOST:PORT")
+        service = (host, int(port))
+    from interface import run_app # Only the app needs Tk
+    return run_app(startup_profile=args.startup_profile, service=service, till=args.till)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2520 @@
+"""Storage for the restaurant system: settings, schema, backends, caches and the order journal.
+
+Nothing here imports Tk, so the order service, reports and exports run headless.
+"""
+import sqlite3
+import functools
+import hashlib  # For hashing passwords
+import heapq
+import bisect
+import itertools
+import json
+import os
+import threading
+import queue
+import re
+import socket
+import time
+import uuid
+import weakref
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+
+# mysql.connector is slow to import, so it is loaded on first use
+# (MySQLBackend.load_driver) rather than before the window can open.
+mysql = None
+
+# --- !!! IMPORTANT: CONFIGURE YOUR MYSQL CONNECTION HERE !!! ---
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',         # Your MySQL username
+    'password': 'patlu', # Your MySQL password
+    'database': 'restaurant_db' # The database to create/use
+}
+
+# --- STORAGE BACKEND ---
+# 'mysql' talks to the server in DB_CONFIG; 'sqlite' uses an embedded
+# database file (no server needed, e.g. for a single till or benchmarks).
+DB_BACKEND = 'mysql'
+
+SQLITE_CONFIG = {
+    'path': 'restaurant.db', # Database file, created on first run
+    'busy_timeout': 10.0,    # Seconds to wait for another writer
+    'cached_statements': 256 # Compiled statements kept per connection
+}
+
+# --- SCHEMA MIGRATIONS ---
+# Applied in order at startup; the highest applied version is kept in the
+# schema_version table, so a launch against a current schema costs one
+# query. Each migration lists its statements per backend. Statements are
+# written so re-running them on a database that already has the object is
+# harmless (those "already exists" errors are skipped).
+SCHEMA_VERSION_TABLE = {
+    'mysql': """CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    'sqlite': """CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+}
+
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': "base tables",
+        'mysql': [
+            """CREATE TABLE IF NOT EXISTS users (
+                user_id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(50) NOT NULL UNIQUE,
+                password_hash VARCHAR(64) NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS menu_items (
+                item_id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                description TEXT,
+                price DECIMAL(10, 2) NOT NULL,
+                category VARCHAR(50)
+            )""",
+            """CREATE TABLE IF NOT EXISTS orders (
+                order_id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT,
+                total_amount DECIMAL(10, 2) NOT NULL,
+                order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS order_items (
+                order_item_id INT AUTO_INCREMENT PRIMARY KEY,
+                order_id INT NOT NULL,
+                item_id INT NOT NULL,
+                quantity INT NOT NULL,
+                price_per_item DECIMAL(10, 2) NOT NULL,
+                FOREIGN KEY (order_id) REFERENCES orders(order_id),
+                FOREIGN KEY (item_id) REFERENCES menu_items(item_id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS feedback (
+                feedback_id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT,
+                rating INT NOT NULL,
+                comments TEXT,
+                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )""",
+        ],
+        'sqlite': [
+            """CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT NOT NULL UNIQUE,
+                password_hash TEXT NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS menu_items (
+                item_id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                description TEXT,
+                price REAL NOT NULL,
+                category TEXT
+            )""",
+            """CREATE TABLE IF NOT EXISTS orders (
+                order_id INTEGER PRIMARY KEY,
+                user_id INTEGER REFERENCES users(user_id),
+                total_amount REAL NOT NULL,
+                order_date TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )""",
+            """CREATE TABLE IF NOT EXISTS order_items (
+                order_item_id INTEGER PRIMARY KEY,
+                order_id INTEGER NOT NULL REFERENCES orders(order_id),
+                item_id INTEGER NOT NULL REFERENCES menu_items(item_id),
+                quantity INTEGER NOT NULL,
+                price_per_item REAL NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS feedback (
+                feedback_id INTEGER PRIMARY KEY,
+                user_id INTEGER REFERENCES users(user_id),
+                rating INTEGER NOT NULL,
+                comments TEXT,
+                submitted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )""",
+        ],
+    },
+    {
+        # Bumped on every menu change so the menu cache can tell with one
+        # primary-key read whether anything changed, and which rows
+        'version': 2,
+        'description': "catalog version for the menu cache",
+        'mysql': [
+            "ALTER TABLE menu_items ADD COLUMN row_version BIGINT NOT NULL DEFAULT 0",
+            "CREATE INDEX idx_menu_items_row_version ON menu_items (row_version)",
+            """CREATE TABLE IF NOT EXISTS catalog_version (
+                id INT PRIMARY KEY,
+                version BIGINT NOT NULL
+            )""",
+            "INSERT IGNORE INTO catalog_version (id, version) VALUES (1, 0)",
+            """CREATE TRIGGER menu_items_insert_version BEFORE INSERT ON menu_items
+            FOR EACH ROW BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                SET NEW.row_version = (SELECT version FROM catalog_version WHERE id = 1);
+            END""",
+            """CREATE TRIGGER menu_items_update_version BEFORE UPDATE ON menu_items
+            FOR EACH ROW BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                SET NEW.row_version = (SELECT version FROM catalog_version WHERE id = 1);
+            END""",
+            """CREATE TRIGGER menu_items_delete_version AFTER DELETE ON menu_items
+            FOR EACH ROW UPDATE catalog_version SET version = version + 1 WHERE id = 1""",
+        ],
+        'sqlite': [
+            "ALTER TABLE menu_items ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0",
+            "CREATE INDEX IF NOT EXISTS idx_menu_items_row_version ON menu_items (row_version)",
+            """CREATE TABLE IF NOT EXISTS catalog_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )""",
+            "INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)",
+            """CREATE TRIGGER IF NOT EXISTS menu_items_insert_version AFTER INSERT ON menu_items
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                UPDATE menu_items SET row_version = (SELECT version FROM catalog_version WHERE id = 1)
+                WHERE item_id = NEW.item_id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS menu_items_update_version AFTER UPDATE ON menu_items
+            WHEN NEW.row_version = OLD.row_version
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                UPDATE menu_items SET row_version = (SELECT version FROM catalog_version WHERE id = 1)
+                WHERE item_id = NEW.item_id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS menu_items_delete_version AFTER DELETE ON menu_items
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+            END""",
+        ],
+    },
+    {
+        # Orders by user and by date, items by order and by menu item. On
+        # MySQL these also take over the single-column indexes InnoDB made
+        # for the foreign keys.
+        'version': 3,
+        'description': "indexes for order and report queries",
+        'mysql': [
+            "CREATE INDEX idx_orders_user_date ON orders (user_id, order_date)",
+            "CREATE INDEX idx_orders_date ON orders (order_date)",
+            "CREATE INDEX idx_order_items_order_item ON order_items (order_id, item_id)",
+            "CREATE INDEX idx_order_items_item_order ON order_items (item_id, order_id)",
+        ],
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_orders_user_date ON orders (user_id, order_date)",
+            "CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (order_date)",
+            "CREATE INDEX IF NOT EXISTS idx_order_items_order_item ON order_items (order_id, item_id)",
+            "CREATE INDEX IF NOT EXISTS idx_order_items_item_order ON order_items (item_id, order_id)",
+        ],
+    },
+    {
+        # Serves both the category list and the keyset-paginated category tabs
+        'version': 4,
+        'description': "index for paging the menu by category",
+        'mysql': [
+            "CREATE INDEX idx_menu_items_category ON menu_items (category, item_id)",
+        ],
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_menu_items_category ON menu_items (category, item_id)",
+        ],
+    },
+    {
+        # See PRICING RULES for what the columns mean
+        'version': 5,
+        'description': "pricing rules",
+        'mysql': [
+            """CREATE TABLE IF NOT EXISTS pricing_rules (
+                rule_id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                kind VARCHAR(10) NOT NULL,
+                item_id INT NULL,
+                category VARCHAR(50) NULL,
+                combo_items VARCHAR(255) NULL,
+                value DECIMAL(10, 2) NOT NULL,
+                starts_at TIME NULL,
+                ends_at TIME NULL,
+                days VARCHAR(7) NULL,
+                active BOOLEAN NOT NULL DEFAULT TRUE,
+                FOREIGN KEY (item_id) REFERENCES menu_items(item_id)
+            )""",
+        ],
+        'sqlite': [
+            """CREATE TABLE IF NOT EXISTS pricing_rules (
+                rule_id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                kind TEXT NOT NULL CHECK (kind IN ('percent', 'amount', 'combo', 'tax')),
+                item_id INTEGER REFERENCES menu_items(item_id),
+                category TEXT,
+                combo_items TEXT,
+                value REAL NOT NULL,
+                starts_at TEXT,
+                ends_at TEXT,
+                days TEXT,
+                active INTEGER NOT NULL DEFAULT 1
+            )""",
+        ],
+    },
+    {
+        # Orders replayed from the order journal carry the key they were
+        # journaled under; the unique index stops a replay saving one twice
+        'version': 6,
+        'description': "idempotency keys for journaled orders",
+        'mysql': [
+            "ALTER TABLE orders ADD COLUMN order_key CHAR(32) NULL",
+            "CREATE UNIQUE INDEX idx_orders_order_key ON orders (order_key)",
+        ],
+        'sqlite': [
+            "ALTER TABLE orders ADD COLUMN order_key TEXT",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_order_key ON orders (order_key)",
+        ],
+    },
+    {
+        # See SALES ROLLUPS. Orders already in the table when this runs are
+        # left to the catch-up job (rollup-sales): history_to marks them.
+        'version': 7,
+        'description': "sales rollup tables",
+        'mysql': [
+            """CREATE TABLE IF NOT EXISTS sales_daily (
+                sale_date DATE PRIMARY KEY,
+                order_count INT NOT NULL,
+                quantity BIGINT NOT NULL,
+                revenue_cents BIGINT NOT NULL,
+                net_cents BIGINT NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS sales_hourly (
+                sale_date DATE NOT NULL,
+                sale_hour TINYINT NOT NULL,
+                order_count INT NOT NULL,
+                quantity BIGINT NOT NULL,
+                revenue_cents BIGINT NOT NULL,
+                net_cents BIGINT NOT NULL,
+                PRIMARY KEY (sale_date, sale_hour)
+            )""",
+            """CREATE TABLE IF NOT EXISTS sales_item_daily (
+                sale_date DATE NOT NULL,
+                item_id INT NOT NULL,
+                quantity BIGINT NOT NULL,
+                revenue_cents BIGINT NOT NULL,
+                PRIMARY KEY (sale_date, item_id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS sales_category_daily (
+                sale_date DATE NOT NULL,
+                category VARCHAR(50) NOT NULL,
+                quantity BIGINT NOT NULL,
+                revenue_cents BIGINT NOT NULL,
+                PRIMARY KEY (sale_date, category)
+            )""",
+            """CREATE TABLE IF NOT EXISTS sales_rollup_state (
+                id INT PRIMARY KEY,
+                history_to BIGINT NOT NULL,
+                rolled_up_to BIGINT NOT NULL
+            )""",
+            """INSERT IGNORE INTO sales_rollup_state (id, history_to, rolled_up_to)
+            SELECT 1, COALESCE(MAX(order_id), 0), 0 FROM orders""",
+        ],
+        'sqlite': [
+            """CREATE TABLE IF NOT EXISTS sales_daily (
+                sale_date TEXT PRIMARY KEY,
+                order_count INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                revenue_cents INTEGER NOT NULL,
+                net_cents INTEGER NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS sales_hourly (
+                sale_date TEXT NOT NULL,
+                sale_hour INTEGER NOT NULL,
+                order_count INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                revenue_cents INTEGER NOT NULL,
+                net_cents INTEGER NOT NULL,
+                PRIMARY KEY (sale_date, sale_hour)
+            )""",
+            """CREATE TABLE IF NOT EXISTS sales_item_daily (
+                sale_date TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                revenue_cents INTEGER NOT NULL,
+                PRIMARY KEY (sale_date, item_id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS sales_category_daily (
+                sale_date TEXT NOT NULL,
+                category TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                revenue_cents INTEGER NOT NULL,
+                PRIMARY KEY (sale_date, category)
+            )""",
+            """CREATE TABLE IF NOT EXISTS sales_rollup_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                history_to INTEGER NOT NULL,
+                rolled_up_to INTEGER NOT NULL
+            )""",
+            """INSERT OR IGNORE INTO sales_rollup_state (id, history_to, rolled_up_to)
+            SELECT 1, COALESCE(MAX(order_id), 0), 0 FROM orders""",
+        ],
+    },
+    {
+        # What one unit costs to make, for the margin report; NULL if unknown
+        'version': 8,
+        'description': "menu item costs",
+        'mysql': [
+            "ALTER TABLE menu_items ADD COLUMN cost DECIMAL(10, 2) NULL",
+        ],
+        'sqlite': [
+            "ALTER TABLE menu_items ADD COLUMN cost REAL",
+        ],
+    },
+    {
+        # See FREQUENTLY ORDERED TOGETHER. Starts empty: run 'rebuild-pairs'
+        # to count the orders saved before it.
+        'version': 9,
+        'description': "item co-occurrence counts",
+        'mysql': [
+            """CREATE TABLE IF NOT EXISTS item_pairs (
+                item_id INT NOT NULL,
+                other_id INT NOT NULL,
+                order_count INT NOT NULL,
+                PRIMARY KEY (item_id, other_id)
+            )""",
+        ],
+        'sqlite': [
+            """CREATE TABLE IF NOT EXISTS item_pairs (
+                item_id INTEGER NOT NULL,
+                other_id INTEGER NOT NULL,
+                order_count INTEGER NOT NULL,
+                PRIMARY KEY (item_id, other_id)
+            ) WITHOUT ROWID""",
+        ],
+    },
+]
+
+# --- CONNECTION POOL SETTINGS ---
+POOL_CONFIG = {
+    'size': 5,               # Max connections open at the same time
+    'timeout': 10.0,         # Seconds to wait for a free connection
+    'idle_check_after': 30.0, # Only ping a connection that sat idle this long
+    'retries': 1             # Times to retry a query that hit a dropped connection
+}
+
+
+# --- GROUP COMMIT FOR ORDERS ---
+# With many terminals saving orders at once, orders arriving within
+# window_ms of each other are written in one transaction (one commit).
+# Raise window_ms / max_batch for throughput, lower them for latency.
+GROUP_COMMIT_CONFIG = {
+    'enabled': False,
+    'window_ms': 5,   # How long the first order of a group waits for others
+    'max_batch': 32   # Most orders written in one transaction
+}
+
+# --- ORDER JOURNAL ---
+# Confirmed orders are appended to a local file first and copied into the
+# database in the background, so checkout doesn't wait on (or fail with)
+# a slow or unreachable database. Each till has its own journal, named
+# after the till (--till, default the host name) under 'dir'.
+#
+# 'fsync' decides what an accepted order survives:
+#   'always'  - fsync'd before the order is confirmed: survives a power cut,
+#               but checkout waits a few milliseconds for the disk
+#   'batched' - written straight away and fsync'd within fsync_interval:
+#               survives an app crash at once, a power cut after the interval
+#   'never'   - left to the operating system to write out
+JOURNAL_CONFIG = {
+    'dir': os.path.join(os.path.expanduser('~'), '.restaurant', 'journals'),
+    'fsync': 'batched',
+    'fsync_interval': 0.5,  # Seconds an order may wait for its fsync when batched
+    'batch_size': 50,       # Orders replayed per transaction
+    'interval': 1.0,        # Seconds between checks when the journal is empty
+    'max_backoff': 60.0,    # Longest wait between retries while the database is down
+    'max_attempts': 5,      # Tries before an order is set aside as failed
+    'compact_bytes': 1 << 20 # Rewrite the file once drained and bigger than this
+}
+
+# --- BULK ORDER IMPORT ---
+BULK_IMPORT_CONFIG = {
+    'chunk_size': 500,       # Orders committed per transaction
+    'rows_per_statement': 500 # Rows in one multi-row INSERT
+}
+
+# --- SALES ROLLUPS ---
+ROLLUP_CONFIG = {
+    'chunk_size': 5000 # Order ids the catch-up job rolls up per transaction
+}
+
+# --- FREQUENTLY ORDERED TOGETHER (rebuild-pairs) ---
+RECOMMEND_CONFIG = {
+    'top_k': 5,                 # Suggestions kept (and shown) per item
+    'refresh_seconds': 30,      # How often lookups fold in orders saved elsewhere
+    'reload_seconds': 3600,     # How often the whole item_pairs table is re-read
+    'rebuild_chunk_size': 5000  # Order ids counted per statement by rebuild-pairs
+}
+
+# --- STREAMING QUERIES (iter_query) ---
+STREAM_CONFIG = {
+    'batch_size': 1000 # Rows read per fetchmany() round trip
+}
+
+# --- CONNECTION POOL ---
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free in time."""
+
+
+class PoolStats:
+    """Counters describing how the pool keeps its connections healthy."""
+    FIELDS = ('checkouts', 'probes_run', 'probes_skipped', 'reconnects')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def bump(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class ConnectionPool:
+    """A bounded pool of database connections shared between threads.
+
+    Each thread leases at most one connection at a time; nested leases on
+    the same thread reuse it, so a transaction can span several calls.
+    Idle connections are only probed once they have sat unused for
+    idle_check_after seconds; otherwise a dead connection is found by the
+    query that fails on it and is replaced then.
+    """
+    def __init__(self, connect, size=5, timeout=10.0, validate=None,
+                 idle_check_after=30.0, is_disconnect=None):
+        self._connect = connect     # Callable that opens a new connection
+        self._validate = validate   # Optional liveness check for idle connections
+        self._is_disconnect = is_disconnect  # Tells if an error means the link is dead
+        self.size = size
+        self.timeout = timeout
+        self.idle_check_after = idle_check_after
+        self._idle = []             # (connection, returned_at), most recently used last
+        self._open_count = 0
+        self._suspect_before = 0.0  # Idle connections older than a failure get probed
+        self._cond = threading.Condition()
+        self._leases = threading.local()
+        self.stats = PoolStats()
+
+    def checkout(self, timeout=None):
+        """Takes a connection from the pool, opening one if below the size limit."""
+        wait = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + wait
+        with self._cond:
+            while not self._idle and self._open_count >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"No database connection free after {wait:.1f}s "
+                        f"(pool size {self.size})")
+                self._cond.wait(remaining)
+            if self._idle:
+                connection, returned_at = self._idle.pop()
+            else:
+                connection = None
+                self._open_count += 1
+        self.stats.bump('checkouts')
+
+        if connection is not None:
+            idle_for = time.monotonic() - returned_at
+            suspect = returned_at < self._suspect_before
+            if self._validate is None or (idle_for < self.idle_check_after and not suspect):
+                self.stats.bump('probes_skipped')
+                return connection
+            self.stats.bump('probes_run')
+            if self._validate(connection):
+                return connection
+            self._close(connection)
+            self.stats.bump('reconnects')
+        # Open a fresh connection outside the lock; give the slot back on failure
+        try:
+            return self._connect()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def checkin(self, connection, discard=False):
+        """Returns a connection to the pool, or closes it if it is broken."""
+        if discard:
+            # Whatever killed this link (e.g. a server restart) probably
+            # killed the idle ones too, so probe those before reuse
+            self._suspect_before = time.monotonic()
+            self._close(connection)
+            self._release_slot()
+            self.stats.bump('reconnects')
+            return
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Yields this thread's connection, checking one out if it holds none."""
+        held = getattr(self._leases, 'connection', None)
+        if held is not None:
+            yield held
+            return
+
+        connection = self.checkout(timeout)
+        self._leases.connection = connection
+        discard = False
+        try:
+            yield connection
+        except BaseException as exc:
+            # The connection may be half-way through a broken exchange
+            discard = self._is_broken(exc, connection)
+            raise
+        finally:
+            self._leases.connection = None
+            self.checkin(connection, discard=discard)
+
+    def close_all(self):
+        """Closes every idle connection (used on shutdown)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open_count -= len(idle)
+            self._cond.notify_all()
+        for connection, _ in idle:
+            self._close(connection)
+
+    def adopt(self, connection):
+        """Adds a connection opened elsewhere to the pool."""
+        with self._cond:
+            self._open_count += 1
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def _release_slot(self):
+        with self._cond:
+            self._open_count -= 1
+            self._cond.notify()
+
+    def _is_broken(self, exc, connection):
+        if self._is_disconnect is not None:
+            return self._is_disconnect(exc)
+        try:
+            return not connection.is_connected()
+        except Exception:
+            return True
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+# --- PASSWORD HASHING ---
+def hash_password(password):
+    """Hashes a password using SHA-256."""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def check_password(plain_password, hashed_password):
+    """Checks if the plain password matches the hashed one."""
+    return hash_password(plain_password) == hashed_password
+
+# --- NAMED STATEMENTS ---
+# The hot queries, run by name through cursor.execute_named(). MySQL keeps a
+# server-side prepared statement per name on each pooled connection, so
+# they are parsed once per connection instead of on every call; SQLite
+# reuses its own compiled statements for them.
+STATEMENTS = {
+    'validate_user': "SELECT user_id, password_hash FROM users WHERE username = %s",
+    'create_user': "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
+    'insert_order': "INSERT INTO orders (user_id, total_amount) VALUES (%s, %s)",
+    'insert_keyed_order': "INSERT INTO orders (user_id, total_amount, order_key) VALUES (%s, %s, %s)",
+    'order_by_key': "SELECT order_id FROM orders WHERE order_key = %s",
+    'catalog_version': "SELECT version FROM catalog_version WHERE id = 1",
+    'menu_items': "SELECT item_id, name, description, price, category FROM menu_items",
+    'menu_categories': "SELECT DISTINCT category FROM menu_items ORDER BY category IS NULL, category",
+    # Keyset pagination: the next page starts after the last item_id seen
+    'menu_page': "SELECT item_id, name, description, price, category FROM menu_items "
+                 "WHERE category = %s AND item_id > %s ORDER BY item_id LIMIT %s",
+    'menu_page_uncategorized': "SELECT item_id, name, description, price, category FROM menu_items "
+                               "WHERE category IS NULL AND item_id > %s ORDER BY item_id LIMIT %s",
+    'pricing_rules': "SELECT rule_id, name, kind, item_id, category, combo_items, value, "
+                     "starts_at, ends_at, days FROM pricing_rules WHERE active = 1",
+    'submit_feedback': "INSERT INTO feedback (user_id, rating, comments) VALUES (%s, %s, %s)",
+}
+
+# --- ROW FORMATS FOR iter_query ---
+@functools.lru_cache(maxsize=64)
+def _row_type(columns):
+    return namedtuple('Row', columns, rename=True)
+
+
+# rows= option -> factory taking the column names and returning a
+# tuple -> row converter (None: keep the driver's tuples)
+ROW_FORMATS = {
+    'dict': lambda columns: lambda row: dict(zip(columns, row)),
+    'tuple': lambda columns: None,
+    'namedtuple': lambda columns: _row_type(columns)._make,
+}
+
+# --- SALES ROLLUPS ---
+# Revenue and quantity per day, per hour, and per item and category per
+# day, so reports never have to add up orders/order_items. Every order is
+# added to them in the transaction that saves it; orders from before the
+# tables existed are added by the catch-up job (rollup-sales), which walks
+# up from the rolled_up_to watermark to history_to. revenue_cents is at
+# the prices on the order lines, net_cents what was actually charged
+# (orders.total_amount, after discounts and tax).
+#
+# Each rollup is (table, key columns, counter columns, SELECT). {day} and
+# {hour} are the backend's bucket expressions for o.order_date, {where}
+# picks the orders by oi.order_id. Orders always come in whole, so the
+# counts (including COUNT(*) of orders) can just be added on.
+_ORDER_TOTALS = """(SELECT oi.order_id, SUM(oi.quantity) AS quantity,
+                           SUM(ROUND(oi.quantity * oi.price_per_item * 100)) AS revenue_cents
+                    FROM order_items oi WHERE {where} GROUP BY oi.order_id) t
+                   JOIN orders o ON o.order_id = t.order_id"""
+
+_ORDER_LINES = """order_items oi JOIN orders o ON o.order_id = oi.order_id"""
+
+SALES_ROLLUPS = (
+    ('sales_daily', ('sale_date',), ('order_count', 'quantity', 'revenue_cents', 'net_cents'),
+     "SELECT {day}, COUNT(*), SUM(t.quantity), SUM(t.revenue_cents), "
+     "SUM(ROUND(o.total_amount * 100)) FROM " + _ORDER_TOTALS + " GROUP BY 1"),
+    ('sales_hourly', ('sale_date', 'sale_hour'),
+     ('order_count', 'quantity', 'revenue_cents', 'net_cents'),
+     "SELECT {day}, {hour}, COUNT(*), SUM(t.quantity), SUM(t.revenue_cents), "
+     "SUM(ROUND(o.total_amount * 100)) FROM " + _ORDER_TOTALS + " GROUP BY 1, 2"),
+    ('sales_item_daily', ('sale_date', 'item_id'), ('quantity', 'revenue_cents'),
+     "SELECT {day}, oi.item_id, SUM(oi.quantity), "
+     "SUM(ROUND(oi.quantity * oi.price_per_item * 100)) FROM " + _ORDER_LINES
+     + " WHERE {where} GROUP BY 1, 2"),
+    ('sales_category_daily', ('sale_date', 'category'), ('quantity', 'revenue_cents'),
+     "SELECT {day}, COALESCE(m.category, ''), SUM(oi.quantity), "
+     "SUM(ROUND(oi.quantity * oi.price_per_item * 100)) FROM " + _ORDER_LINES
+     + " LEFT JOIN menu_items m ON m.item_id = oi.item_id WHERE {where} GROUP BY 1, 2"),
+)
+
+# What the Analytics tab shows; these read the rollup tables only (plus
+# menu_items for item names). {since} is the first sale_date to include.
+SALES_REPORT_QUERIES = {
+    'totals': "SELECT COALESCE(SUM(order_count), 0) AS order_count, "
+              "COALESCE(SUM(quantity), 0) AS quantity, "
+              "COALESCE(SUM(net_cents), 0) AS net_cents FROM sales_daily WHERE sale_date >= {since}",
+    'days': "SELECT sale_date, order_count, quantity, net_cents FROM sales_daily "
+            "WHERE sale_date >= {since} ORDER BY sale_date DESC LIMIT 366",
+    'hours': "SELECT sale_hour, SUM(order_count) AS order_count, SUM(quantity) AS quantity, "
+             "SUM(net_cents) AS net_cents FROM sales_hourly WHERE sale_date >= {since} "
+             "GROUP BY sale_hour ORDER BY sale_hour",
+    'items': "SELECT s.item_id, m.name, SUM(s.quantity) AS quantity, "
+             "SUM(s.revenue_cents) AS revenue_cents FROM sales_item_daily s "
+             "LEFT JOIN menu_items m ON m.item_id = s.item_id WHERE s.sale_date >= {since} "
+             "GROUP BY s.item_id, m.name ORDER BY revenue_cents DESC LIMIT 50",
+    'categories': "SELECT category, SUM(quantity) AS quantity, SUM(revenue_cents) AS revenue_cents "
+                  "FROM sales_category_daily WHERE sale_date >= {since} "
+                  "GROUP BY category ORDER BY revenue_cents DESC",
+}
+
+# sale_date for "all time" (the lowest DATE MySQL supports)
+ALL_SALES = '1000-01-01'
+
+# --- FREQUENTLY ORDERED TOGETHER ---
+# item_pairs holds, for every two items that have shared an order, how many
+# orders had both. Each pair is stored both ways round, so an item's
+# partners are one range of the primary key. Like the sales rollups, every
+# order is counted in the transaction that saves it; rebuild-pairs recounts
+# everything. {where} picks the orders by oi.order_id.
+ITEM_PAIRS_SELECT = ("SELECT oi.item_id AS item_id, oj.item_id AS other_id, "
+                     "COUNT(DISTINCT oi.order_id) AS order_count FROM order_items oi "
+                     "JOIN order_items oj ON oj.order_id = oi.order_id AND oj.item_id <> oi.item_id "
+                     "WHERE {where} GROUP BY oi.item_id, oj.item_id")
+
+# --- STORAGE BACKENDS ---
+class DatabaseStartupError(Exception):
+    """The database could not be opened or set up. `title` heads the error dialog."""
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+
+
+class StorageBackend:
+    """Base class for the database engines DatabaseManager can run on.
+
+    The queries are written once, with %s placeholders and dictionary rows.
+    Subclasses open connections and hide the differences between drivers:
+    placeholder style, error codes, how to ping and how to begin a
+    transaction.
+    """
+    name = 'base'
+    Error = Exception  # Base class of the driver's errors
+
+    def __init__(self, config, pool_config=None):
+        self.load_driver()
+        self.config = config
+        self.pool_config = pool_config or POOL_CONFIG
+        self.pool = None
+        self._tx_state = threading.local()  # Per-thread transaction depth
+        self._rollup_sql = None  # SALES_ROLLUPS for this backend, still taking {where}
+        self._pairs_sql = None   # ITEM_PAIRS_SELECT as an upsert into item_pairs
+
+    # --- Driver hooks (override in subclasses) ---
+    @classmethod
+    def load_driver(cls):
+        """Imports the database driver if it isn't loaded yet (sets cls.Error)."""
+
+    def open_first_connection(self):
+        """Opens the first connection, creating the database if needed."""
+        return self.open_connection()
+
+    def open_connection(self):
+        raise NotImplementedError
+
+    def get_cursor(self, connection):
+        raise NotImplementedError
+
+    def get_stream_cursor(self, connection):
+        """Unbuffered cursor with tuple rows and %s placeholders, for iter_query."""
+        raise NotImplementedError
+
+    def close_stream_cursor(self, connection, cursor):
+        cursor.close()
+
+    def begin(self, connection):
+        raise NotImplementedError
+
+    def ping(self, connection):
+        raise NotImplementedError
+
+    def is_disconnect(self, err):
+        return False
+
+    def is_duplicate(self, err):
+        return False
+
+    def is_already_exists(self, err):
+        """True for errors saying a table, column, index or trigger already exists."""
+        return False
+
+    # SQL for the sales rollup buckets of o.order_date, and for the columnar
+    # reports' day number (days since 1970-01-01) and weekday (0 = Monday)
+    DAY_SQL = "DATE(o.order_date)"
+    HOUR_SQL = "HOUR(o.order_date)"
+    EPOCH_DAY_SQL = "DATEDIFF(o.order_date, '1970-01-01')"
+    WEEKDAY_SQL = "WEEKDAY(o.order_date)"
+    # The sale_date %s days before today, by the database server's clock
+    DAYS_AGO_SQL = "DATE_SUB(CURRENT_DATE, INTERVAL %s DAY)"
+    # The order_date / submitted_at value of %s seconds ago
+    SECONDS_AGO_SQL = "CURRENT_TIMESTAMP - INTERVAL %s SECOND"
+
+    def upsert(self, table, keys, columns):
+        """Clause making an INSERT add `columns` onto an existing row with the same keys."""
+        raise NotImplementedError
+
+    def order_time_param(self, moment):
+        """A local datetime as a parameter to compare with orders.order_date."""
+        return moment
+
+    def parse_order_time(self, value):
+        """An orders.order_date value as a local datetime."""
+        return value
+
+    # --- Connection management ---
+    def connect(self):
+        """Opens the first connection, migrates the schema and builds the pool."""
+        connection = self.open_first_connection()
+        self.migrate(connection)
+        self.pool = ConnectionPool(self.open_connection,
+                                   size=self.pool_config.get('size', 5),
+                                   timeout=self.pool_config.get('timeout', 10.0),
+                                   validate=self._is_alive,
+                                   idle_check_after=self.pool_config.get('idle_check_after', 30.0),
+                                   is_disconnect=self.is_disconnect)
+        # Hand the connection we just opened to the pool so it is reused
+        self.pool.adopt(connection)
+
+    def close(self):
+        """Closes the idle connections; returns the pool's final health_stats."""
+        stats = self.health_stats()
+        if self.pool:
+            self.pool.close_all()
+        return stats
+
+    def health_stats(self):
+        """Returns the pool's probe and reconnect counters."""
+        return self.pool.stats.snapshot() if self.pool else {}
+
+    # --- Schema migrations ---
+    def schema_version(self, connection):
+        """Returns the highest applied migration, or 0 on a database without any."""
+        cursor = self.get_cursor(connection)
+        try:
+            cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+            rows = cursor.fetchall()
+            return rows[0]['version'] or 0
+        except self.Error:
+            return 0 # No schema_version table yet
+        finally:
+            cursor.close()
+
+    def migrate(self, connection):
+        """Applies any migrations newer than the database's schema_version."""
+        current = self.schema_version(connection)
+        pending = [m for m in MIGRATIONS if m['version'] > current]
+        if not pending:
+            return # Schema is current; nothing else to do at startup
+
+        cursor = self.get_cursor(connection)
+        try:
+            cursor.execute(SCHEMA_VERSION_TABLE[self.name])
+            for migration in pending:
+                print(f"Applying migration {migration['version']}: {migration['description']}")
+                self.begin(connection)
+                for statement in migration[self.name]:
+                    try:
+                        cursor.execute(statement)
+                    except self.Error as err:
+                        if not self.is_already_exists(err):
+                            raise
+                        print(f"Ignoring error: {err}")
+                try:
+                    cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                                   (migration['version'], migration['description']))
+                except self.Error as err:
+                    # Another till applied it at the same time
+                    if not self.is_duplicate(err):
+                        raise
+                connection.commit()
+        except self.Error as err:
+            try:
+                connection.rollback()
+            except self.Error:
+                pass
+            print(f"Failed during schema migration: {err}")
+            raise DatabaseStartupError("Setup Error", f"Failed to set up database: {err}") from err
+        finally:
+            cursor.close()
+
+    def _is_alive(self, connection):
+        """Pings a pooled connection that has been idle for a while."""
+        try:
+            self.ping(connection)
+            return True
+        except self.Error as err:
+            print(f"Reconnecting due to error: {err}")
+            return False
+
+    @contextmanager
+    def cursor(self):
+        """Yields a cursor on a pooled connection for reads (no transaction)."""
+        with self.pool.lease() as connection:
+            cursor = self.get_cursor(connection)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        """Yields a cursor on a pooled connection inside one transaction.
+
+        Commits when the block finishes and rolls back if it raises. Nested
+        calls on the same thread join the outer transaction.
+        """
+        with self.pool.lease() as connection:
+            depth = getattr(self._tx_state, 'depth', 0)
+            self._tx_state.depth = depth + 1
+            if depth == 0:
+                self._tx_state.committing = False
+                self.begin(connection)
+            cursor = self.get_cursor(connection)
+            try:
+                yield cursor
+                if depth == 0:
+                    self._tx_state.committing = True
+                    connection.commit()
+                    self._tx_state.committing = False
+            except BaseException:
+                if depth == 0 and not getattr(self._tx_state, 'committing', False):
+                    try:
+                        connection.rollback()
+                    except self.Error as err:
+                        print(f"Rollback Error: {err}")
+                raise
+            finally:
+                self._tx_state.depth = depth
+                cursor.close()
+
+    def run(self, work, write=True):
+        """Runs work(cursor) on a pooled connection and returns its result.
+
+        Writes run inside a transaction. A dropped connection is not checked
+        for up front; the failing call is retried on a fresh connection
+        instead, unless it failed while committing (the write may have landed)
+        or it is part of an outer transaction.
+        """
+        retries = self.pool_config.get('retries', 1)
+        if getattr(self._tx_state, 'depth', 0) > 0:
+            retries = 0
+        for attempt in range(retries + 1):
+            self._tx_state.committing = False
+            try:
+                if write:
+                    with self.transaction() as cursor:
+                        return work(cursor)
+                with self.cursor() as cursor:
+                    return work(cursor)
+            except self.Error as err:
+                retryable = (self.is_disconnect(err)
+                             and not self._tx_state.committing)
+                if attempt < retries and retryable:
+                    print(f"Reconnecting due to error: {err}")
+                    continue
+                raise
+
+    # --- Queries ---
+    def execute_query(self, query, params=()):
+        try:
+            self.run(lambda cursor: cursor.execute(query, params))
+            return True
+        except (self.Error, PoolTimeoutError) as err:
+            print(f"Query Error: {err}")
+            return False
+
+    def fetch_query(self, query, params=()):
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        try:
+            return self.run(work, write=False)
+        except (self.Error, PoolTimeoutError) as err:
+            print(f"Fetch Error: {err}")
+            return []
+
+    def iter_query(self, query, params=(), rows='dict', batch_size=None):
+        """Yields the rows of a query without holding the whole result in memory.
+
+        Reads batch_size rows per fetchmany() from an unbuffered cursor.
+        The scan checks out a connection of its own rather than this
+        thread's lease, so other queries can run between rows. rows='tuple'
+        or 'namedtuple' skips building a dict per row. Errors are raised,
+        not swallowed, and the connection goes back to the pool when the
+        generator finishes or is closed.
+        """
+        if rows not in ROW_FORMATS:
+            raise ValueError(f"rows must be one of {', '.join(ROW_FORMATS)}")
+        return self._stream(query, params, ROW_FORMATS[rows],
+                            batch_size or STREAM_CONFIG['batch_size'])
+
+    def _stream(self, query, params, row_format, batch_size):
+        connection = self.pool.checkout()
+        discard = False
+        try:
+            cursor = self.get_stream_cursor(connection)
+            try:
+                cursor.execute(query, params)
+                make_row = row_format(tuple(column[0] for column in cursor.description))
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    if make_row is None:
+                        yield from batch
+                    else:
+                        yield from map(make_row, batch)
+            finally:
+                self.close_stream_cursor(connection, cursor)
+        except self.Error as err:
+            discard = self.is_disconnect(err)
+            raise
+        finally:
+            self.pool.checkin(connection, discard=discard)
+
+    def execute_named(self, name, params=()):
+        """Like execute_query, for a statement from STATEMENTS."""
+        try:
+            self.run(lambda cursor: cursor.execute_named(name, params))
+            return True
+        except (self.Error, PoolTimeoutError) as err:
+            print(f"Query Error ({name}): {err}")
+            return False
+
+    def fetch_named(self, name, params=()):
+        """Like fetch_query, for a statement from STATEMENTS."""
+        def work(cursor):
+            cursor.execute_named(name, params)
+            return cursor.fetchall()
+        try:
+            return self.run(work, write=False)
+        except (self.Error, PoolTimeoutError) as err:
+            print(f"Fetch Error ({name}): {err}")
+            return []
+
+    def create_user(self, username, password):
+        hashed_pw = hash_password(password)
+        try:
+            self.run(lambda cursor: cursor.execute_named('create_user', (username, hashed_pw)))
+            return "SUCCESS" # Return a success code
+        except PoolTimeoutError as err:
+            print(f"Create User Error: {err}")
+            return f"OTHER_ERROR: {err}"
+        except self.Error as err:
+            print(f"Create User Error: {err}")
+            if self.is_duplicate(err):
+                return "DUPLICATE"
+            return f"OTHER_ERROR: {err}" # Any other error
+
+    def validate_user(self, username, password):
+        users = self.fetch_named('validate_user', (username,))
+        if users:
+            user = users[0]
+            if check_password(password, user['password_hash']):
+                return user['user_id'] # Login success
+        return None # Login fail
+
+    ORDER_ITEM_QUERY = """
+        INSERT INTO order_items (order_id, item_id, quantity, price_per_item) 
+        VALUES (%s, %s, %s, %s)
+    """
+
+    def insert_order(self, cursor, user_id, total_amount, items, order_key=None):
+        """Writes one order and its items on an open transaction; returns the order_id."""
+        if order_key is None:
+            cursor.execute_named('insert_order', (user_id, total_amount))
+        else:
+            cursor.execute_named('insert_keyed_order', (user_id, total_amount, order_key))
+        order_id = cursor.lastrowid
+        # Now, add all items to the order_items table
+        item_data = [
+            (order_id, item['item_id'], item['quantity'], item['price'])
+            for item in items
+        ]
+        cursor.executemany(self.ORDER_ITEM_QUERY, item_data)
+        self.roll_up_orders(cursor, "oi.order_id = %s", (order_id,))
+        self.count_item_pairs(cursor, "oi.order_id = %s", (order_id,))
+        return order_id
+
+    def create_order(self, user_id, total_amount, items):
+        """Saves an order; returns its order_id, or False if it failed."""
+        try:
+            return self.run(lambda cursor: self.insert_order(cursor, user_id, total_amount, items))
+        except (self.Error, PoolTimeoutError) as err:
+            print(f"Order Error: {err}")
+            return False
+
+    def insert_order_group(self, cursor, orders, keys=None):
+        """Writes orders one savepoint each on an open transaction.
+
+        A bad order is rolled back on its own and gets False. An order whose
+        key (from `keys`, if given) is already in the table was saved
+        before, and gets the order_id it was saved under.
+        """
+        results = []
+        for index, (user_id, total_amount, items) in enumerate(orders):
+            order_key = keys[index] if keys else None
+            savepoint = f"order_{index}"
+            cursor.execute(f"SAVEPOINT {savepoint}")
+            try:
+                results.append(self.insert_order(cursor, user_id, total_amount, items, order_key))
+                cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+            except Exception as err:
+                if isinstance(err, self.Error) and self.is_disconnect(err):
+                    raise # The whole group is retried on a new connection
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                if order_key is not None and isinstance(err, self.Error) and self.is_duplicate(err):
+                    cursor.execute_named('order_by_key', (order_key,))
+                    row = cursor.fetchone()
+                    if row is not None:
+                        results.append(row['order_id'])
+                        continue
+                print(f"Order Error: {err}")
+                results.append(False)
+        return results
+
+    def create_order_group(self, orders):
+        """Saves several (user_id, total_amount, items) orders in one transaction.
+
+        Each order gets its own savepoint, so a bad order is rolled back on
+        its own and the rest of the group still commits. Returns one
+        order_id (or False) per order, in order.
+        """
+        try:
+            return self.run(lambda cursor: self.insert_order_group(cursor, orders))
+        except (self.Error, PoolTimeoutError) as err:
+            print(f"Order Group Error: {err}")
+            return [False] * len(orders)
+
+    def save_keyed_orders(self, orders, keys):
+        """Saves orders under idempotency keys in one transaction.
+
+        Saving the same key twice returns the first order_id instead of a
+        second order. Unlike create_order_group, errors reaching the
+        database are raised, so the caller can keep the orders and retry.
+        """
+        return self.run(lambda cursor: self.insert_order_group(cursor, orders, keys))
+
+    # --- Bulk inserts ---
+    def first_insert_id(self, cursor, row_count):
+        """Returns the id generated for the first row of a multi-row INSERT."""
+        raise NotImplementedError
+
+    def insert_rows(self, cursor, table, columns, rows, want_ids=False):
+        """Inserts rows with multi-row INSERTs; returns their ids if want_ids."""
+        ids = []
+        per_statement = BULK_IMPORT_CONFIG['rows_per_statement']
+        row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        for start in range(0, len(rows), per_statement):
+            part = rows[start:start + per_statement]
+            query = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+                     + ", ".join([row_sql] * len(part)))
+            cursor.execute(query, [value for row in part for value in row])
+            if want_ids:
+                first = self.first_insert_id(cursor, len(part))
+                ids.extend(range(first, first + len(part)))
+        return ids
+
+    def insert_orders(self, cursor, orders):
+        """Writes many (user_id, total_amount, items) orders; returns their order_ids."""
+        order_ids = self.insert_rows(cursor, "orders", ("user_id", "total_amount"),
+                                     [(user_id, total_amount) for user_id, total_amount, _ in orders],
+                                     want_ids=True)
+        # Map each generated order_id back onto that order's items
+        item_rows = [
+            (order_id, item['item_id'], item['quantity'], item['price'])
+            for order_id, (_, _, items) in zip(order_ids, orders)
+            for item in items
+        ]
+        self.insert_rows(cursor, "order_items",
+                         ("order_id", "item_id", "quantity", "price_per_item"), item_rows)
+        if order_ids:
+            where = f"oi.order_id IN ({', '.join(['%s'] * len(order_ids))})"
+            self.roll_up_orders(cursor, where, order_ids)
+            self.count_item_pairs(cursor, where, order_ids)
+        return order_ids
+
+    def create_orders(self, orders, chunk_size=500):
+        """Saves a stream of (user_id, total_amount, items) orders in chunks.
+
+        Each chunk is one transaction. If a chunk fails, its orders are
+        written again one savepoint at a time so only the bad ones are
+        dropped. Only one chunk is held in memory. Returns (saved, failed).
+        """
+        saved = failed = 0
+        orders = iter(orders)
+        while True:
+            chunk = list(itertools.islice(orders, chunk_size))
+            if not chunk:
+                break
+            try:
+                saved += len(self.run(lambda cursor: self.insert_orders(cursor, chunk)))
+            except Exception as err:
+                print(f"Bulk Order Error: {err}; saving this chunk order by order")
+                results = self.create_order_group(chunk)
+                ok = sum(1 for order_id in results if order_id)
+                saved += ok
+                failed += len(chunk) - ok
+        return saved, failed
+
+    # --- Sales rollups ---
+    def roll_up_orders(self, cursor, where, params):
+        """Adds the orders picked by `where` (on oi.order_id) to the sales rollups."""
+        if self._rollup_sql is None:
+            self._rollup_sql = [
+                f"INSERT INTO {table} ({', '.join(keys + columns)}) "
+                + select.format(day=self.DAY_SQL, hour=self.HOUR_SQL, where='{where}')
+                + " " + self.upsert(table, keys, columns)
+                for table, keys, columns, select in SALES_ROLLUPS
+            ]
+        for statement in self._rollup_sql:
+            cursor.execute(statement.format(where=where), params)
+
+    def catch_up_rollups(self, chunk_size=5000, progress=None):
+        """Rolls up the orders saved before the rollup tables existed.
+
+        Works up from the rolled_up_to watermark, chunk_size order ids per
+        transaction, moving the watermark in the same transaction, so it
+        can be stopped and restarted and two runs never count an order
+        twice. progress(done_to, history_to) is called after each chunk.
+        Returns the number of order ids covered.
+        """
+        def step(cursor):
+            cursor.execute("SELECT history_to, rolled_up_to FROM sales_rollup_state WHERE id = 1")
+            state = cursor.fetchone()
+            if state is None or state['rolled_up_to'] >= state['history_to']:
+                return None
+            start = state['rolled_up_to']
+            end = min(state['history_to'], start + chunk_size)
+            cursor.execute("UPDATE sales_rollup_state SET rolled_up_to = %s "
+                           "WHERE id = 1 AND rolled_up_to = %s", (end, start))
+            if cursor.rowcount != 1:
+                return start, start, state['history_to'] # Another run took this chunk
+            self.roll_up_orders(cursor, "oi.order_id > %s AND oi.order_id <= %s", (start, end))
+            return start, end, state['history_to']
+
+        covered = 0
+        while True:
+            chunk = self.run(step)
+            if chunk is None:
+                return covered
+            start, end, history_to = chunk
+            covered += end - start
+            if progress is not None:
+                progress(end, history_to)
+
+    def rollup_backlog(self):
+        """Order ids from before the rollups that the catch-up job hasn't reached."""
+        rows = self.fetch_query("SELECT history_to - rolled_up_to AS remaining "
+                                "FROM sales_rollup_state WHERE id = 1")
+        return max(int(rows[0]['remaining']), 0) if rows else 0
+
+    # --- Frequently ordered together ---
+    def count_item_pairs(self, cursor, where, params):
+        """Adds the orders picked by `where` (on oi.order_id) to item_pairs."""
+        if self._pairs_sql is None:
+            self._pairs_sql = ("INSERT INTO item_pairs (item_id, other_id, order_count) "
+                               + ITEM_PAIRS_SELECT + " "
+                               + self.upsert('item_pairs', ('item_id', 'other_id'), ('order_count',)))
+        cursor.execute(self._pairs_sql.format(where=where), params)
+
+    def rebuild_item_pairs(self, chunk_size=5000, progress=None):
+        """Recounts item_pairs from every order; returns the number of pairs.
+
+        Runs as one transaction, chunk_size order ids per statement, so the
+        table is never seen half built. Orders saved meanwhile wait for it
+        and are then added on top. progress(done_to, last_id) is called
+        after each chunk.
+        """
+        def work(cursor):
+            cursor.execute("DELETE FROM item_pairs")
+            cursor.execute("SELECT COALESCE(MAX(order_id), 0) AS last_id FROM orders")
+            last_id = cursor.fetchone()['last_id']
+            for start in range(0, last_id, chunk_size):
+                end = min(start + chunk_size, last_id)
+                self.count_item_pairs(cursor, "oi.order_id > %s AND oi.order_id <= %s", (start, end))
+                if progress is not None:
+                    progress(end, last_id)
+            cursor.execute("SELECT COUNT(*) AS pairs FROM item_pairs")
+            return cursor.fetchone()['pairs']
+        return self.run(work)
+
+
+class MySQLBackend(StorageBackend):
+    """MySQL server backend (mysql-connector-python)."""
+    name = 'mysql'
+
+    # Client errors that mean the server link is gone (server has gone away,
+    # lost connection during query, lost connection to server)
+    DISCONNECT_ERRNOS = (2006, 2013, 2055)
+    DUPLICATE_ENTRY = 1062
+    UNKNOWN_DATABASE = 1049
+    # Database, table, column, index or trigger already exists
+    ALREADY_EXISTS_ERRNOS = (1007, 1050, 1060, 1061, 1359)
+
+    @classmethod
+    def load_driver(cls):
+        global mysql
+        if mysql is None:
+            import mysql.connector
+        cls.Error = mysql.connector.Error
+
+    def open_first_connection(self):
+        try:
+            # Try to connect to the specified database
+            connection = self.open_connection()
+            print("Successfully connected to database.")
+        except mysql.connector.Error as err:
+            if err.errno == self.UNKNOWN_DATABASE:
+                print("Database not found. Attempting to create and set up...")
+                self.initial_setup()
+                # Try connecting again after setup
+                try:
+                    connection = self.open_connection()
+                    print("Database created and connected successfully.")
+                except mysql.connector.Error as err:
+                    print(f"Failed to connect after setup: {err}")
+                    raise DatabaseStartupError("Database Error",
+                                               f"Failed to connect after setup: {err}") from err
+            else:
+                # Other error (e.g., wrong password, server down)
+                print(f"Error: {err}")
+                raise DatabaseStartupError(
+                    "Database Error", 
+                    f"Could not connect to MySQL: {err}\n"
+                    "Please check your credentials in DB_CONFIG."
+                ) from err
+        return connection
+
+    def open_connection(self):
+        # Autocommit keeps plain reads from pinning an old snapshot on a
+        # pooled connection; transaction() opens explicit transactions.
+        return mysql.connector.connect(**{**self.config, 'autocommit': True})
+
+    def initial_setup(self):
+        """Connects to MySQL server and creates the database (migrations add the tables)."""
+        temp_config = self.config.copy()
+        db_name = temp_config.pop('database') # Get 'restaurant_db' and remove it for now
+        
+        try:
+            # Connect to MySQL server (without a specific db)
+            temp_conn = mysql.connector.connect(**temp_config)
+            cursor = temp_conn.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}`")
+            cursor.close()
+            temp_conn.close()
+            print("Database created.")
+        except mysql.connector.Error as err:
+            print(f"Failed during initial setup: {err}")
+            raise DatabaseStartupError("Setup Error", f"Failed to set up database: {err}") from err
+
+    def __init__(self, config, pool_config=None):
+        super().__init__(config, pool_config)
+        # Prepared statements per pooled connection; a replacement connection
+        # starts with an empty set and prepares them again as they are used
+        self._prepared = weakref.WeakKeyDictionary()
+        self._prepared_lock = threading.Lock()
+
+    def get_cursor(self, connection):
+        with self._prepared_lock:
+            prepared = self._prepared.setdefault(connection, {})
+        return MySQLStatementCursor(connection, prepared)
+
+    def get_stream_cursor(self, connection):
+        # Unbuffered: rows stay on the server until fetchmany() asks for them
+        return connection.cursor(buffered=False)
+
+    def close_stream_cursor(self, connection, cursor):
+        # A scan stopped early leaves rows in flight; read them off the wire
+        # so the connection can run the next query
+        if connection.unread_result:
+            connection.consume_results()
+        cursor.close()
+
+    def begin(self, connection):
+        connection.start_transaction()
+
+    def ping(self, connection):
+        connection.ping(reconnect=False)
+
+    def is_disconnect(self, err):
+        return (isinstance(err, mysql.connector.errors.OperationalError)
+                or getattr(err, 'errno', None) in self.DISCONNECT_ERRNOS)
+
+    def is_duplicate(self, err):
+        return getattr(err, 'errno', None) == self.DUPLICATE_ENTRY
+
+    def is_already_exists(self, err):
+        return getattr(err, 'errno', None) in self.ALREADY_EXISTS_ERRNOS
+
+    def upsert(self, table, keys, columns):
+        # Qualified, or MySQL may take the name for a column of the SELECT
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(
+            f"{column} = {table}.{column} + VALUES({column})" for column in columns)
+
+    def first_insert_id(self, cursor, row_count):
+        # LAST_INSERT_ID() is the id of the first row of a multi-row INSERT
+        return cursor.lastrowid
+
+    def insert_rows(self, cursor, table, columns, rows, want_ids=False):
+        # With innodb_autoinc_lock_mode = 2 (interleaved) the ids of one
+        # multi-row INSERT may have gaps, so only insert row by row when we
+        # need to know every generated id.
+        if want_ids and not self._consecutive_ids(cursor):
+            ids = []
+            query = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ("
+                     + ", ".join(["%s"] * len(columns)) + ")")
+            for row in rows:
+                cursor.execute(query, row)
+                ids.append(cursor.lastrowid)
+            return ids
+        return super().insert_rows(cursor, table, columns, rows, want_ids)
+
+    def _consecutive_ids(self, cursor):
+        if not hasattr(self, '_autoinc_lock_mode'):
+            cursor.execute("SELECT @@innodb_autoinc_lock_mode AS lock_mode")
+            self._autoinc_lock_mode = int(cursor.fetchall()[0]['lock_mode'])
+        return self._autoinc_lock_mode < 2
+
+
+class MySQLStatementCursor:
+    """Dictionary cursor that can also run the named prepared statements.
+
+    fetch*() and lastrowid refer to whichever statement ran last.
+    """
+    UNKNOWN_STMT_HANDLER = 1243
+
+    def __init__(self, connection, prepared):
+        self._connection = connection
+        self._prepared = prepared # name -> prepared cursor on this connection
+        self._plain = connection.cursor(dictionary=True)
+        self._last = self._plain
+
+    def execute(self, query, params=()):
+        self._plain.execute(query, params)
+        self._last = self._plain
+
+    def executemany(self, query, seq_of_params):
+        # The driver turns this into one multi-row INSERT, which beats
+        # running a prepared statement once per row
+        self._plain.executemany(query, seq_of_params)
+        self._last = self._plain
+
+    def execute_named(self, name, params=()):
+        cursor = self._prepared.get(name)
+        if cursor is None:
+            cursor = self._prepared[name] = self._connection.cursor(prepared=True)
+        try:
+            cursor.execute(STATEMENTS[name], params)
+        except mysql.connector.Error as err:
+            if err.errno != self.UNKNOWN_STMT_HANDLER:
+                raise
+            # The server forgot the statement (e.g. after a session reset)
+            cursor = self._prepared[name] = self._connection.cursor(prepared=True)
+            cursor.execute(STATEMENTS[name], params)
+        self._last = cursor
+
+    def _rows(self, rows):
+        if self._last is self._plain or rows is None:
+            return rows
+        # Prepared cursors return tuples
+        columns = self._last.column_names
+        if isinstance(rows, tuple):
+            return dict(zip(columns, rows))
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetchone(self):
+        row = self._last.fetchone()
+        if row is not None and self._connection.unread_result:
+            # Both cursors are unbuffered: read off the rest of the result so
+            # the next statement or SAVEPOINT doesn't hit "Unread result found"
+            self._last.fetchall()
+        return self._rows(row)
+
+    def fetchmany(self, size):
+        return self._rows(self._last.fetchmany(size))
+
+    def fetchall(self):
+        return self._rows(self._last.fetchall())
+
+    @property
+    def lastrowid(self):
+        return self._last.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._last.rowcount
+
+    def close(self):
+        # Prepared cursors stay open with their connection for reuse
+        self._plain.close()
+
+
+def _sqlite_dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """Wraps a sqlite3 cursor so the shared %s queries run unchanged."""
+    def __init__(self, cursor, row_factory=_sqlite_dict_row):
+        self._cursor = cursor
+        self._cursor.row_factory = row_factory
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def translate(query):
+        return query.replace('%s', '?')
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self.translate(query), params)
+
+    def execute_named(self, name, params=()):
+        # sqlite3 keeps compiled statements per connection (cached_statements),
+        # so running the same text again skips the parse
+        self._cursor.execute(self.translate(STATEMENTS[name]), params)
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(self.translate(query), seq_of_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+# Order totals and prices arrive as exact Decimals; the REAL columns take
+# the text and store it as a number
+sqlite3.register_adapter(Decimal, str)
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite backend for single-till installs and benchmarks.
+
+    Runs in WAL mode so readers never wait for the writer, and skips the
+    network round trip MySQL needs on every call.
+    """
+    name = 'sqlite'
+    Error = sqlite3.Error
+
+    def open_first_connection(self):
+        connection = self.open_connection()
+        print(f"Using SQLite database at {self.config['path']}.")
+        return connection
+
+    def open_connection(self):
+        # check_same_thread is off because the pool moves connections between
+        # threads; a lease still guarantees one thread uses it at a time.
+        connection = sqlite3.connect(self.config['path'],
+                                     timeout=self.config.get('busy_timeout', 10.0),
+                                     isolation_level=None,
+                                     check_same_thread=False,
+                                     cached_statements=self.config.get('cached_statements', 256))
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    def get_cursor(self, connection):
+        return SQLiteCursor(connection.cursor())
+
+    def get_stream_cursor(self, connection):
+        # sqlite3 steps through the result as rows are fetched
+        return SQLiteCursor(connection.cursor(), row_factory=None)
+
+    def begin(self, connection):
+        # Take the write lock up front so two writers can't deadlock upgrading
+        connection.execute("BEGIN IMMEDIATE")
+
+    def ping(self, connection):
+        connection.execute("SELECT 1")
+
+    def is_duplicate(self, err):
+        return isinstance(err, sqlite3.IntegrityError) and 'UNIQUE' in str(err)
+
+    def is_already_exists(self, err):
+        message = str(err)
+        return 'already exists' in message or 'duplicate column name' in message
+
+    # CURRENT_TIMESTAMP is UTC in SQLite; bucket sales by the till's local time
+    DAY_SQL = "date(o.order_date, 'localtime')"
+    HOUR_SQL = "CAST(strftime('%H', o.order_date, 'localtime') AS INTEGER)"
+    EPOCH_DAY_SQL = "CAST(julianday(o.order_date, 'localtime', 'start of day') - 2440587.5 AS INTEGER)"
+    WEEKDAY_SQL = "(CAST(strftime('%w', o.order_date, 'localtime') AS INTEGER) + 6) % 7"
+    DAYS_AGO_SQL = "date('now', 'localtime', '-' || %s || ' days')"
+    SECONDS_AGO_SQL = "datetime('now', '-' || %s || ' seconds')"
+
+    def order_time_param(self, moment):
+        return moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    def parse_order_time(self, value):
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+    def upsert(self, table, keys, columns):
+        return (f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+                + ", ".join(f"{column} = {table}.{column} + excluded.{column}" for column in columns))
+
+    def first_insert_id(self, cursor, row_count):
+        # lastrowid is the last row; the write lock held by BEGIN IMMEDIATE
+        # means nobody else got ids in between, so they are consecutive
+        return cursor.lastrowid - row_count + 1
+
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend,
+}
+
+# --- MENU CACHE ---
+class MenuCache:
+    """Process-wide copy of menu_items, kept current by a catalog version.
+
+    Every insert, update or delete on menu_items bumps the single row in
+    catalog_version and stamps the touched row with it. A refresh that
+    finds the version unchanged costs one primary-key read; otherwise only
+    rows stamped after the cached version are reloaded, and a row count
+    check catches deletions. Databases without the version table fall back
+    to loading the whole menu each time.
+
+    Listeners added with add_listener() hear about every change as
+    listener(rows, removed_ids, full). With full=True, rows is the whole
+    menu and replaces everything seen before.
+    """
+    COLUMNS = "item_id, name, description, price, category"
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._items = {}          # item_id -> row dict
+        self._version = None      # catalog version the cached rows reflect
+        self._pending = set()     # item_ids invalidated by hand
+        self._listeners = []
+        self.versioned = True     # False once we find no catalog_version table
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def get_items(self):
+        """Returns the menu rows, refreshing only what changed."""
+        with self._lock:
+            if not self.versioned:
+                return self._load_unversioned()
+            try:
+                change = self._refresh()
+            except (self.backend.Error, PoolTimeoutError) as err:
+                unreachable = (isinstance(err, PoolTimeoutError)
+                               or self.backend.is_disconnect(err))
+                if self._version is None and not unreachable:
+                    # Most likely an older schema without catalog_version
+                    print(f"Menu cache disabled, loading menu directly: {err}")
+                    self.versioned = False
+                    return self._load_unversioned()
+                print(f"Menu refresh failed, serving cached menu: {err}")
+                change = None
+            if change is not None:
+                self._notify(*change)
+            return [self._items[item_id] for item_id in sorted(self._items)]
+
+    def _load_unversioned(self):
+        rows = self.backend.fetch_named('menu_items')
+        self._notify(rows, (), True)
+        return rows
+
+    def _notify(self, rows, removed_ids, full):
+        for listener in self._listeners:
+            try:
+                listener(rows, removed_ids, full)
+            except Exception as e:
+                print(f"Menu cache listener failed: {e}")
+
+    def invalidate(self, item_id=None):
+        """Forces a reload of one item (e.g. after a price edit) or of everything."""
+        with self._lock:
+            if item_id is None:
+                self._items = {}
+                self._version = None
+                self._pending.clear()
+            else:
+                self._pending.add(item_id)
+
+    def _query(self, query, params=()):
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        return self.backend.run(work, write=False)
+
+    def _query_named(self, name):
+        def work(cursor):
+            cursor.execute_named(name)
+            return cursor.fetchall()
+        return self.backend.run(work, write=False)
+
+    def _refresh(self):
+        """Brings the cache up to date; returns (rows, removed_ids, full) or None."""
+        rows = self._query_named('catalog_version')
+        version = rows[0]['version'] if rows else 0
+        if version == self._version and not self._pending:
+            return None
+
+        if self._version is None:
+            rows = self._query_named('menu_items')
+            self._items = {row['item_id']: row for row in rows}
+            self._pending.clear()
+            self._version = version
+            return rows, (), True
+
+        query = f"SELECT {self.COLUMNS} FROM menu_items WHERE row_version > %s"
+        params = (self._version,)
+        if self._pending:
+            ids = sorted(self._pending)
+            query += f" OR item_id IN ({', '.join(['%s'] * len(ids))})"
+            params += tuple(ids)
+            for item_id in ids:
+                self._items.pop(item_id, None)
+        changed = self._query(query, params)
+        for row in changed:
+            self._items[row['item_id']] = row
+        # Invalidated items that didn't come back are gone
+        removed = [item_id for item_id in self._pending if item_id not in self._items]
+        self._pending.clear()
+        self._version = version
+
+        count = self._query("SELECT COUNT(*) AS item_count FROM menu_items")[0]['item_count']
+        if count != len(self._items):
+            # Some rows were deleted; reload the lot
+            self._version = None
+            return self._refresh()
+        return changed, removed, False
+
+# --- MENU SEARCH ---
+def search_tokens(text):
+    """Lower-cased words of a menu field or a search query."""
+    return re.findall(r'\w+', text.casefold()) if text else []
+
+
+class MenuSearchIndex:
+    """In-memory inverted index over menu names, descriptions and categories.
+
+    Each search term matches every item with a word starting with it, and
+    an item must match all the terms. Prefixes up to PREFIX_DEPTH letters
+    have their own posting sets, so the short terms typed first are a
+    single lookup. Longer terms scan the sorted vocabulary from the term
+    on. The index follows the menu cache through apply(), one item at a
+    time, and never runs SQL.
+    """
+    FIELDS = ('name', 'description', 'category')
+    PREFIX_DEPTH = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}         # item_id -> menu row
+        self._item_tokens = {}  # item_id -> set of its tokens
+        self._postings = {}     # token -> set of item_ids
+        self._prefixes = {}     # token prefix (<= PREFIX_DEPTH chars) -> set of item_ids
+        self._vocabulary = []   # sorted tokens, for longer prefixes
+        self.version = 0        # Bumped by every apply(), so callers can spot stale results
+
+    def apply(self, rows, removed_ids=(), full=False):
+        """Menu cache listener: indexes new/changed rows, drops removed ones."""
+        with self._lock:
+            self.version += 1
+            if full:
+                self._rows, self._item_tokens, self._postings, self._prefixes = {}, {}, {}, {}
+                for row in rows:
+                    self._add(row, sort=False)
+                self._vocabulary = sorted(self._postings)
+                return
+            for item_id in removed_ids:
+                self._remove(item_id)
+            for row in rows:
+                self._remove(row['item_id'])
+                self._add(row)
+
+    def search(self, text):
+        """Returns the item_ids matching every term of `text`, or None for no terms."""
+        terms = set(search_tokens(text))
+        if not terms:
+            return None
+        with self._lock:
+            matches = []
+            for term in terms:
+                if len(term) <= self.PREFIX_DEPTH:
+                    found = self._prefixes.get(term)
+                else:
+                    found = set()
+                    start = bisect.bisect_left(self._vocabulary, term)
+                    for token in itertools.islice(self._vocabulary, start, None):
+                        if not token.startswith(term):
+                            break
+                        found |= self._postings[token]
+                if not found:
+                    return set()
+                matches.append(found)
+            matches.sort(key=len)
+            return matches[0].intersection(*matches[1:])
+
+    def rows(self, item_ids):
+        """The indexed rows for `item_ids`, in item_id order."""
+        with self._lock:
+            return [self._rows[item_id] for item_id in sorted(item_ids) if item_id in self._rows]
+
+    def __len__(self):
+        return len(self._item_tokens)
+
+    def _add(self, row, sort=True):
+        item_id = row['item_id']
+        self._rows[item_id] = row
+        tokens = set()
+        for field in self.FIELDS:
+            tokens.update(search_tokens(row.get(field)))
+        self._item_tokens[item_id] = tokens
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                if sort:
+                    bisect.insort(self._vocabulary, token)
+            posting.add(item_id)
+            for depth in range(1, min(len(token), self.PREFIX_DEPTH) + 1):
+                self._prefixes.setdefault(token[:depth], set()).add(item_id)
+
+    def _remove(self, item_id):
+        self._rows.pop(item_id, None)
+        tokens = self._item_tokens.pop(item_id, None)
+        if not tokens:
+            return
+        for token in tokens:
+            posting = self._postings[token]
+            posting.discard(item_id)
+            if not posting:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                del self._vocabulary[index]
+            for depth in range(1, min(len(token), self.PREFIX_DEPTH) + 1):
+                prefix = self._prefixes.get(token[:depth])
+                if prefix is not None:
+                    prefix.discard(item_id)
+                    if not prefix:
+                        del self._prefixes[token[:depth]]
+
+# --- FREQUENTLY ORDERED TOGETHER ---
+class ItemPairIndex:
+    """In-memory top-k "frequently ordered together" lists for every item.
+
+    Loaded from item_pairs, then kept current by counting only the orders
+    saved since (order_id above the highest one seen) and re-ranking just
+    the items they touch, so a lookup is a few dict reads. It catches up
+    at most every refresh_seconds, or on the next lookup after
+    mark_stale() (called when this process saves orders). MySQL can commit
+    a lower order_id after a higher one, so the whole table is re-read
+    every reload_seconds to pick up anything passed over that way.
+    """
+    def __init__(self, backend, top_k=5, refresh_seconds=30, reload_seconds=3600):
+        self.backend = backend
+        self.top_k = top_k
+        self.refresh_seconds = refresh_seconds
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()        # Guards swapping in new lists
+        self._refreshing = threading.Lock()  # Held by the one thread reading the database
+        self._counts = {}      # item_id -> {other item_id: orders with both}
+        self._top = {}         # item_id -> ((other item_id, count), ...), best first
+        self._seen_to = None   # Highest order_id counted; None until loaded
+        self._generation = 0   # Bumped by invalidate()
+        self._checked = 0.0    # time.monotonic() of the last refresh
+        self._loaded = 0.0     # ... and of the last full load
+        self._stale = False
+
+    def suggest(self, item_ids, limit=None):
+        """Ids of the items most often ordered with `item_ids` (and not among them)."""
+        self._refresh_if_due()
+        with self._lock:
+            top = self._top # Replaced, never changed in place
+        scores = {}
+        for item_id in item_ids:
+            for other_id, count in top.get(item_id, ()):
+                scores[other_id] = scores.get(other_id, 0) + count
+        for item_id in item_ids:
+            scores.pop(item_id, None)
+        return heapq.nsmallest(limit or self.top_k, scores,
+                               key=lambda other_id: (-scores[other_id], other_id))
+
+    def mark_stale(self):
+        """Makes the next lookup fold in newly saved orders."""
+        self._stale = True
+
+    def invalidate(self):
+        """Makes the next lookup re-read the whole table (e.g. after a rebuild)."""
+        with self._lock:
+            self._seen_to = None
+            self._generation += 1
+
+    def _refresh_if_due(self):
+        # The database is read without holding _lock, so lookups on other
+        # threads keep serving the current lists meanwhile
+        if not self._refreshing.acquire(blocking=False):
+            return # Another thread is already refreshing
+        try:
+            now = time.monotonic()
+            with self._lock:
+                seen_to, generation = self._seen_to, self._generation
+            if (seen_to is not None and not self._stale
+                    and now - self._checked < self.refresh_seconds):
+                return
+            self._stale = False
+            self._checked = now
+            try:
+                if seen_to is None or now - self._loaded >= self.reload_seconds:
+                    counts, top, seen_to = self._load()
+                    self._loaded = now
+                else:
+                    counts, top, seen_to = self._catch_up(seen_to)
+            except (self.backend.Error, PoolTimeoutError) as err:
+                print(f"Suggestion refresh failed, serving cached lists: {err}")
+                return
+            with self._lock:
+                self._counts, self._top = counts, top
+                if self._generation == generation: # Else invalidated meanwhile: reload next time
+                    self._seen_to = seen_to
+        finally:
+            self._refreshing.release()
+
+    def _rank(self, others):
+        return tuple(heapq.nlargest(self.top_k, others.items(),
+                                    key=lambda pair: (pair[1], -pair[0])))
+
+    def _load(self):
+        """Reads the whole table; returns (counts, top, seen_to)."""
+        def work(cursor):
+            cursor.execute("SELECT COALESCE(MAX(order_id), 0) AS seen_to FROM orders")
+            seen_to = cursor.fetchone()['seen_to']
+            cursor.execute("SELECT item_id, other_id, order_count FROM item_pairs")
+            return seen_to, cursor.fetchall()
+        # One transaction, so the counts and the watermark agree
+        seen_to, rows = self.backend.run(work, write=False)
+        counts = {}
+        for row in rows:
+            counts.setdefault(row['item_id'], {})[row['other_id']] = row['order_count']
+        top = {item_id: self._rank(others) for item_id, others in counts.items()}
+        return counts, top, seen_to
+
+    def _catch_up(self, seen_from):
+        """Counts the orders after seen_from; returns new (counts, top, seen_to).
+
+        Only items touched by those orders get new dicts; the rest are
+        shared with the current lists, which lookups may still be reading.
+        """
+        def work(cursor):
+            cursor.execute("SELECT COALESCE(MAX(order_id), 0) AS seen_to FROM orders")
+            seen_to = cursor.fetchone()['seen_to']
+            if seen_to <= seen_from:
+                return seen_from, []
+            cursor.execute(ITEM_PAIRS_SELECT.format(where="oi.order_id > %s AND oi.order_id <= %s"),
+                           (seen_from, seen_to))
+            return seen_to, cursor.fetchall()
+        seen_to, rows = self.backend.run(work, write=False)
+        if not rows:
+            return self._counts, self._top, seen_to
+        counts, top = dict(self._counts), dict(self._top)
+        touched = set()
+        for row in rows:
+            if row['item_id'] not in touched:
+                counts[row['item_id']] = dict(counts.get(row['item_id'], {}))
+                touched.add(row['item_id'])
+            others = counts[row['item_id']]
+            others[row['other_id']] = others.get(row['other_id'], 0) + row['order_count']
+        for item_id in touched:
+            top[item_id] = self._rank(counts[item_id])
+        return counts, top, seen_to
+
+# --- GROUP COMMIT ---
+class OrderGroupCommitter:
+    """Gathers create_order calls from many threads into shared transactions.
+
+    The first order to arrive opens a window of window_ms; every order that
+    comes in before it closes (up to max_batch) is written in the same
+    transaction, so a busy service pays for one commit per group instead of
+    one per order. Each caller still gets back its own order_id or False.
+    Orders submitted with an idempotency key (journal replays) are saved
+    under it, and if the group can't be written their futures raise
+    instead, so the caller keeps them for a retry. A wider window means
+    fewer commits but more waiting per order.
+    """
+    def __init__(self, backend, window_ms=5, max_batch=32):
+        self.backend = backend
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='order-group-commit', daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id, total_amount, items, key=None):
+        """Queues an order; the returned Future resolves to its order_id or False."""
+        future = Future()
+        self._queue.put((future, (user_id, total_amount, list(items)), key))
+        return future
+
+    def close(self):
+        """Writes whatever is still queued and stops the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group = [first]
+            deadline = time.monotonic() + self.window
+            closing = False
+            while len(group) < self.max_batch:
+                try:
+                    entry = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+                group.append(entry)
+            self._write(group)
+            if closing:
+                return
+
+    def _write(self, group):
+        orders = [order for _, order, _ in group]
+        keys = [key for _, _, key in group]
+        try:
+            results = self.backend.run(
+                lambda cursor: self.backend.insert_order_group(cursor, orders, keys))
+        except Exception as err:
+            print(f"Order Group Error: {err}")
+            for future, _, key in group:
+                if key is None:
+                    future.set_result(False)
+                else:
+                    future.set_exception(err)
+            return
+        for (future, _, _), result in zip(group, results):
+            future.set_result(result)
+
+# --- ORDER JOURNAL ---
+def till_journal_path(till=None):
+    """The journal file of a till; `till` defaults to the host name."""
+    name = re.sub(r'[^\w.-]', '_', till or socket.gethostname()) or 'till'
+    return os.path.join(JOURNAL_CONFIG['dir'], f"{name}.journal")
+
+
+def lock_journal(path):
+    """Takes an exclusive lock on a journal, held while the returned file is open."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    lock_file = open(path + '.lock', 'a+b')
+    try:
+        try:
+            import fcntl
+        except ImportError: # Windows
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise OSError(f"the order journal {path} is in use by another till; "
+                      "give this one its own name with --till") from None
+    return lock_file
+
+
+class OrderJournal:
+    """Append-only local file of orders on their way to the database.
+
+    One JSON object per line: an 'order' line when an order is accepted,
+    then 'saved' once it is in the database, 'failed' if it kept being
+    rejected and 'retry' when a failed order is queued again. Replaying
+    the lines on startup gives back whatever was still outstanding. Each
+    order has a key that is also stored with it in the database, so an
+    order replayed twice (say, the app died right after the commit) is
+    still saved once. Safe to use from several threads. fsync is 'always',
+    'batched' or 'never', as in JOURNAL_CONFIG. Only one process may have a
+    journal open; a second gets OSError.
+    """
+    FSYNC_MODES = ('always', 'batched', 'never')
+
+    def __init__(self, path, fsync='batched', fsync_interval=0.5):
+        if fsync not in self.FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {', '.join(self.FSYNC_MODES)}, not {fsync!r}")
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._sync_timer = None # Pending batched fsync, if any
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event() # Set when there is something to replay
+        self._pending = OrderedDict() # key -> order record, oldest first
+        self._failed = OrderedDict()
+        self._attempts = {} # key -> failed tries so far
+        self._file = None
+        self._lock_file = lock_journal(path)
+        self._load()
+        self._file = open(path, 'ab')
+        if self._pending:
+            self._wakeup.set()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        good_end = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break # Torn by a crash mid-write; only the last line can be
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good_end += len(line)
+                self._apply(record)
+        if good_end < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_end)
+
+    def _apply(self, record):
+        op, key = record['op'], record['key']
+        if op == 'order':
+            self._pending[key] = record
+        elif op == 'saved':
+            self._pending.pop(key, None)
+            self._failed.pop(key, None)
+            self._attempts.pop(key, None)
+        elif op == 'failed':
+            if key in self._pending:
+                self._failed[key] = self._pending.pop(key)
+        elif op == 'retry':
+            if key in self._failed:
+                self._pending[key] = self._failed.pop(key)
+                self._attempts.pop(key, None)
+
+    @staticmethod
+    def _encode(record):
+        # Amounts are written as their exact decimal text, never as floats
+        return json.dumps(record, default=str, separators=(',', ':')).encode('utf-8') + b"\n"
+
+    def _write(self, records):
+        data = b"".join(self._encode(record) for record in records)
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync == 'always':
+            os.fsync(self._file.fileno())
+        elif self.fsync == 'batched' and self._sync_timer is None:
+            # Orders appended before the timer fires share its fsync
+            self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
+        for record in records:
+            self._apply(record)
+
+    def append(self, user_id, total_amount, items):
+        """Records an order; returns its key once it is safely on disk."""
+        record = {'op': 'order', 'key': uuid.uuid4().hex, 'user_id': user_id,
+                  'total_amount': total_amount, 'items': list(items),
+                  'created': datetime.now().isoformat(timespec='seconds')}
+        with self._lock:
+            self._write([record])
+        self._wakeup.set()
+        return record['key']
+
+    def sync(self):
+        """Forces everything appended so far onto the disk."""
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+
+    def next_batch(self, size):
+        """Returns up to `size` (key, (user_id, total_amount, items)) pending orders."""
+        with self._lock:
+            records = list(itertools.islice(self._pending.values(), size))
+        return [(r['key'], (r['user_id'], Decimal(str(r['total_amount'])),
+                            [dict(item, price=Decimal(str(item['price']))) for item in r['items']]))
+                for r in records]
+
+    def record_results(self, results, max_attempts=5):
+        """Takes (key, order_id or False) pairs back from a replay."""
+        records = []
+        with self._lock:
+            for key, order_id in results:
+                if order_id:
+                    records.append({'op': 'saved', 'key': key, 'order_id': order_id})
+                    continue
+                self._attempts[key] = self._attempts.get(key, 0) + 1
+                if self._attempts[key] >= max_attempts:
+                    records.append({'op': 'failed', 'key': key})
+            if records:
+                self._write(records)
+
+    def retry_failed(self):
+        """Queues every failed order for another round of attempts."""
+        with self._lock:
+            records = [{'op': 'retry', 'key': key} for key in self._failed]
+            if records:
+                self._write(records)
+        if records:
+            self._wakeup.set()
+        return len(records)
+
+    def wait(self, timeout):
+        """Blocks until an order is appended or `timeout` seconds pass."""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def counts(self):
+        """Returns (pending, failed)."""
+        with self._lock:
+            return len(self._pending), len(self._failed)
+
+    def backlog(self):
+        """Returns (status, record) for every outstanding order, oldest first."""
+        with self._lock:
+            return ([('pending', r) for r in self._pending.values()]
+                    + [('failed', r) for r in self._failed.values()])
+
+    def compact(self, min_bytes=0):
+        """Rewrites the file with only the outstanding orders, if it is over min_bytes."""
+        with self._lock:
+            if self._file.tell() <= min_bytes:
+                return False
+            records = list(self._pending.values()) + list(self._failed.values())
+            records += [{'op': 'failed', 'key': key} for key in self._failed]
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                for record in records:
+                    f.write(self._encode(record))
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'ab')
+            return True
+
+    def close(self):
+        if self.fsync != 'never':
+            self.sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                self._lock_file.close() # Releases the lock
+                self._lock_file = None
+
+
+class JournalReplayer:
+    """Copies journaled orders into the database on a background thread.
+
+    Orders go in batches of batch_size, one transaction per batch. While
+    the database is down the orders stay in the journal and the replayer
+    backs off (doubling up to max_backoff) before trying again. An order
+    the database keeps rejecting is set aside as failed after
+    max_attempts, so it can't hold up the ones behind it.
+    """
+    def __init__(self, journal, db, batch_size=50, interval=1.0, max_backoff=60.0,
+                 max_attempts=5, compact_bytes=1 << 20):
+        self.journal = journal
+        self.db = db
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.compact_bytes = compact_bytes
+        self.last_error = None # Why the last replay didn't reach the database, if it didn't
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='order-journal-replay', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the thread; anything not yet replayed stays in the journal."""
+        self._stopping.set()
+        self.journal.wake()
+        self._thread.join()
+
+    def _run(self):
+        backoff = self.interval
+        while not self._stopping.is_set():
+            batch = self.journal.next_batch(self.batch_size)
+            if not batch:
+                self.journal.compact(self.compact_bytes)
+                self.journal.wait(self.interval)
+                continue
+            keys = [key for key, _ in batch]
+            try:
+                results = self.db.save_keyed_orders([order for _, order in batch], keys)
+            except Exception as err:
+                self.last_error = err
+                print(f"Order journal: database unavailable ({err}); "
+                      f"retrying in {backoff:.0f}s")
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self.last_error = None
+            backoff = self.interval
+            self.journal.record_results(zip(keys, results), self.max_attempts)
+            if not all(results):
+                self._stopping.wait(self.interval) # Don't hammer the rejected ones
+
+# --- DATABASE MANAGER ---
+class DatabaseManager:
+    def __init__(self, config, pool_config=None, backend='mysql', group_commit=None):
+        self.config = config
+        self.backend = BACKENDS[backend](config, pool_config)
+        self.menu_cache = MenuCache(self.backend)
+        self.menu_index = MenuSearchIndex()
+        self.menu_cache.add_listener(self.menu_index.apply)
+        self.pair_index = ItemPairIndex(self.backend, top_k=RECOMMEND_CONFIG['top_k'],
+                                        refresh_seconds=RECOMMEND_CONFIG['refresh_seconds'],
+                                        reload_seconds=RECOMMEND_CONFIG['reload_seconds'])
+        self.connect()
+
+        group_commit = group_commit or GROUP_COMMIT_CONFIG
+        self.order_committer = None
+        if group_commit.get('enabled'):
+            self.order_committer = OrderGroupCommitter(self.backend,
+                                                       window_ms=group_commit.get('window_ms', 5),
+                                                       max_batch=group_commit.get('max_batch', 32))
+
+    def connect(self):
+        self.backend.connect()
+
+    def close(self):
+        if self.order_committer is not None:
+            self.order_committer.close()
+        return self.backend.close()
+
+    def health_stats(self):
+        return self.backend.health_stats()
+
+    def transaction(self):
+        return self.backend.transaction()
+
+    def run(self, work, write=True):
+        return self.backend.run(work, write)
+
+    def execute_query(self, query, params=()):
+        return self.backend.execute_query(query, params)
+
+    def fetch_query(self, query, params=()):
+        return self.backend.fetch_query(query, params)
+
+    def iter_query(self, query, params=(), rows='dict', batch_size=None):
+        """Streams a query's rows in constant memory (see StorageBackend.iter_query)."""
+        return self.backend.iter_query(query, params, rows=rows, batch_size=batch_size)
+    
+    # --- Password Hashing ---
+    def hash_password(self, password):
+        """Hashes a password using SHA-256."""
+        return hash_password(password)
+
+    def check_password(self, plain_password, hashed_password):
+        """Checks if the plain password matches the hashed one."""
+        return check_password(plain_password, hashed_password)
+    
+    # --- User Functions ---
+    def create_user(self, username, password):
+        return self.backend.create_user(username, password)
+
+    def validate_user(self, username, password):
+        return self.backend.validate_user(username, password)
+
+    # --- Menu Functions ---
+    def get_menu_items(self):
+        return self.menu_cache.get_items()
+
+    def search_menu(self, text):
+        """Item ids matching a search box query (None when it has no terms); no SQL."""
+        return self.menu_index.search(text)
+
+    def menu_rows(self, item_ids):
+        """Menu rows for item ids from search_menu, in item_id order; no SQL."""
+        return self.menu_index.rows(item_ids)
+
+    def get_menu_categories(self):
+        """Distinct categories for the menu tabs (None stands for uncategorized items)."""
+        return [row['category'] for row in self.backend.fetch_named('menu_categories')]
+
+    def get_menu_page(self, category, after_id=0, limit=50):
+        """Up to `limit` items of a category with item_id > after_id, in item_id order."""
+        if category is None:
+            return self.backend.fetch_named('menu_page_uncategorized', (after_id, limit))
+        return self.backend.fetch_named('menu_page', (category, after_id, limit))
+
+    def get_pricing_rules(self):
+        """Active pricing rules, for PricingEngine.load."""
+        return self.backend.fetch_named('pricing_rules')
+
+    def update_menu_item_price(self, item_id, price):
+        """Changes an item's price and makes sure the menu cache picks it up."""
+        query = "UPDATE menu_items SET price = %s WHERE item_id = %s"
+        ok = self.execute_query(query, (price, item_id))
+        self.menu_cache.invalidate(item_id)
+        return ok
+    
+    # --- Order Functions ---
+    def create_orders(self, orders, chunk_size=None):
+        """Bulk-saves (user_id, total_amount, items) orders; returns (saved, failed)."""
+        result = self.backend.create_orders(orders, chunk_size or BULK_IMPORT_CONFIG['chunk_size'])
+        self.pair_index.mark_stale()
+        return result
+
+    def create_order(self, user_id, total_amount, items):
+        """Saves an order; returns its order_id, or False if it failed."""
+        if self.order_committer is not None:
+            order_id = self.order_committer.submit(user_id, total_amount, items).result()
+        else:
+            order_id = self.backend.create_order(user_id, total_amount, items)
+        self.pair_index.mark_stale()
+        return order_id
+
+    def save_keyed_orders(self, orders, keys):
+        """Saves orders under idempotency keys; raises if the database can't be reached."""
+        if self.order_committer is not None:
+            # Joins whatever other tills are sending in the same group commits
+            futures = [self.order_committer.submit(*order, key=key) for order, key in zip(orders, keys)]
+            order_ids = [future.result() for future in futures]
+        else:
+            order_ids = self.backend.save_keyed_orders(orders, keys)
+        self.pair_index.mark_stale()
+        return order_ids
+
+    # --- Frequently Ordered Together ---
+    def suggest_items(self, item_ids, limit=None):
+        """Menu rows of the items most often ordered with `item_ids`, best first."""
+        suggested = self.pair_index.suggest(item_ids, limit)
+        if suggested and not len(self.menu_index):
+            self.get_menu_items() # Fills the menu index
+        rows = {row['item_id']: row for row in self.menu_index.rows(suggested)}
+        return [rows[item_id] for item_id in suggested if item_id in rows]
+
+    def rebuild_item_pairs(self, chunk_size=None, progress=None):
+        """Recounts item_pairs from every order (see StorageBackend.rebuild_item_pairs)."""
+        pairs = self.backend.rebuild_item_pairs(chunk_size or RECOMMEND_CONFIG['rebuild_chunk_size'],
+                                                progress)
+        self.pair_index.invalidate()
+        return pairs
+
+    # --- Sales Reports ---
+    def get_sales_report(self, days=None):
+        """Sales from the rollup tables for the last `days` days, today included (None: all time).
+
+        "Today" is the database's, the same clock the rollups bucket sales
+        by, whatever the till's clock says. Returns a dict with the
+        SALES_REPORT_QUERIES results ('totals' is one row) plus
+        'history_pending', the old order ids not rolled up yet.
+        """
+        if days is None:
+            since, params = "%s", (ALL_SALES,)
+        else:
+            since, params = self.backend.DAYS_AGO_SQL, (days - 1,)
+        report = {name: self.fetch_query(query.format(since=since), params)
+                  for name, query in SALES_REPORT_QUERIES.items()}
+        report['totals'] = report['totals'][0] if report['totals'] else None
+        report['history_pending'] = self.backend.rollup_backlog()
+        return report
+
+    def catch_up_rollups(self, chunk_size=None, progress=None):
+        """Rolls up orders from before the rollup tables (see StorageBackend.catch_up_rollups)."""
+        return self.backend.catch_up_rollups(chunk_size or ROLLUP_CONFIG['chunk_size'], progress)
+
+    # --- Feedback Functions ---
+    def submit_feedback(self, user_id, rating, comments):
+        return self.backend.execute_named('submit_feedback', (user_id, rating, comments))
+
+
+# --- OPENING THE DATABASE ---
+def open_database(**kwargs):
+    """Opens the database chosen by DB_BACKEND."""
+    if DB_BACKEND == 'sqlite':
+        return DatabaseManager(SQLITE_CONFIG, backend='sqlite', **kwargs)
+    return DatabaseManager(DB_CONFIG, **kwargs)
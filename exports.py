@@ -0,0 +1,319 @@
+"""Streaming exports of orders, order lines and feedback to CSV and .rcol files."""
+import sys
+import csv
+import itertools
+import json
+import os
+import struct
+import time
+from array import array
+
+from cart import to_cents
+from database import DatabaseStartupError, open_database
+
+# --- EXPORTS (export) ---
+EXPORT_CONFIG = {
+    'dir': 'exports',       # Where export files and export_state.json go
+    'chunk_rows': 65536,    # Rows read and written at a time (bounds memory use)
+    # Ids are handed out before commit, so a row can appear after rows with
+    # higher ids. Each run stops before the first row written less than
+    # this long ago; any transaction open longer could still lose rows.
+    'commit_grace_seconds': 60
+}
+
+# --- EXPORTS ---
+# Nightly dumps for accounting. Rows are streamed in id order through
+# iter_query (an unbuffered, server-side cursor on MySQL) and written one
+# chunk at a time, so memory use is set by chunk_rows, not the table size.
+# Each run exports the rows after the last id the previous run finished
+# (kept in export_state.json) into new files, up to the first row that may
+# still have uncommitted neighbours with lower ids (see EXPORT_CONFIG).
+#
+# table -> (id column, ((column, type), ...)). Types:
+#   int       - integer, NULL allowed
+#   money     - whole cents (int64 in .rcol, "12.50" in CSV)
+#   timestamp - local time; seconds since the epoch in .rcol, ISO text in CSV
+#   str       - UTF-8 text
+EXPORT_TABLES = {
+    'orders': ('order_id', (('order_id', 'int'), ('user_id', 'int'), ('total_amount', 'money'),
+                            ('order_date', 'timestamp'), ('order_key', 'str'))),
+    'order_items': ('order_item_id', (('order_item_id', 'int'), ('order_id', 'int'), ('item_id', 'int'),
+                                      ('quantity', 'int'), ('price_per_item', 'money'))),
+    'feedback': ('feedback_id', (('feedback_id', 'int'), ('user_id', 'int'), ('rating', 'int'),
+                                 ('comments', 'str'), ('submitted_at', 'timestamp'))),
+}
+
+# table -> the lowest id of a row written since {since}; export stops short of it
+EXPORT_RECENT_ROWS = {
+    'orders': "SELECT MIN(order_id) FROM orders WHERE order_date > {since}",
+    'order_items': ("SELECT MIN(r.order_item_id) FROM order_items r "
+                    "JOIN orders ro ON ro.order_id = r.order_id WHERE ro.order_date > {since}"),
+    'feedback': "SELECT MIN(feedback_id) FROM feedback WHERE submitted_at > {since}",
+}
+
+
+def export_converters(backend):
+    """Type -> function turning a driver value into its exported value (None stays None)."""
+    def money(value):
+        return to_cents(value)
+
+    def timestamp(value):
+        if isinstance(value, str):
+            return backend.parse_order_time(value)
+        return value
+
+    return {'int': int, 'money': money, 'timestamp': timestamp, 'str': str}
+
+
+def csv_value(kind, value):
+    if value is None:
+        return ''
+    if kind == 'money':
+        return f"{value // 100}.{value % 100:02d}" if value >= 0 else f"-{csv_value(kind, -value)}"
+    if kind == 'timestamp':
+        return value.isoformat(sep=' ')
+    return value
+
+
+class ColumnarFileWriter:
+    """Writes the .rcol columnar format, one chunk of rows at a time.
+
+    Layout: MAGIC, then the chunks, then a JSON footer, then the footer's
+    length (little-endian uint64) and MAGIC again. Within a chunk each
+    column is stored contiguously: int, money and timestamp columns as
+    little-endian int64, str columns as their UTF-8 bytes plus rows + 1
+    int64 offsets. A column with NULLs also gets a byte per row (1 =
+    NULL). The footer lists the columns and, for every chunk, its row
+    count, id range and where each column's parts start and end, so a
+    reader can seek straight to the chunks and columns it wants.
+    """
+    MAGIC = b"RCOL\x01\x00\x00\x00"
+
+    def __init__(self, path, table, columns):
+        self.columns = columns
+        self._file = open(path, 'wb')
+        self._file.write(self.MAGIC)
+        self._footer = {'table': table,
+                        'columns': [{'name': name, 'type': kind} for name, kind in columns],
+                        'chunks': []}
+
+    def _put(self, data):
+        offset = self._file.tell()
+        self._file.write(data)
+        return [offset, len(data)]
+
+    @staticmethod
+    def _int64(values):
+        packed = array('q', values)
+        if sys.byteorder != 'little':
+            packed.byteswap()
+        return packed.tobytes()
+
+    def write_chunk(self, rows, first_id, last_id):
+        """Writes converted rows (tuples in column order) as one chunk."""
+        chunk = {'rows': len(rows), 'first_id': first_id, 'last_id': last_id, 'columns': []}
+        for index, (_, kind) in enumerate(self.columns):
+            values = [row[index] for row in rows]
+            entry = {'nulls': None}
+            if None in values:
+                entry['nulls'] = self._put(bytes(value is None for value in values))
+            if kind == 'str':
+                encoded = [value.encode('utf-8') if value is not None else b"" for value in values]
+                entry['offsets'] = self._put(self._int64(itertools.accumulate(map(len, encoded), initial=0)))
+                entry['data'] = self._put(b"".join(encoded))
+            else:
+                if kind == 'timestamp':
+                    values = [int(value.timestamp()) if value is not None else 0 for value in values]
+                entry['data'] = self._put(self._int64(value if value is not None else 0
+                                                      for value in values))
+            chunk['columns'].append(entry)
+        self._footer['chunks'].append(chunk)
+
+    def close(self):
+        footer = json.dumps(self._footer, separators=(',', ':')).encode('utf-8')
+        self._file.write(footer + struct.pack('<Q', len(footer)) + self.MAGIC)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def discard(self):
+        """Closes the file without a footer, after a failed write."""
+        self._file.close()
+
+
+class ColumnarFileReader:
+    """Reads .rcol files written by ColumnarFileWriter, a chunk at a time."""
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        magic = ColumnarFileWriter.MAGIC
+        tail_size = 8 + len(magic)
+        self._file.seek(-tail_size, os.SEEK_END)
+        tail = self._file.read(tail_size)
+        if self._file.seek(0) != 0 or self._file.read(len(magic)) != magic or tail[8:] != magic:
+            raise ValueError(f"{path} is not a complete .rcol file")
+        footer_size = struct.unpack('<Q', tail[:8])[0]
+        self._file.seek(-tail_size - footer_size, os.SEEK_END)
+        footer = json.loads(self._file.read(footer_size))
+        self.table = footer['table']
+        self.columns = [(column['name'], column['type']) for column in footer['columns']]
+        self.chunks = footer['chunks']
+
+    def _get(self, extent):
+        self._file.seek(extent[0])
+        return self._file.read(extent[1])
+
+    def _int64(self, extent):
+        values = array('q')
+        values.frombytes(self._get(extent))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values
+
+    def read_chunk(self, index, columns=None):
+        """Returns {column: list of values} for one chunk; timestamps as epoch seconds."""
+        chunk = self.chunks[index]
+        result = {}
+        for (name, kind), entry in zip(self.columns, chunk['columns']):
+            if columns is not None and name not in columns:
+                continue
+            if kind == 'str':
+                offsets = self._int64(entry['offsets'])
+                data = self._get(entry['data'])
+                values = [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+            else:
+                values = self._int64(entry['data']).tolist()
+            if entry['nulls'] is not None:
+                nulls = self._get(entry['nulls'])
+                values = [None if null else value for value, null in zip(values, nulls)]
+            result[name] = values
+        return result
+
+    def close(self):
+        self._file.close()
+
+
+def load_export_state(directory):
+    try:
+        with open(os.path.join(directory, 'export_state.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_export_state(directory, state):
+    temp_path = os.path.join(directory, 'export_state.json.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, os.path.join(directory, 'export_state.json'))
+
+
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def export_table(db, table, directory, formats=('csv', 'rcol'), after_id=0,
+                 chunk_rows=EXPORT_CONFIG['chunk_rows'],
+                 grace_seconds=EXPORT_CONFIG['commit_grace_seconds']):
+    """Streams the rows of `table` with id > after_id into new export files.
+
+    Rows are exported in id order up to, not including, the first one
+    written in the last grace_seconds (by the database's clock), so the
+    next run's after_id can't skip a row committed late. Files are written
+    under temporary names and renamed to <table>-<first id>-<last id>.<format>
+    once complete; an export that fails removes them. Returns (rows
+    written, last id written or after_id, final paths).
+    """
+    id_column, columns = EXPORT_TABLES[table]
+    convert = export_converters(db.backend)
+    converters = [convert[kind] for _, kind in columns]
+    kinds = [kind for _, kind in columns]
+    # One statement, so the cut-off and the rows come from the same snapshot
+    recent = EXPORT_RECENT_ROWS[table].format(since=db.backend.SECONDS_AGO_SQL)
+    query = (f"SELECT {', '.join(name for name, _ in columns)} FROM {table} "
+             f"WHERE {id_column} > %s AND {id_column} < COALESCE(({recent}), {2 ** 63 - 1}) "
+             f"ORDER BY {id_column}")
+    temp_paths = {fmt: os.path.join(directory, f".{table}.{fmt}.tmp") for fmt in formats}
+    csv_file = writer = rcol = None
+    count, first_id, last_id = 0, None, after_id
+    try:
+        if 'csv' in formats:
+            csv_file = open(temp_paths['csv'], 'w', newline='', encoding='utf-8')
+            writer = csv.writer(csv_file)
+            writer.writerow(name for name, _ in columns)
+        if 'rcol' in formats:
+            rcol = ColumnarFileWriter(temp_paths['rcol'], table, columns)
+        rows = db.iter_query(query, (after_id, grace_seconds), rows='tuple', batch_size=chunk_rows)
+        while True:
+            chunk = [tuple(None if value is None else fn(value) for fn, value in zip(converters, row))
+                     for row in itertools.islice(rows, chunk_rows)]
+            if not chunk:
+                break
+            if first_id is None:
+                first_id = chunk[0][0]
+            last_id = chunk[-1][0]
+            count += len(chunk)
+            if writer is not None:
+                writer.writerows([csv_value(kind, value) for kind, value in zip(kinds, row)]
+                                 for row in chunk)
+            if rcol is not None:
+                rcol.write_chunk(chunk, chunk[0][0], chunk[-1][0])
+        if csv_file is not None:
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
+            csv_file.close()
+        if rcol is not None:
+            rcol.close()
+    except BaseException:
+        # Never leave a half-written file behind for the next run to trip over
+        if csv_file is not None:
+            csv_file.close()
+        if rcol is not None:
+            rcol.discard()
+        _remove_files(temp_paths.values())
+        raise
+    if not count:
+        _remove_files(temp_paths.values())
+        return count, last_id, []
+    paths = []
+    for fmt, temp_path in temp_paths.items():
+        path = os.path.join(directory, f"{table}-{first_id}-{last_id}.{fmt}")
+        os.replace(temp_path, path)
+        paths.append(path)
+    return count, last_id, paths
+
+
+def export_command(args):
+    directory = args.dir
+    formats = ('csv', 'rcol') if args.format == 'both' else (args.format,)
+    os.makedirs(directory, exist_ok=True)
+    state = {} if args.full else load_export_state(directory)
+    try:
+        db = open_database()
+    except DatabaseStartupError as err:
+        print(f"{err.title}: {err}")
+        return 1
+    try:
+        for table in args.tables:
+            start = time.perf_counter()
+            after_id = state.get(table, 0)
+            count, last_id, paths = export_table(db, table, directory, formats,
+                                                 after_id=after_id, chunk_rows=args.chunk_rows,
+                                                 grace_seconds=args.grace_seconds)
+            elapsed = time.perf_counter() - start
+            if count:
+                state[table] = last_id
+                save_export_state(directory, state)
+                print(f"{table}: exported {count} row(s) after id {after_id} in {elapsed:.1f}s "
+                      f"to {', '.join(paths)}")
+            else:
+                print(f"{table}: nothing new after id {after_id}")
+    except Exception as err:
+        print(f"Export Error: {err}")
+        return 1
+    finally:
+        db.close()
+    return 0
@@ -1,17 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import mysql.connector
-import hashlib  # For hashing passwords
 import sys
-
-# --- !!! IMPORTANT: CONFIGURE YOUR MYSQL CONNECTION HERE !!! ---
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',         # Your MySQL username
-    'password': 'patlu', # Your MySQL password
-    'database': 'restaurant_db' # The database to create/use
-}
-
+import threading
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from cart import Cart, CartPricer, PricingEngine, format_cents, from_cents, to_cents
+from database import (BACKENDS, DB_BACKEND, JOURNAL_CONFIG, DatabaseStartupError, JournalReplayer,
+                      OrderJournal, open_database, till_journal_path)
+from service import open_service
 
 # --- STYLING ---
 STYLE_CONFIG = {
@@ -25,228 +26,112 @@ STYLE_CONFIG = {
     "BUTTON_FONT": ("Arial", 12, "bold")
 }
 
-# --- DATABASE MANAGER ---
-class DatabaseManager:
-    def __init__(self, config):
-        self.config = config
-        self.connection = None
-        self.connect()
+# --- BACKGROUND DATABASE CALLS ---
+EXECUTOR_CONFIG = {
+    'workers': 4,   # Threads running database calls for the UI
+    'poll_ms': 25   # How often the UI checks for finished calls
+}
 
-    def connect(self):
-        try:
-            # Try to connect to the specified database
-            self.connection = mysql.connector.connect(**self.config)
-            print("Successfully connected to database.")
-        except mysql.connector.Error as err:
-            if err.errno == 1049: # Unknown database
-                print("Database not found. Attempting to create and set up...")
-                self.initial_setup()
-                # Try connecting again after setup
-                try:
-                    self.connection = mysql.connector.connect(**self.config)
-                    print("Database created and connected successfully.")
-                except mysql.connector.Error as err:
-                    print(f"Failed to connect after setup: {err}")
-                    messagebox.showerror("Database Error", f"Failed to connect after setup: {err}")
-                    sys.exit(1)
-            else:
-                # Other error (e.g., wrong password, server down)
-                print(f"Error: {err}")
-                messagebox.showerror(
-                    "Database Error", 
-                    f"Could not connect to MySQL: {err}\n"
-                    "Please check your credentials in DB_CONFIG."
-                )
-                sys.exit(1)
-
-    def initial_setup(self):
-        """Connects to MySQL server and runs the setup script."""
-        temp_config = self.config.copy()
-        db_name = temp_config.pop('database') # Get 'restaurant_db' and remove it for now
-        
-        try:
-            # Connect to MySQL server (without a specific db)
-            temp_conn = mysql.connector.connect(**temp_config)
-            cursor = temp_conn.cursor()
-            
-            # Split script into individual commands
-            sql_commands = [cmd.strip() for cmd in SETUP_SQL_SCRIPT.split(';\n') if cmd.strip()]
-            
-            for command in sql_commands:
-                try:
-                    if command:
-                        cursor.execute(command)
-                except mysql.connector.Error as err:
-                    # Ignore "database exists" or "table exists" errors
-                    if err.errno == 1007 or err.errno == 1050:
-                        print(f"Ignoring error: {err}")
-                    else:
-                        print(f"Error executing command: {command}\n{err}")
-            
-            temp_conn.commit()
-            cursor.close()
-            temp_conn.close()
-            print("Database setup script executed.")
-        except mysql.connector.Error as err:
-            print(f"Failed during initial setup: {err}")
-            messagebox.showerror("Setup Error", f"Failed to set up database: {err}")
-            sys.exit(1)
-
-    def get_cursor(self):
-        # Check if connection is lost and reconnect if needed
-        try:
-            if not self.connection or not self.connection.is_connected():
-                self.connect()
-            cursor = self.connection.cursor(dictionary=True)
-            # Try a simple query to ensure connection is really alive
-            cursor.execute("SELECT 1")
-            cursor.fetchall()
-            # If we are here, connection is good. Re-create cursor.
-            return self.connection.cursor(dictionary=True)
-        except mysql.connector.Error as err:
-            print(f"Reconnecting due to error: {err}")
-            self.connect() # Attempt to reconnect
-            return self.connection.cursor(dictionary=True)
-
-
-    def execute_query(self, query, params=()):
-        cursor = self.get_cursor()
-        try:
-            cursor.execute(query, params)
-            self.connection.commit()
-            cursor.close()
-            return True
-        except mysql.connector.Error as err:
-            print(f"Query Error: {err}")
-            self.connection.rollback()
-            cursor.close()
-            return False
+# --- MENU DISPLAY ---
+MENU_CONFIG = {
+    'page_size': 50,     # Items fetched per query as a category tab scrolls
+    'prefetch_rows': 25, # Fetch the next page once this close to the end
+    'row_height': 100,   # Pixel height of one row in the virtualized list
+    'search_refresh_ms': 30000 # How often search checks the menu cache for edits
+}
 
-    def fetch_query(self, query, params=()):
-        cursor = self.get_cursor()
-        try:
-            cursor.execute(query, params)
-            result = cursor.fetchall()
-            cursor.close()
-            return result
-        except mysql.connector.Error as err:
-            print(f"Fetch Error: {err}")
-            cursor.close()
-            return []
-    
-    # --- Password Hashing ---
-    def hash_password(self, password):
-        """Hashes a password using SHA-256."""
-        return hashlib.sha256(password.encode()).hexdigest()
-
-    def check_password(self, plain_password, hashed_password):
-        """Checks if the plain password matches the hashed one."""
-        return self.hash_password(plain_password) == hashed_password
-    
-    # --- User Functions ---
-    def create_user(self, username, password):
-        hashed_pw = self.hash_password(password)
-        query = "INSERT INTO users (username, password_hash) VALUES (%s, %s)"
-        cursor = self.get_cursor()
-        try:
-            cursor.execute(query, (username, hashed_pw))
-            self.connection.commit()
-            cursor.close()
-            return "SUCCESS" # Return a success code
-        except mysql.connector.Error as err:
-            print(f"Create User Error: {err}")
-            self.connection.rollback()
-            cursor.close()
-            if err.errno == 1062: # Duplicate entry
-                return "DUPLICATE"
-            return f"OTHER_ERROR: {err}" # Any other error
-
-    def validate_user(self, username, password):
-        query = "SELECT user_id, password_hash FROM users WHERE username = %s"
-        users = self.fetch_query(query, (username,))
-        if users:
-            user = users[0]
-            if self.check_password(password, user['password_hash']):
-                return user['user_id'] # Login success
-        return None # Login fail
-
-    # --- Menu Functions ---
-    def get_menu_items(self):
-        query = "SELECT item_id, name, description, price, category FROM menu_items"
-        return self.fetch_query(query)
-    
-    # --- Order Functions ---
-    def create_order(self, user_id, total_amount, items):
-        order_query = "INSERT INTO orders (user_id, total_amount) VALUES (%s, %s)"
+# --- PAGE CACHE ---
+# Pages are hidden rather than destroyed when you leave them, so going
+# back (e.g. logout and login again) reuses the built widgets and data.
+PAGE_CACHE_CONFIG = {
+    'max_pages': 3 # Least recently shown pages beyond this are destroyed
+}
+
+# --- BACKGROUND DATABASE EXECUTOR ---
+class DatabaseExecutor:
+    """Runs database calls on worker threads so the Tk mainloop never blocks.
+
+    submit() returns a Future. Worker threads never touch widgets: finished
+    futures are queued, and an after() loop on the Tk thread drains the
+    queue and calls on_done / on_error there. Calls can be tied to an owner
+    widget; cancel_for() drops every pending call of a widget and its
+    children, and results for a destroyed owner are thrown away.
+    """
+    def __init__(self, root, workers=4, poll_ms=25):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db-worker')
+        self._finished = queue.SimpleQueue()
+        self._pending = {}  # future -> (owner path, on_done, on_error)
+        self._poll_job = None
+
+    def submit(self, fn, *args, on_done=None, on_error=None, owner=None):
+        future = self._pool.submit(fn, *args)
+        owner_path = str(owner) if owner is not None else None
+        self._pending[future] = (owner_path, on_done, on_error)
+        future.add_done_callback(self._finished.put)
+        if self._poll_job is None:
+            self._poll_job = self.root.after(self.poll_ms, self._poll)
+        return future
+
+    def cancel_for(self, widget):
+        """Cancels calls made on behalf of a widget that is being torn down."""
+        path = str(widget)
+        for future, (owner_path, _, _) in list(self._pending.items()):
+            if owner_path and (owner_path == path or owner_path.startswith(path + '.')):
+                future.cancel() # Only stops it if no worker has picked it up yet
+                del self._pending[future]
+
+    def shutdown(self):
+        for future in list(self._pending):
+            future.cancel()
+        self._pending.clear()
+        if self._poll_job is not None:
+            try:
+                self.root.after_cancel(self._poll_job)
+            except tk.TclError:
+                pass # The window is already gone
+            self._poll_job = None
+        self._pool.shutdown(wait=False)
+
+    def _poll(self):
+        """Delivers finished calls on the Tk thread."""
+        self._poll_job = None
+        while True:
+            try:
+                future = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            entry = self._pending.pop(future, None)
+            if entry is None or future.cancelled():
+                continue # Cancelled, or its page was torn down
+            owner_path, on_done, on_error = entry
+            if owner_path and not self._widget_exists(owner_path):
+                continue
+            error = future.exception()
+            try:
+                if error is not None:
+                    if on_error:
+                        on_error(error)
+                    else:
+                        print(f"Background database call failed: {error}")
+                elif on_done:
+                    on_done(future.result())
+            except Exception as e:
+                print(f"Error handling database result: {e}")
+        if self._pending:
+            self._poll_job = self.root.after(self.poll_ms, self._poll)
+
+    def _widget_exists(self, path):
         try:
-            cursor = self.get_cursor()
-            cursor.execute(order_query, (user_id, total_amount))
-            order_id = cursor.lastrowid
-            
-            # Now, add all items to the order_items table
-            item_query = """
-                INSERT INTO order_items (order_id, item_id, quantity, price_per_item) 
-                VALUES (%s, %s, %s, %s)
-            """
-            item_data = [
-                (order_id, item['item_id'], item['quantity'], item['price'])
-                for item in items
-            ]
-            cursor.executemany(item_query, item_data)
-            
-            self.connection.commit()
-            cursor.close()
-            return True
-        except mysql.connector.Error as err:
-            print(f"Order Error: {err}")
-            self.connection.rollback()
-            cursor.close()
+            return bool(int(self.root.tk.call('winfo', 'exists', path)))
+        except tk.TclError:
             return False
-            
-    # --- Feedback Functions ---
-    def submit_feedback(self, user_id, rating, comments):
-        query = "INSERT INTO feedback (user_id, rating, comments) VALUES (%s, %s, %s)"
-        return self.execute_query(query, (user_id, rating, comments))
-
-# +++ HELPER CLASS FOR SCROLLABLE FRAME +++
-# We need this to make a scrollable list of checkboxes
-class ScrollableFrame(ttk.Frame):
-    def __init__(self, container, *args, **kwargs):
-        super().__init__(container, *args, **kwargs)
-        
-        # Create a canvas
-        self.canvas = tk.Canvas(self, bg=STYLE_CONFIG["FRAME_COLOR"], highlightthickness=0)
-        
-        # Create a scrollbar
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
-        
-        # This frame will hold all the widgets (checkboxes, labels, etc.)
-        self.scrollable_frame = ttk.Frame(self.canvas, style='Content.TFrame')
-
-        # Bind the scrollable frame's configure event to the canvas
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(
-                scrollregion=self.canvas.bbox("all")
-            )
-        )
-
-        # Create the canvas window
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-
-        # Configure the canvas to use the scrollbar
-        self.canvas.configure(yscrollcommand=scrollbar.set)
 
-        # Pack the canvas and scrollbar
-        self.canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-
-        # --- THIS IS THE FIX ---
-        # Bind mouse wheel scrolling to the canvas, not the whole app
-        # This handles Windows, macOS, and Linux scrolling
-        self.canvas.bind("<Enter>", self._bind_mousewheel)
-        self.canvas.bind("<Leave>", self._unbind_mousewheel)
 
+# +++ MOUSE WHEEL SUPPORT FOR CANVAS-BASED LISTS +++
+class MouseWheelMixin:
+    """Scrolls self.canvas with the mouse wheel while the pointer is over it."""
     def _bind_mousewheel(self, event):
         """Binds scroll events when mouse enters the canvas."""
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)  # Windows/macOS
@@ -261,36 +146,306 @@ class ScrollableFrame(ttk.Frame):
 
     def _on_mousewheel(self, event):
         """Handles cross-platform mouse wheel scrolling."""
-        if hasattr(event, 'delta'): # Windows/macOS
-            self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
-        elif event.num == 4: # Linux scroll up
+        # Check the Linux buttons first: their events also carry a (zero) delta
+        if event.num == 4: # Linux scroll up
             self.canvas.yview_scroll(-1, "units")
         elif event.num == 5: # Linux scroll down
             self.canvas.yview_scroll(1, "units")
+        elif event.delta: # Windows/macOS
+            self.canvas.yview_scroll(int(-1 * (event.delta / 120)) or (-1 if event.delta > 0 else 1), "units")
+
+
+# +++ SHARED MENU SELECTIONS +++
+class MenuSelection:
+    """The ticked menu items and their quantities, keyed by item_id.
+
+    Every list on the Menu tab shares one, so an item ticked in search
+    results shows as ticked in its category tab too, and is added once.
+    """
+    def __init__(self):
+        self.checked = {}     # item_id -> menu row, in the order they were ticked
+        self.quantities = {}  # item_id -> quantity, for those not left at 1
+
+    def is_checked(self, item_id):
+        return item_id in self.checked
+
+    def set_checked(self, item, checked):
+        if checked:
+            self.checked[item['item_id']] = item
+        else:
+            self.checked.pop(item['item_id'], None)
+
+    def quantity(self, item_id):
+        return self.quantities.get(item_id, 1)
+
+    def set_quantity(self, item_id, quantity):
+        if quantity == 1:
+            self.quantities.pop(item_id, None)
+        else:
+            self.quantities[item_id] = quantity
+
+    def items(self):
+        """Yields (item, quantity) for every ticked menu item."""
+        for item_id, item in self.checked.items():
+            yield item, self.quantity(item_id)
+
+    def clear(self):
+        self.checked.clear()
+        self.quantities.clear()
+
+
+# +++ HELPER CLASS FOR VIRTUALIZED MENU LIST +++
+# Only the rows on screen exist as widgets; a small pool of row widgets is
+# re-pointed at different menu items as the list scrolls.
+class VirtualMenuList(MouseWheelMixin, ttk.Frame):
+    def __init__(self, container, row_height=100, *args, on_near_end=None, prefetch_rows=0,
+                 selection=None, **kwargs):
+        super().__init__(container, *args, **kwargs)
+        self.row_height = row_height
+        # Called when the view comes within prefetch_rows of the last item,
+        # so a paged list can fetch more before the user gets there
+        self.on_near_end = on_near_end
+        self.prefetch_rows = prefetch_rows
+        self.items = []
+        self.view = None  # Indexes of the items shown, in order (None: all of them)
+        # Ticks and quantities live outside the list, so they survive a new
+        # set of items and are seen by every list sharing the selection
+        self.selection = selection if selection is not None else MenuSelection()
+        self.rows = []  # Pooled row widgets; position p is drawn by rows[p % len(rows)]
+
+        self.canvas = tk.Canvas(self, bg=STYLE_CONFIG["FRAME_COLOR"], highlightthickness=0,
+                                yscrollincrement=row_height // 4)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_yview)
+
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.canvas.bind("<Configure>", self._on_resize)
+        self.canvas.bind("<Enter>", self._bind_mousewheel)
+        self.canvas.bind("<Leave>", self._unbind_mousewheel)
+        # Another list may have changed the shared selection while this one was hidden
+        self.bind("<Map>", lambda e: self.refresh())
+
+    def set_items(self, items):
+        """Shows a new list of menu items; selections are kept."""
+        self.items = items
+        self.set_view(None)
+
+    def append_items(self, items):
+        """Adds items to the end of the list, keeping selections and scroll position."""
+        self.items.extend(items)
+        shown = len(self.items) if self.view is None else len(self.view)
+        self.canvas.configure(scrollregion=(0, 0, 0, shown * self.row_height))
+        self._render()
+
+    def set_view(self, indexes):
+        """Shows only the items at `indexes` (None shows all); selections are kept."""
+        self.store_quantities()
+        self.view = indexes
+        for row in self.rows:
+            row.index = None
+        shown = len(self.items) if indexes is None else len(indexes)
+        self.canvas.configure(scrollregion=(0, 0, 0, shown * self.row_height))
+        self.canvas.yview_moveto(0)
+        self._render()
+
+    def refresh(self):
+        """Redraws the visible rows from the selection."""
+        for row in self.rows:
+            row.index = None
+        self._render()
+
+    def _on_yview(self, first, last):
+        self.scrollbar.set(first, last)
+        self._render()
+
+    def _on_resize(self, event):
+        # Enough pooled rows to cover the visible height plus one partly shown
+        needed = event.height // self.row_height + 2
+        while len(self.rows) < needed:
+            self.rows.append(self._make_row())
+        # The mapping item -> row depends on the pool size, so redraw all
+        for row in self.rows:
+            row.index = None
+            self.canvas.itemconfigure(row.window, width=event.width)
+            row.desc_label.configure(wraplength=max(event.width - 250, 100))
+        self._render()
+
+    def _make_row(self):
+        """Builds one reusable row: checkbox, description, price and quantity."""
+        item_frame = ttk.Frame(self.canvas, style='Content.TFrame', padding=10, relief="solid", borderwidth=1)
+        item_frame.index = None
+        item_frame.window = self.canvas.create_window(
+            0, 0, window=item_frame, anchor="nw",
+            height=self.row_height - 10, state='hidden')
+
+        left_frame = ttk.Frame(item_frame, style='Content.TFrame')
+        left_frame.pack(side='left', fill='x', expand=True, padx=(0, 20))
+        right_frame = ttk.Frame(item_frame, style='Content.TFrame')
+        right_frame.pack(side='right', fill='none')
+
+        # One Tk variable per pooled row, not per menu item
+        item_frame.check_var = tk.BooleanVar()
+        item_frame.name_check = ttk.Checkbutton(
+            left_frame, variable=item_frame.check_var, style='MenuName.TCheckbutton',
+            command=lambda row=item_frame: self._on_check(row))
+        item_frame.name_check.pack(anchor='w')
+
+        item_frame.desc_label = ttk.Label(left_frame, style='Content.TLabel', wraplength=400, justify='left')
+        item_frame.desc_label.pack(anchor='w', pady=(5,0))
+
+        item_frame.price_label = ttk.Label(right_frame, style='MenuPrice.TLabel')
+        item_frame.price_label.pack(anchor='e')
+
+        item_frame.spinbox = ttk.Spinbox(right_frame, from_=1, to=10, width=5,
+                                         command=lambda row=item_frame: self._store_quantity(row))
+        item_frame.spinbox.pack(anchor='e', pady=(5,0))
+        item_frame.spinbox.bind("<KeyRelease>", lambda e, row=item_frame: self._store_quantity(row))
+        return item_frame
+
+    def _render(self):
+        """Points the pooled rows at the items currently in view."""
+        if not self.rows:
+            return
+        view = self.view
+        first = max(0, int(self.canvas.canvasy(0) // self.row_height))
+        last = min(len(self.items) if view is None else len(view), first + len(self.rows))
+        shown = set()
+        for position in range(first, last):
+            index = position if view is None else view[position]
+            row = self.rows[position % len(self.rows)]
+            shown.add(id(row))
+            if row.index != index:
+                self._store_quantity(row)
+                self._bind_row(row, index)
+                self.canvas.coords(row.window, 0, position * self.row_height)
+                self.canvas.itemconfigure(row.window, state='normal')
+        for row in self.rows:
+            if id(row) not in shown and row.index is not None:
+                self._store_quantity(row)
+                row.index = None
+                self.canvas.itemconfigure(row.window, state='hidden')
+        if self.on_near_end is not None and view is None \
+                and last + self.prefetch_rows >= len(self.items):
+            self.on_near_end()
+
+    def _bind_row(self, row, index):
+        item = self.items[index]
+        row.index = index
+        row.name_check.configure(text=item['name'])
+        row.check_var.set(self.selection.is_checked(item['item_id']))
+        row.desc_label.configure(text=item['description'] or "")
+        row.price_label.configure(text=f"${item['price']:.2f}")
+        row.spinbox.set(self.selection.quantity(item['item_id']))
+
+    def _on_check(self, row):
+        if row.index is not None:
+            self.selection.set_checked(self.items[row.index], row.check_var.get())
+
+    def _store_quantity(self, row):
+        """Copies a row's spinbox value back into the selection."""
+        if row.index is None:
+            return
+        try:
+            quantity = int(row.spinbox.get())
+        except ValueError:
+            return # Keep the last valid value while the user is typing
+        if quantity > 0:
+            self.selection.set_quantity(self.items[row.index]['item_id'], quantity)
+
+    def store_quantities(self):
+        for row in self.rows:
+            self._store_quantity(row)
 
 
 # --- MAIN APPLICATION CONTROLLER ---
 class RestaurantApp(tk.Tk):
-    def __init__(self, db):
+    def __init__(self, db=None, profile=None, service=None, till=None):
         super().__init__()
-        self.db = db
+        self.db = db # None until the background connect finishes (see connect_database)
+        self.service = service # (host, port) of an order service to use instead of the database
+        self.profile = profile or StartupProfile()
+        self.exit_code = 0
         self.current_user_id = None
         self.current_user_name = None
-        self.current_order = {} # A dictionary to store the cart
+        self.cart = Cart() # The current order
+        self.pricing = PricingEngine() # Rules arrive once the database is up
+        self.pricer = CartPricer(self.cart, self.pricing)
+        # Checkout writes here; the replayer copies it into the database
+        self.journal = OrderJournal(till_journal_path(till), fsync=JOURNAL_CONFIG['fsync'],
+                                    fsync_interval=JOURNAL_CONFIG['fsync_interval'])
+        self.replayer = None
+        self.pages = OrderedDict() # PageClass -> built page, least recently shown first
+        self.current_page = None
+
+        self.executor = DatabaseExecutor(self, workers=EXECUTOR_CONFIG['workers'],
+                                         poll_ms=EXECUTOR_CONFIG['poll_ms'])
 
         self.title("Restaurant Management System")
         self.geometry("900x700")
         self.configure(bg=STYLE_CONFIG["BG_COLOR"])
 
         # Configure global ttk styles
-        self.configure_styles()
+        with self.profile.phase('configure_styles'):
+            self.configure_styles()
 
         # Main container to hold pages
         self.container = ttk.Frame(self, padding=10)
         self.container.pack(fill="both", expand=True)
 
-        # Show the login page first
+        # Show the login page first; it enables itself once the database is up
         self.show_frame(LoginPage)
+        self.after_idle(self.first_paint)
+        if self.db is None:
+            self.connect_database()
+
+    def first_paint(self):
+        self.update_idletasks() # Draw the login page
+        self.profile.mark('first_paint')
+        self.profile.report_when('first_paint', 'connect')
+
+    def connect_database(self):
+        """Imports the driver and opens the database off the Tk thread."""
+        def work():
+            if self.service is not None:
+                with self.profile.phase('connect'):
+                    return open_service(*self.service)
+            with self.profile.phase('driver_import'):
+                BACKENDS[DB_BACKEND].load_driver()
+            with self.profile.phase('connect'):
+                return open_database()
+        self.executor.submit(work, on_done=self.database_ready, on_error=self.database_failed)
+
+    def database_ready(self, db):
+        self.db = db
+        self.executor.submit(db.get_pricing_rules, on_done=self.pricing.load)
+        self.replayer = JournalReplayer(self.journal, db,
+                                        batch_size=JOURNAL_CONFIG['batch_size'],
+                                        interval=JOURNAL_CONFIG['interval'],
+                                        max_backoff=JOURNAL_CONFIG['max_backoff'],
+                                        max_attempts=JOURNAL_CONFIG['max_attempts'],
+                                        compact_bytes=JOURNAL_CONFIG['compact_bytes'])
+        for page in self.pages.values():
+            on_database_ready = getattr(page, 'on_database_ready', None)
+            if on_database_ready is not None:
+                on_database_ready()
+        self.profile.report_when('first_paint', 'connect')
+
+    def database_failed(self, error):
+        if isinstance(error, ImportError):
+            print("Error: 'mysql-connector-python' not found.")
+            print("Please install it by running: pip install mysql-connector-python")
+            messagebox.showerror("Missing Library", 
+                                 "The 'mysql-connector-python' library is required.\n"
+                                 "Please install it using: \npip install mysql-connector-python")
+        elif isinstance(error, DatabaseStartupError):
+            messagebox.showerror(error.title, str(error))
+        else:
+            print(f"Application failed: {error}")
+            messagebox.showerror("Fatal Error", f"Application failed to start: {error}")
+        self.exit_code = 1
+        self.destroy()
 
     def configure_styles(self):
         style = ttk.Style(self)
@@ -379,17 +534,32 @@ class RestaurantApp(tk.Tk):
                   background=[("selected", STYLE_CONFIG["FRAME_COLOR"])])
 
     def show_frame(self, PageClass):
-        """Destroys the current frame and shows the new one."""
-        for widget in self.container.winfo_children():
-            widget.destroy()
-        
-        frame = PageClass(self.container, self)
+        """Hides the current page and shows the new one, building it only once."""
+        if self.current_page is not None:
+            self.current_page.pack_forget()
+
+        frame = self.pages.get(PageClass)
+        if frame is None:
+            frame = PageClass(self.container, self)
+            self.pages[PageClass] = frame
+        else:
+            self.pages.move_to_end(PageClass)
+            # Let a reused page bring itself up to date (clear forms etc.)
+            on_show = getattr(frame, 'on_show', None)
+            if on_show is not None:
+                on_show()
         frame.pack(fill="both", expand=True)
+        self.current_page = frame
+
+        while len(self.pages) > max(1, PAGE_CACHE_CONFIG['max_pages']):
+            _, evicted = self.pages.popitem(last=False)
+            self.executor.cancel_for(evicted) # Drop its in-flight database calls
+            evicted.destroy()
 
     def login_success(self, user_id, username):
         self.current_user_id = user_id
         self.current_user_name = username
-        self.current_order = {} # Clear cart on login
+        self.cart.clear() # Clear cart on login
         self.show_frame(MainApplicationPage)
 
     def logout(self):
@@ -432,15 +602,30 @@ class LoginPage(ttk.Frame):
         button_frame = ttk.Frame(main_frame, style='Content.TFrame')
         button_frame.pack(fill='x')
 
-        login_button = ttk.Button(button_frame, text="Login", 
-                                  command=self.handle_login, style='Primary.TButton')
-        login_button.pack(side='left', expand=True, fill='x', padx=(0, 5))
+        self.login_button = ttk.Button(button_frame, text="Login", 
+                                       command=self.handle_login, style='Primary.TButton')
+        self.login_button.pack(side='left', expand=True, fill='x', padx=(0, 5))
 
         signup_button = ttk.Button(button_frame, text="Sign Up", 
                                    command=lambda: controller.show_frame(SignUpPage), 
                                    style='Secondary.TButton')
         signup_button.pack(side='right', expand=True, fill='x', padx=(5, 0))
 
+        if controller.db is None:
+            # Typing can start now; logging in waits for the connection
+            self.login_button.state(['disabled'])
+            self.message_label.config(text="Connecting to database...")
+
+    def on_database_ready(self):
+        self.login_button.state(['!disabled'])
+        self.message_label.config(text="")
+
+    def on_show(self):
+        # Coming back (e.g. after logout): don't leave the last password filled in
+        self.password_entry.delete(0, 'end')
+        if self.controller.db is not None:
+            self.on_database_ready()
+
     def handle_login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
@@ -449,8 +634,19 @@ class LoginPage(ttk.Frame):
             self.message_label.config(text="Please enter both username and password.")
             return
 
-        user_id = self.controller.db.validate_user(username, password)
+        # Check the credentials in the background; the page stays responsive
+        self.login_button.state(['disabled'])
+        self.message_label.config(text="Logging in...")
+        self.controller.executor.submit(
+            self.controller.db.validate_user, username, password,
+            on_done=lambda user_id: self.login_finished(user_id, username),
+            on_error=lambda e: self.login_finished(None, username),
+            owner=self)
+
+    def login_finished(self, user_id, username):
+        self.login_button.state(['!disabled'])
         if user_id:
+            self.message_label.config(text="")
             self.controller.login_success(user_id, username)
         else:
             self.message_label.config(text="Invalid username or password.")
@@ -495,15 +691,29 @@ class SignUpPage(ttk.Frame):
         button_frame = ttk.Frame(main_frame, style='Content.TFrame')
         button_frame.pack(fill='x')
 
-        signup_button = ttk.Button(button_frame, text="Create Account", 
-                                   command=self.handle_signup, style='Primary.TButton')
-        signup_button.pack(expand=True, fill='x', pady=(0, 10))
+        self.signup_button = ttk.Button(button_frame, text="Create Account", 
+                                        command=self.handle_signup, style='Primary.TButton')
+        self.signup_button.pack(expand=True, fill='x', pady=(0, 10))
 
         back_button = ttk.Button(button_frame, text="Back to Login", 
                                  command=lambda: controller.show_frame(LoginPage),
                                  style='Secondary.TButton')
         back_button.pack(expand=True, fill='x')
 
+        if controller.db is None:
+            self.signup_button.state(['disabled'])
+            self.message_label.config(text="Connecting to database...")
+
+    def on_database_ready(self):
+        self.signup_button.state(['!disabled'])
+        self.message_label.config(text="")
+
+    def on_show(self):
+        for entry in (self.username_entry, self.password_entry, self.confirm_entry):
+            entry.delete(0, 'end')
+        if self.controller.db is not None:
+            self.on_database_ready()
+
     def handle_signup(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
@@ -521,9 +731,18 @@ class SignUpPage(ttk.Frame):
              self.message_label.config(text="Password must be at least 6 characters.")
              return
 
-        # Try to create the user
-        result = self.controller.db.create_user(username, password)
-        
+        # Try to create the user (in the background)
+        self.signup_button.state(['disabled'])
+        self.message_label.config(text="Creating account...")
+        self.controller.executor.submit(
+            self.controller.db.create_user, username, password,
+            on_done=self.signup_finished,
+            on_error=lambda e: self.signup_finished(f"OTHER_ERROR: {e}"),
+            owner=self)
+
+    def signup_finished(self, result):
+        self.signup_button.state(['!disabled'])
+        self.message_label.config(text="")
         if result == "SUCCESS":
             messagebox.showinfo("Success", "Account created successfully! Please log in.")
             self.controller.show_frame(LoginPage)
@@ -542,13 +761,23 @@ class MainApplicationPage(ttk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent, style='TFrame') # <-- This line is correct
         self.controller = controller
+        # (tab title, attribute, frame class); each tab is built the first time it is selected
+        self.tabs = (
+            ('Menu', 'menu_frame', MenuFrame),
+            ('Bill Calculator', 'bill_frame', BillFrame),
+            ('Feedback', 'feedback_frame', FeedbackFrame),
+            ('Order Backlog', 'backlog_frame', BacklogFrame),
+            ('Analytics', 'analytics_frame', AnalyticsFrame),
+        )
+        self.user_id = controller.current_user_id
 
         # Header
         header_frame = ttk.Frame(self, padding=(0, 10), style='TFrame') # <-- FIX: Added style='TFrame'
         header_frame.pack(fill='x')
 
         welcome_text = f"Welcome, {self.controller.current_user_name}!"
-        ttk.Label(header_frame, text=welcome_text, style='Header.TLabel').pack(side='left')
+        self.welcome_label = ttk.Label(header_frame, text=welcome_text, style='Header.TLabel')
+        self.welcome_label.pack(side='left')
 
         logout_button = ttk.Button(header_frame, text="Logout", 
                                    command=controller.logout, style='Secondary.TButton')
@@ -557,45 +786,92 @@ class MainApplicationPage(ttk.Frame):
         # Notebook (Tabs)
         notebook = ttk.Notebook(self, style='TNotebook') # <-- FIX: Added style='TNotebook'
         notebook.pack(fill='both', expand=True, pady=10)
+        self.notebook = notebook
 
-        # Create the tab frames
-        self.menu_frame = MenuFrame(notebook, controller)
-        self.bill_frame = BillFrame(notebook, controller)
-        self.feedback_frame = FeedbackFrame(notebook, controller)
+        # Empty holders for now; the tab frames are packed into them on demand
+        self.tab_holders = []
+        for title, attribute, _ in self.tabs:
+            holder = ttk.Frame(notebook, style='Content.TFrame')
+            notebook.add(holder, text=title)
+            self.tab_holders.append(holder)
+            setattr(self, attribute, None)
 
-        notebook.add(self.menu_frame, text='Menu')
-        notebook.add(self.bill_frame, text='Bill Calculator')
-        notebook.add(self.feedback_frame, text='Feedback')
+        self.build_tab(notebook.index('current'))
 
-        # When the Bill tab is clicked, update the view
+        # When a tab is clicked, build it (first time) and update the view
         notebook.bind("<<NotebookTabChanged>>", self.on_tab_change)
 
+    def build_tab(self, index):
+        """Creates the frame for tab `index` if it doesn't exist yet."""
+        _, attribute, FrameClass = self.tabs[index]
+        frame = getattr(self, attribute)
+        if frame is None:
+            frame = FrameClass(self.tab_holders[index], self.controller)
+            frame.pack(fill='both', expand=True)
+            setattr(self, attribute, frame)
+        return frame
+
     def on_tab_change(self, event):
-        # Check if the selected tab is the BillFrame
         selected_tab_index = event.widget.index(event.widget.select())
-        if selected_tab_index == 1: # Index 1 is the BillFrame
-            self.bill_frame.update_bill()
+        frame = self.build_tab(selected_tab_index)
+        if frame is self.bill_frame:
+            frame.update_bill()
+        elif frame is self.backlog_frame or frame is self.analytics_frame:
+            frame.refresh()
+        elif frame is self.menu_frame:
+            frame.refresh_search_index()
+
+    def on_show(self):
+        """Reused after logout/login: same widgets and menu, new user."""
+        self.welcome_label.config(text=f"Welcome, {self.controller.current_user_name}!")
+        if self.controller.current_user_id != self.user_id:
+            self.user_id = self.controller.current_user_id
+            # Don't carry one user's half-finished choices over to the next
+            if self.menu_frame is not None:
+                self.menu_frame.reset_selections()
+            if self.feedback_frame is not None:
+                self.feedback_frame.reset_form()
+        self.notebook.select(0)
 
 # --- Tab 1: Menu Frame ---
 class MenuFrame(ttk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent, style='Content.TFrame', padding=20)
         self.controller = controller
-        self.menu_widgets = [] # To store refs to checkboxes, spinboxes, etc.
+        # One tab per category, each paging its items in as it scrolls:
+        # category -> {'list', 'last_id', 'done', 'loading'}
+        self.pagers = {}
+        self.results_list = None # Search results, shown instead of the tabs
+        self.selection = MenuSelection() # Shared by every tab and the results
+        self.search_ready = False # True once the search index holds the menu
+        self.search_loading = False
+        self.search_version = None # Index version the shown results came from
+        self.search_refresh_job = None
 
         ttk.Label(self, text="Today's Menu", style='Header.TLabel', 
                   background=STYLE_CONFIG["FRAME_COLOR"]).pack(pady=(0, 10))
-        
-        # Create the main scrollable frame
-        self.scroll_frame = ScrollableFrame(self, style='Content.TFrame') # <-- THIS IS THE FIX
-        self.scroll_frame.pack(fill='both', expand=True)
 
-        # The 'inner' frame inside ScrollableFrame is where we add widgets
-        self.inner_frame = self.scroll_frame.scrollable_frame
+        # Search box: filters as you type, from an in-memory index (no SQL)
+        search_frame = ttk.Frame(self, style='Content.TFrame')
+        search_frame.pack(fill='x', pady=(0, 10))
+        ttk.Label(search_frame, text="Search:", style='Content.TLabel').pack(side='left', padx=(5, 10))
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=40)
+        search_entry.pack(side='left', fill='x', expand=True)
+        self.search_var.trace_add('write', lambda *args: self.apply_filter())
+
+        # Loading / error / empty messages
+        self.status_label = ttk.Label(self, text="", style='Content.TLabel', padding=20,
+                                      background=STYLE_CONFIG["FRAME_COLOR"])
+
+        # Category tabs
+        self.category_notebook = ttk.Notebook(self, style='TNotebook')
+        self.category_notebook.bind("<<NotebookTabChanged>>", self.on_category_change)
 
         # Controls for adding to order
         controls_frame = ttk.Frame(self, style='Content.TFrame')
-        controls_frame.pack(fill='x', pady=10)
+        controls_frame.pack(fill='x', pady=10, side='bottom')
+        self.controls_frame = controls_frame
 
         add_button = ttk.Button(controls_frame, text="Add Selected to Order", 
                                 command=self.add_to_order, style='Primary.TButton')
@@ -608,125 +884,232 @@ class MenuFrame(ttk.Frame):
         self.add_message_label = ttk.Label(controls_frame, text="", style='Content.TLabel')
         self.add_message_label.pack(side='left')
 
-        # self.load_menu() # <-- This was the original, buggy line
-        
+        # Items often ordered with what is in the cart, one click to add
+        self.suggestions_frame = ttk.Frame(self, style='Content.TFrame')
+        self.suggestions_frame.pack(fill='x', side='bottom')
+        self.controller.cart.add_listener(self.on_cart_change)
+
+        # The categories are fetched in the background; each tab then loads
+        # its first page when it is opened
+        self.load_menu()
+
+    def load_menu(self):
+        """Shows a loading message and fetches the category list off the Tk thread."""
+        self.clear_menu()
+        self.show_status("Loading menu...")
+        self.controller.executor.submit(self.controller.db.get_menu_categories,
+                                        on_done=self.menu_loaded,
+                                        on_error=self.show_load_error,
+                                        owner=self)
+
+    def menu_loaded(self, categories):
         # --- THIS IS THE FIX ---
-        # Wrap the menu load in a try-except to prevent any
-        # potential database error from crashing the entire UI
+        # Wrap the menu build in a try-except to prevent any
+        # potential error from crashing the entire UI
         # during initialization. This stops the "blank screen" bug.
         try:
-            self.load_menu()
+            self.show_menu(categories)
         except Exception as e:
-            # Print the error to the console for debugging
-            print(f"CRITICAL: Failed to load menu: {e}")
-            # Display a visible error message on the menu tab
-            # This ensures the frame is not blank.
-            ttk.Label(self.inner_frame, 
-                      text=f"Error loading menu:\n{e}\n\n"
-                           "Please check database connection and terminal.", 
-                      style='Content.TLabel', 
-                      padding=20,
-                      font=STYLE_CONFIG["BODY_FONT"],
-                      background=STYLE_CONFIG["FRAME_COLOR"],
-                      foreground="red").pack()
+            self.show_load_error(e)
+
+    def show_load_error(self, e):
+        # Print the error to the console for debugging
+        print(f"CRITICAL: Failed to load menu: {e}")
+        # Display a visible error message on the menu tab
+        # This ensures the frame is not blank.
+        self.show_status(f"Error loading menu:\n{e}\n\n"
+                         "Please check database connection and terminal.", error=True)
         # --- END OF FIX ---
 
-    def load_menu(self):
-        # Clear any existing widgets
-        for widget in self.inner_frame.winfo_children():
-            widget.destroy()
-        self.menu_widgets = []
-            
-        menu_items = self.controller.db.get_menu_items()
-        
-        if not menu_items:
+    def show_status(self, text, error=False):
+        """Replaces the menu with a message."""
+        self.category_notebook.pack_forget()
+        if self.results_list is not None:
+            self.results_list.pack_forget()
+        self.status_label.config(text=text, foreground="red" if error else STYLE_CONFIG["TEXT_COLOR"])
+        self.status_label.pack(fill='both', expand=True)
+
+    def clear_menu(self):
+        for tab in self.category_notebook.tabs():
+            self.category_notebook.forget(tab)
+        for pager in self.pagers.values():
+            pager['list'].destroy()
+        self.pagers = {}
+
+    def show_menu(self, categories):
+        self.clear_menu()
+
+        if not categories:
             # --- THIS IS THE FIX ---
             # If no items, show a message so the frame doesn't collapse
-            ttk.Label(self.inner_frame, 
-                      text="No menu items found.\nCheck database connection and setup.", 
-                      style='Content.TLabel', 
-                      padding=20
-                      # font=... (Remove this line)
-                      ).pack()
-            # --- END OF FIX ---
-            return # Don't proceed to the rest of the function
-
-        for item in menu_items:
-            # Create a frame for each menu item
-            item_frame = ttk.Frame(self.inner_frame, style='Content.TFrame', padding=10, relief="solid", borderwidth=1)
-            item_frame.pack(fill='x', expand=True, pady=5, padx=5)
-
-            # --- Left side: Checkbox, Name, Description ---
-            left_frame = ttk.Frame(item_frame, style='Content.TFrame')
-            left_frame.pack(side='left', fill='x', expand=True, padx=(0, 20))
-
-            # --- Right side: Price, Quantity ---
-            right_frame = ttk.Frame(item_frame, style='Content.TFrame')
-            right_frame.pack(side='right', fill='none')
-
-            # Checkbox variable
-            check_var = tk.BooleanVar()
-            
-            # Checkbox and Name
-            # --- FIX 3: Use the new style directly ---
-            name_check = ttk.Checkbutton(left_frame, text=item['name'], variable=check_var, style='MenuName.TCheckbutton')
-            # name_check.configure(font=STYLE_CONFIG["BUTTON_FONT"]) # <-- Delete this line
-            name_check.pack(anchor='w')
-
-            # Description
-            desc_label = ttk.Label(left_frame, text=item['description'], style='Content.TLabel', wraplength=400, justify='left')
-            desc_label.pack(anchor='w', pady=(5,0))
-
-            # Price
-            # --- FIX 4: Use the new style directly ---
-            price_label = ttk.Label(right_frame, text=f"${item['price']:.2f}", style='MenuPrice.TLabel')
-            # price_label.configure(font=STYLE_CONFIG["BUTTON_FONT"]) # <-- Delete this line
-            price_label.pack(anchor='e')
-
-            # Quantity Spinbox
-            quantity_spinbox = ttk.Spinbox(right_frame, from_=1, to=10, width=5)
-            quantity_spinbox.set(1)
-            quantity_spinbox.pack(anchor='e', pady=(5,0))
-
-            # Store all the widgets and data for this item
-            self.menu_widgets.append({
-                'check_var': check_var,
-                'spinbox': quantity_spinbox,
-                'item_data': item
-            })
+            self.show_status("No menu items found.\nCheck database connection and setup.")
+            return
+
+        for category in categories:
+            menu_list = VirtualMenuList(self.category_notebook, row_height=MENU_CONFIG['row_height'],
+                                        style='Content.TFrame',
+                                        on_near_end=lambda c=category: self.load_page(c),
+                                        prefetch_rows=MENU_CONFIG['prefetch_rows'],
+                                        selection=self.selection)
+            self.pagers[category] = {'list': menu_list, 'last_id': 0, 'done': False, 'loading': False}
+            self.category_notebook.add(menu_list, text=category or "Other")
+        self.status_label.pack_forget()
+        self.load_page(categories[0]) # The tab shown first
+        self.apply_filter()
+
+    def on_category_change(self, event):
+        # The first page of a category is only fetched when its tab is opened
+        if not self.pagers:
+            return
+        menu_list = self.nametowidget(self.category_notebook.select())
+        for category, pager in self.pagers.items():
+            if pager['list'] is menu_list and pager['last_id'] == 0:
+                self.load_page(category)
+                break
+
+    def load_page(self, category):
+        """Fetches the next page of a category (keyset pagination on item_id)."""
+        pager = self.pagers.get(category)
+        if pager is None or pager['done'] or pager['loading']:
+            return
+        pager['loading'] = True
+        self.controller.executor.submit(
+            self.controller.db.get_menu_page, category, pager['last_id'], MENU_CONFIG['page_size'],
+            on_done=lambda rows: self.page_loaded(category, rows),
+            on_error=lambda e: self.page_failed(category, e),
+            owner=pager['list'])
+
+    def page_loaded(self, category, rows):
+        pager = self.pagers.get(category)
+        if pager is None:
+            return
+        pager['loading'] = False
+        if len(rows) < MENU_CONFIG['page_size']:
+            pager['done'] = True
+        if rows:
+            pager['last_id'] = rows[-1]['item_id']
+            # Appending redraws the list, which asks for the next page early
+            # if this one doesn't fill the screen plus the prefetch margin
+            pager['list'].append_items(rows)
+
+    def page_failed(self, category, e):
+        print(f"Failed to load menu page for {category!r}: {e}")
+        pager = self.pagers.get(category)
+        if pager is not None:
+            pager['loading'] = False # Scrolling again retries
+
+    def apply_filter(self):
+        """Shows the items matching the search box instead of the category tabs."""
+        if not self.pagers:
+            return
+        text = self.search_var.get()
+        if not text.strip():
+            if self.results_list is not None:
+                self.results_list.pack_forget()
+            self.status_label.pack_forget()
+            self.category_notebook.pack(fill='both', expand=True)
+            return
+
+        if not self.search_ready:
+            # The index is filled from the menu cache; load it the first time
+            self.load_search_index()
+            return
+        self.search_version = self.controller.db.menu_index.version
+        matches = self.controller.db.search_menu(text) or set()
+        if self.results_list is None:
+            self.results_list = VirtualMenuList(self, row_height=MENU_CONFIG['row_height'],
+                                                style='Content.TFrame', selection=self.selection)
+        self.category_notebook.pack_forget()
+        self.results_list.pack(fill='both', expand=True)
+        self.results_list.set_items(self.controller.db.menu_rows(matches))
+
+    def load_search_index(self):
+        if self.search_loading:
+            return
+        self.search_loading = True
+        self.show_status("Loading search...")
+        self.controller.executor.submit(self.controller.db.get_menu_items,
+                                        on_done=self.search_index_loaded,
+                                        on_error=self.search_index_failed,
+                                        owner=self)
+
+    def search_index_loaded(self, menu_items):
+        self.search_loading = False
+        self.search_ready = True
+        self.status_label.pack_forget()
+        self.apply_filter()
+        self.schedule_search_refresh()
+
+    def schedule_search_refresh(self):
+        if self.search_refresh_job is None:
+            self.search_refresh_job = self.after(MENU_CONFIG['search_refresh_ms'], self.search_refresh_due)
+
+    def search_refresh_due(self):
+        self.search_refresh_job = None
+        if self.winfo_ismapped():
+            self.refresh_search_index()
+        self.schedule_search_refresh()
+
+    def refresh_search_index(self):
+        """Asks the menu cache for edits; unchanged, that costs one version read."""
+        if not self.search_ready or self.search_loading:
+            return
+        self.search_loading = True
+        self.controller.executor.submit(self.controller.db.get_menu_items,
+                                        on_done=self.search_index_refreshed,
+                                        on_error=self.search_refresh_failed,
+                                        owner=self)
+
+    def search_index_refreshed(self, menu_items):
+        self.search_loading = False
+        # The cache's listener has already updated the index; redo the
+        # search if the results on screen came from an older menu
+        if self.search_var.get().strip() \
+                and self.search_version != self.controller.db.menu_index.version:
+            self.apply_filter()
+
+    def search_refresh_failed(self, e):
+        self.search_loading = False
+        print(f"Failed to refresh the menu for searching: {e}")
+
+    def search_index_failed(self, e):
+        self.search_loading = False
+        print(f"Failed to load the menu for searching: {e}")
+        self.show_status(f"Search is unavailable:\n{e}", error=True)
+
+    def menu_lists(self):
+        lists = [pager['list'] for pager in self.pagers.values()]
+        if self.results_list is not None:
+            lists.append(self.results_list)
+        return lists
+
+    def selected_items(self):
+        """Returns (item, quantity as entered) for every checked menu item, once each."""
+        for menu_list in self.menu_lists():
+            menu_list.store_quantities() # A spinbox may still hold an unsaved edit
+        return list(self.selection.items())
 
     def add_to_order(self):
-        cart = self.controller.current_order
         items_added_count = 0
         
-        for widget_set in self.menu_widgets:
-            if widget_set['check_var'].get(): # If the box is checked
-                items_added_count += 1
-                try:
-                    quantity = int(widget_set['spinbox'].get())
-                    if quantity <= 0:
-                        raise ValueError
-                except ValueError:
-                    quantity = 1 # Default to 1 if invalid
-                
-                item = widget_set['item_data']
-                item_id = item['item_id']
-                
-                # Add to the cart
-                if item_id in cart:
-                    cart[item_id]['quantity'] += quantity
-                else:
-                    cart[item_id] = {
-                        'name': item['name'],
-                        'price': float(item['price']),
-                        'quantity': quantity,
-                        'item_id': item_id
-                    }
+        for item, quantity in self.selected_items():
+            items_added_count += 1
+            try:
+                quantity = int(quantity)
+                if quantity <= 0:
+                    raise ValueError
+            except ValueError:
+                quantity = 1 # Default to 1 if invalid
+            
+            # Add to the cart
+            self.controller.cart.add(item, quantity)
 
         if items_added_count > 0:
-            self.add_message_label.config(text=f"Added {items_added_count} item(s) to order.", foreground='green')
+            self.add_message_label.config(text=f"Added {items_added_count} item(s) to order.",
+                                          foreground='green')
             # Reset the menu after ordering
             self.reset_selections()
+            self.load_suggestions()
         else:
             self.add_message_label.config(text="Please check an item to add.", foreground='red')
 
@@ -735,12 +1118,54 @@ class MenuFrame(ttk.Frame):
     
     def reset_selections(self):
         """Unchecks all boxes and resets spinboxes to 1."""
-        for widget_set in self.menu_widgets:
-            widget_set['check_var'].set(False)
-            widget_set['spinbox'].set(1)
+        self.selection.clear()
+        for menu_list in self.menu_lists():
+            menu_list.refresh()
         
         self.add_message_label.config(text="")
 
+    def load_suggestions(self):
+        """Fetches "frequently ordered together" items for the cart off the Tk thread."""
+        item_ids = [line.item_id for line in self.controller.cart]
+        if not item_ids:
+            self.show_suggestions([])
+            return
+        self.controller.executor.submit(self.controller.db.suggest_items, item_ids,
+                                        on_done=self.show_suggestions,
+                                        on_error=lambda e: print(f"Failed to load suggestions: {e}"),
+                                        owner=self)
+
+    def show_suggestions(self, rows):
+        for child in self.suggestions_frame.winfo_children():
+            child.destroy()
+        # The cart may have changed while they loaded
+        rows = [row for row in rows if row['item_id'] not in self.controller.cart]
+        if not rows:
+            return
+        ttk.Label(self.suggestions_frame, text="Often ordered with this:",
+                  style='Content.TLabel').pack(side='left', padx=(10, 5))
+        for row in rows:
+            ttk.Button(self.suggestions_frame,
+                       text=f"+ {row['name']} ({format_cents(to_cents(row['price']))})",
+                       command=lambda r=row: self.add_suggestion(r),
+                       style='Secondary.TButton').pack(side='left', padx=5)
+
+    def add_suggestion(self, row):
+        self.controller.cart.add(row, 1)
+        self.add_message_label.config(text=f"Added {row['name']} to order.", foreground='green')
+        self.after(3000, lambda: self.add_message_label.config(text=""))
+        self.load_suggestions()
+
+    def on_cart_change(self, event, item_id):
+        if event == 'clear':
+            self.show_suggestions([])
+
+    def destroy(self):
+        self.controller.cart.remove_listener(self.on_cart_change)
+        if self.search_refresh_job is not None:
+            self.after_cancel(self.search_refresh_job)
+        super().destroy()
+
 
 # --- Tab 2: Bill Frame ---
 class BillFrame(ttk.Frame):
@@ -769,6 +1194,10 @@ class BillFrame(ttk.Frame):
 
         self.tree.pack(fill='both', expand=True)
         
+        # Subtotal, discounts and tax from the pricing rules
+        self.breakdown_label = ttk.Label(self, text="", style='Content.TLabel')
+        self.breakdown_label.pack(anchor='e', pady=(10, 0))
+
         # Total Label
         self.total_label = ttk.Label(self, text="Total: $0.00", style='Header.TLabel', 
                                      background=STYLE_CONFIG["FRAME_COLOR"])
@@ -786,30 +1215,80 @@ class BillFrame(ttk.Frame):
                                   command=self.clear_order, style='Secondary.TButton')
         clear_button.pack(side='left', padx=10)
         
-        confirm_button = ttk.Button(controls_frame, text="Confirm and Pay", 
-                                    command=self.confirm_order, style='Primary.TButton')
-        confirm_button.pack(side='right')
+        self.confirm_button = ttk.Button(controls_frame, text="Confirm and Pay", 
+                                         command=self.confirm_order, style='Primary.TButton')
+        self.confirm_button.pack(side='right')
+
+        # The tree follows the cart through change events
+        self.cart = controller.cart
+        self.pricer = controller.pricer
+        self._shown = set() # item_ids with a row in the tree
+        self._dirty = {line.item_id for line in self.cart} # item_ids not yet drawn
+        self._flush_job = None
+        self._reprice_job = None # Redraws the totals when a promotion starts or ends
+        self.cart.add_listener(self.on_cart_change)
+        self.update_bill()
+
+    def on_cart_change(self, event, item_id):
+        """Queues a cart change; changes made in one go are drawn together."""
+        if event == 'clear':
+            self._dirty = set(self._shown)
+        else:
+            self._dirty.add(item_id)
+        if self._flush_job is None:
+            self._flush_job = self.after_idle(self.update_bill)
 
     def update_bill(self):
-        # Clear existing items
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-            
-        cart = self.controller.current_order
-        total_bill = 0.0
-
-        for item_id, details in cart.items():
-            total_item_price = details['price'] * details['quantity']
-            total_bill += total_item_price
-            
-            self.tree.insert("", "end", values=(
-                details['name'],
-                details['quantity'],
-                f"${details['price']:.2f}",
-                f"${total_item_price:.2f}"
-            ), iid=item_id) # Use item_id as iid
-            
-        self.total_label.config(text=f"Total: ${total_bill:.2f}")
+        """Applies pending cart changes to the tree, touching only those rows."""
+        if self._flush_job is not None:
+            self.after_cancel(self._flush_job)
+            self._flush_job = None
+        dirty, self._dirty = self._dirty, set()
+
+        for item_id in dirty:
+            line = self.cart.get(item_id)
+            if line is None:
+                if item_id in self._shown:
+                    self._shown.discard(item_id)
+                    self.tree.delete(item_id)
+                continue
+
+            values = (
+                line.name,
+                line.quantity,
+                format_cents(line.price_cents),
+                format_cents(line.total_cents)
+            )
+            if item_id in self._shown:
+                self.tree.item(item_id, values=values)
+            else:
+                self._shown.add(item_id)
+                self.tree.insert("", "end", values=values, iid=item_id) # Use item_id as iid
+
+        self.show_totals()
+
+    def show_totals(self):
+        # The pricer keeps its totals up to date; nothing to add up here
+        totals = self.pricer.totals()
+        self.breakdown_label.config(text=f"Subtotal: {format_cents(totals.subtotal)}    "
+                                         f"Discounts: -{format_cents(totals.discount)}    "
+                                         f"Tax: {format_cents(totals.tax)}")
+        self.total_label.config(text=f"Total: {format_cents(totals.total)}")
+
+        if self._reprice_job is not None:
+            self.after_cancel(self._reprice_job)
+        wait = (self.pricer.expires - datetime.now()).total_seconds()
+        self._reprice_job = self.after(int(max(wait, 1) * 1000), self.update_bill)
+
+    def destroy(self):
+        self.cart.remove_listener(self.on_cart_change)
+        if self._reprice_job is not None:
+            self.after_cancel(self._reprice_job)
+            self._reprice_job = None
+        if self._flush_job is not None:
+            self.after_cancel(self._flush_job)
+            self._flush_job = None
+        super().destroy()
 
     def remove_item(self):
         selected_iid = self.tree.focus()
@@ -818,34 +1297,32 @@ class BillFrame(ttk.Frame):
             return
         
         # selected_iid is the item_id we set (as an int)
-        item_id_to_remove = int(selected_iid)
-        if item_id_to_remove in self.controller.current_order:
-            del self.controller.current_order[item_id_to_remove]
-            self.update_bill()
+        self.cart.remove(int(selected_iid))
 
     def clear_order(self):
         if messagebox.askyesno("Clear Order", "Are you sure you want to clear the entire order?"):
-            self.controller.current_order = {}
-            self.update_bill()
+            self.cart.clear()
             
     def confirm_order(self):
-        cart = self.controller.current_order
-        if not cart:
+        if not self.cart:
             messagebox.showwarning("Empty Order", "Your order is empty.")
             return
 
-        total_bill = sum(item['price'] * item['quantity'] for item in cart.values())
-        
-        # Prepare items list for DB
-        items_for_db = list(cart.values())
+        order = self.cart.snapshot()
+        total_cents = self.pricer.totals().total # After discounts and tax
         user_id = self.controller.current_user_id
-        
-        if self.controller.db.create_order(user_id, total_bill, items_for_db):
-            messagebox.showinfo("Order Confirmed", 
-                                f"Your order for ${total_bill:.2f} has been confirmed!")
-            self.clear_order()
-        else:
+
+        # The journal has it once this returns; it reaches the database in
+        # the background, even if the database is slow or down right now
+        try:
+            self.controller.journal.append(user_id, from_cents(total_cents), order.items)
+        except OSError as e:
+            print(f"Order Journal Error: {e}")
             messagebox.showerror("Order Failed", "There was an error saving your order. Please try again.")
+            return
+        messagebox.showinfo("Order Confirmed", 
+                            f"Your order for {format_cents(total_cents)} has been confirmed!")
+        self.cart.clear()
 
 # --- Tab 3: Feedback Frame ---
 class FeedbackFrame(ttk.Frame):
@@ -879,9 +1356,14 @@ class FeedbackFrame(ttk.Frame):
         self.comments_text.pack(fill='both', expand=True, pady=(0, 20))
 
         # Submit Button
-        submit_button = ttk.Button(form_frame, text="Submit Feedback", 
-                                   command=self.submit_feedback, style='Primary.TButton')
-        submit_button.pack()
+        self.submit_button = ttk.Button(form_frame, text="Submit Feedback", 
+                                        command=self.submit_feedback, style='Primary.TButton')
+        self.submit_button.pack()
+
+    def reset_form(self):
+        self.rating_var.set(5)
+        self.rating_label.config(text="5/5")
+        self.comments_text.delete("1.0", "end")
 
     def submit_feedback(self):
         rating = self.rating_var.get()
@@ -893,34 +1375,272 @@ class FeedbackFrame(ttk.Frame):
             
         user_id = self.controller.current_user_id
         
-        if self.controller.db.submit_feedback(user_id, rating, comments):
+        self.submit_button.state(['disabled'])
+        self.controller.executor.submit(
+            self.controller.db.submit_feedback, user_id, rating, comments,
+            on_done=self.feedback_finished,
+            on_error=lambda e: self.feedback_finished(False),
+            owner=self)
+
+    def feedback_finished(self, ok):
+        self.submit_button.state(['!disabled'])
+        if ok:
             messagebox.showinfo("Thank You!", "Your feedback has been submitted.")
-            # Clear the form
-            self.rating_var.set(5)
-            self.rating_label.config(text="5/5")
-            self.comments_text.delete("1.0", "end")
+            self.reset_form()
         else:
             messagebox.showerror("Error", "Could not submit feedback. Please try again.")
 
+# --- Tab 4: Order Backlog Frame ---
+class BacklogFrame(ttk.Frame):
+    """Orders in the local journal that haven't reached the database yet."""
+    REFRESH_MS = 1000
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, style='Content.TFrame', padding=20)
+        self.controller = controller
+
+        ttk.Label(self, text="Orders Waiting for the Database", style='Header.TLabel', 
+                  background=STYLE_CONFIG["FRAME_COLOR"]).pack(pady=(0, 10))
+
+        self.status_label = ttk.Label(self, text="", style='Content.TLabel')
+        self.status_label.pack(anchor='w', pady=(0, 10))
+
+        tree_frame = ttk.Frame(self, style='Content.TFrame')
+        tree_frame.pack(fill='both', expand=True)
+
+        cols = ('Placed', 'User', 'Items', 'Total', 'Status')
+        self.tree = ttk.Treeview(tree_frame, columns=cols, show='headings', height=10)
+        for col in cols:
+            self.tree.heading(col, text=col)
+        self.tree.column('Placed', width=160)
+        self.tree.column('User', width=80, anchor='center')
+        self.tree.column('Items', width=80, anchor='center')
+        self.tree.column('Total', width=100, anchor='e')
+        self.tree.column('Status', width=100, anchor='center')
+        self.tree.pack(fill='both', expand=True)
+
+        controls_frame = ttk.Frame(self, style='Content.TFrame')
+        controls_frame.pack(fill='x', pady=10)
+        self.retry_button = ttk.Button(controls_frame, text="Retry Failed Orders", 
+                                       command=self.retry_failed, style='Secondary.TButton')
+        self.retry_button.pack(side='right')
+
+        self._refresh_job = None
+
+    def refresh(self):
+        """Redraws the backlog; repeats every REFRESH_MS while the tab is showing."""
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+
+        journal = self.controller.journal
+        backlog = journal.backlog()
+        self.tree.delete(*self.tree.get_children())
+        for status, record in backlog:
+            quantity = sum(item['quantity'] for item in record['items'])
+            self.tree.insert("", "end", iid=record['key'], values=(
+                record['created'].replace('T', ' '),
+                record['user_id'],
+                quantity,
+                format_cents(to_cents(record['total_amount'])),
+                status
+            ))
+
+        pending, failed = journal.counts()
+        if not pending and not failed:
+            text = "All orders have been saved to the database."
+        else:
+            text = f"{pending} order(s) waiting, {failed} failed."
+            replayer = self.controller.replayer
+            if replayer is not None and replayer.last_error is not None:
+                text += f" Database unavailable: {replayer.last_error}"
+        self.status_label.config(text=text)
+        self.retry_button.state(['!disabled'] if failed else ['disabled'])
+
+        notebook = self.master.master
+        if notebook.select() == str(self.master): # Still the selected tab
+            self._refresh_job = self.after(self.REFRESH_MS, self.refresh)
+
+    def retry_failed(self):
+        self.controller.journal.retry_failed()
+        self.refresh()
+
+    def destroy(self):
+        if self._refresh_job is not None:
+            self.after_cancel(self._refresh_job)
+            self._refresh_job = None
+        super().destroy()
+
+# --- Tab 5: Analytics Frame ---
+class AnalyticsFrame(ttk.Frame):
+    """Sales dashboards. Reads the rollup tables only, so it stays quick
+    however many orders there are."""
+    # Period shown -> days back from today (None: all time)
+    PERIODS = OrderedDict((("Today", 1), ("Last 7 days", 7), ("Last 30 days", 30),
+                           ("Last 365 days", 365), ("All time", None)))
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, style='Content.TFrame', padding=20)
+        self.controller = controller
+        self.loading = False
+
+        ttk.Label(self, text="Sales Analytics", style='Header.TLabel',
+                  background=STYLE_CONFIG["FRAME_COLOR"]).pack(pady=(0, 10))
+
+        controls_frame = ttk.Frame(self, style='Content.TFrame')
+        controls_frame.pack(fill='x', pady=(0, 10))
+        ttk.Label(controls_frame, text="Period:", style='Content.TLabel').pack(side='left', padx=(5, 10))
+        self.period_var = tk.StringVar(value="Today")
+        period_box = ttk.Combobox(controls_frame, textvariable=self.period_var, state='readonly',
+                                  values=list(self.PERIODS), width=15)
+        period_box.pack(side='left')
+        period_box.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        ttk.Button(controls_frame, text="Refresh", command=self.refresh,
+                   style='Secondary.TButton').pack(side='right')
+
+        self.summary_label = ttk.Label(self, text="", style='Content.TLabel',
+                                       font=STYLE_CONFIG["BUTTON_FONT"])
+        self.summary_label.pack(anchor='w')
+        self.status_label = ttk.Label(self, text="", style='Content.TLabel')
+        self.status_label.pack(anchor='w', pady=(0, 10))
+
+        views = ttk.Notebook(self, style='TNotebook')
+        views.pack(fill='both', expand=True)
+        self.items_tree = self.add_view(views, "Top Items", ('Item', 'Quantity', 'Revenue'))
+        self.categories_tree = self.add_view(views, "Categories", ('Category', 'Quantity', 'Revenue'))
+        self.days_tree = self.add_view(views, "By Day", ('Date', 'Orders', 'Items', 'Sales'))
+        self.hours_tree = self.add_view(views, "By Hour", ('Hour', 'Orders', 'Items', 'Sales'))
+
+    def add_view(self, notebook, title, cols):
+        tree_frame = ttk.Frame(notebook, style='Content.TFrame')
+        notebook.add(tree_frame, text=title)
+        tree = ttk.Treeview(tree_frame, columns=cols, show='headings', height=10)
+        for col in cols:
+            tree.heading(col, text=col)
+            tree.column(col, width=200 if col == cols[0] else 100,
+                        anchor='w' if col == cols[0] else 'e')
+        tree.pack(fill='both', expand=True)
+        return tree
+
+    def refresh(self):
+        """Fetches the report for the chosen period in the background."""
+        if self.loading:
+            return
+        days = self.PERIODS[self.period_var.get()]
+        self.loading = True
+        self.status_label.config(text="Loading...", foreground=STYLE_CONFIG["TEXT_COLOR"])
+        self.controller.executor.submit(self.controller.db.get_sales_report, days,
+                                        on_done=self.show_report,
+                                        on_error=self.report_failed,
+                                        owner=self)
+
+    def report_failed(self, e):
+        self.loading = False
+        print(f"Failed to load the sales report: {e}")
+        self.status_label.config(text=f"Could not load the sales report: {e}", foreground='red')
+
+    def show_report(self, report):
+        self.loading = False
+        totals = report['totals'] or {}
+        self.summary_label.config(
+            text=f"Orders: {int(totals.get('order_count') or 0)}    "
+                 f"Items sold: {int(totals.get('quantity') or 0)}    "
+                 f"Sales: {format_cents(int(totals.get('net_cents') or 0))}")
+        if report['history_pending']:
+            self.status_label.config(text="Older orders are still being added to these figures "
+                                          "(run 'rollup-sales').", foreground='red')
+        else:
+            self.status_label.config(text="")
+
+        self.fill(self.items_tree, ((row['name'] or f"Item {row['item_id']}", int(row['quantity']),
+                                     format_cents(int(row['revenue_cents'])))
+                                    for row in report['items']))
+        self.fill(self.categories_tree, ((row['category'] or "Other", int(row['quantity']),
+                                          format_cents(int(row['revenue_cents'])))
+                                         for row in report['categories']))
+        self.fill(self.days_tree, ((str(row['sale_date']), int(row['order_count']), int(row['quantity']),
+                                    format_cents(int(row['net_cents'])))
+                                   for row in report['days']))
+        self.fill(self.hours_tree, ((f"{int(row['sale_hour']):02d}:00", int(row['order_count']),
+                                     int(row['quantity']), format_cents(int(row['net_cents'])))
+                                    for row in report['hours']))
+
+    @staticmethod
+    def fill(tree, rows):
+        tree.delete(*tree.get_children())
+        for values in rows:
+            tree.insert("", "end", values=values)
+
 # --- RUN THE APPLICATION ---
-if __name__ == "__main__":
+class StartupProfile:
+    """Times the startup phases for --startup-profile.
+
+    phase() times a block (it may run on a worker thread); mark() records
+    the time since startup. report_when() prints the breakdown once all the
+    named entries are in, whichever thread's work finishes last.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.timings = {}
+        self._lock = threading.Lock()
+        self._reported = False
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.timings[name] = time.perf_counter() - start
+
+    def mark(self, name):
+        with self._lock:
+            self.timings[name] = time.perf_counter() - self.started
+
+    def report_when(self, *names):
+        with self._lock:
+            if not self.enabled or self._reported or not all(n in self.timings for n in names):
+                return
+            self._reported = True
+            timings = dict(self.timings)
+        print("Startup profile:")
+        for name, label in (('driver_import', "driver import"),
+                            ('connect', "connect + migrations"),
+                            ('configure_styles', "configure_styles"),
+                            ('first_paint', "first paint (since start)")):
+            if name in timings:
+                print(f"  {label:<28}{timings[name] * 1000:8.1f} ms")
+
+
+def run_app(startup_profile=False, service=None, till=None):
     try:
         # 1. Install the required library if you haven't:
         # pip install mysql-connector-python
         
         # 2. Ensure your MySQL server is running.
         
-        # 3. Update DB_CONFIG at the top of this file.
+        # 3. Update DB_CONFIG at the top of database.py.
         
-        db = DatabaseManager(DB_CONFIG)
-        app = RestaurantApp(db)
+        # The window opens straight away; the database connects in the background
+        app = RestaurantApp(profile=StartupProfile(enabled=startup_profile), service=service, till=till)
         app.mainloop()
-    except ImportError:
-        print("Error: 'mysql-connector-python' not found.")
-        print("Please install it by running: pip install mysql-connector-python")
-        messagebox.showerror("Missing Library", 
-                             "The 'mysql-connector-python' library is required.\n"
-                             "Please install it using: \npip install mysql-connector-python")
+        app.executor.shutdown()
+        if app.replayer is not None:
+            app.replayer.close()
+        app.journal.close()
+        if app.db is not None:
+            stats = app.db.close()
+            if startup_profile and stats:
+                print(f"Connection health: {stats}")
+        return app.exit_code
     except Exception as e:
         print(f"Application failed: {e}")
         messagebox.showerror("Fatal Error", f"Application failed to start: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    from cli import main
+    sys.exit(main())
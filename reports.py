@@ -0,0 +1,545 @@
+"""Sales reports over every order line: NumPy columnar reports, and long-range
+breakdowns computed in parallel over worker processes.
+"""
+import hashlib
+import sys
+import csv
+import itertools
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+
+from cart import format_cents, to_cents
+from database import BACKENDS, DatabaseStartupError, open_database
+
+# --- COLUMNAR REPORTS (report) ---
+REPORT_CONFIG = {
+    'cache_dir': 'report_cache', # Column arrays kept between runs; None to always re-read
+    'batch_size': 50000,         # Order lines converted to arrays at a time
+    # MySQL hands out order_item_ids before commit, so a line can appear
+    # after lines with higher ids. Each run re-reads the newest lines again,
+    # and everything at least every reload_seconds.
+    'reread_lines': 10000,
+    'reload_seconds': 24 * 3600
+}
+
+# --- PARALLEL PERIOD REPORTS (period-report) ---
+PERIOD_REPORT_CONFIG = {
+    'workers': None,  # Worker processes; None uses every core
+    'shard_days': 7   # Days of orders each worker handles at a time
+}
+
+# --- COLUMNAR REPORTS ---
+# Month-end and menu-engineering reports over every order line. The lines
+# are streamed once into NumPy column arrays, kept on disk between runs and
+# topped up with the lines added since (order lines are never edited, but
+# may commit out of id order), and each report is a handful of whole-array
+# operations rather than a Python loop over rows.
+numpy = None # Loaded on first use (load_numpy); only the reports need it
+
+
+def load_numpy():
+    """Imports NumPy if it isn't loaded yet and returns it."""
+    global numpy
+    if numpy is None:
+        import numpy
+    return numpy
+
+
+# (column, dtype) of SalesColumns, in the order the query selects them
+SALES_LINE_COLUMNS = (
+    ('order_item_id', 'int64'),
+    ('order_id', 'int64'),
+    ('item_id', 'int32'),
+    ('quantity', 'int32'),
+    ('price_cents', 'int64'),
+    ('day', 'int32'),     # Days since 1970-01-01
+    ('hour', 'int8'),
+    ('weekday', 'int8'),  # 0 = Monday
+)
+
+BASKET_PERCENTILES = (25, 50, 75, 90, 99)
+
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def epoch_day(value):
+    """Days since 1970-01-01 of a date, or of a 'YYYY-MM-DD' string."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return (value - date(1970, 1, 1)).days
+
+
+class SalesColumns:
+    """Order lines as one NumPy array per SALES_LINE_COLUMNS entry.
+
+    lines['quantity'] etc. give the arrays; between() picks a date range
+    without copying more than the matching rows.
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    @classmethod
+    def empty(cls):
+        return cls({name: numpy.empty(0, dtype=dtype) for name, dtype in SALES_LINE_COLUMNS})
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __len__(self):
+        return len(self.arrays['order_item_id'])
+
+    @property
+    def last_id(self):
+        """Highest order_item_id held (0 when empty); later lines are fetched after it."""
+        ids = self.arrays['order_item_id']
+        return int(ids[-1]) if len(ids) else 0
+
+    def extend(self, other):
+        return SalesColumns({name: numpy.concatenate((self.arrays[name], other.arrays[name]))
+                             for name, _ in SALES_LINE_COLUMNS})
+
+    def split(self, order_item_id):
+        """(lines up to and including order_item_id, lines after it)."""
+        cut = int(numpy.searchsorted(self.arrays['order_item_id'], order_item_id, side='right'))
+        return (SalesColumns({name: array[:cut] for name, array in self.arrays.items()}),
+                SalesColumns({name: array[cut:] for name, array in self.arrays.items()}))
+
+    def between(self, since=None, until=None):
+        """Lines from `since` up to and including `until` (dates or 'YYYY-MM-DD')."""
+        if since is None and until is None:
+            return self
+        day = self.arrays['day']
+        mask = numpy.ones(len(day), dtype=bool)
+        if since is not None:
+            mask &= day >= epoch_day(since)
+        if until is not None:
+            mask &= day <= epoch_day(until)
+        return SalesColumns({name: array[mask] for name, array in self.arrays.items()})
+
+
+class ColumnarReports:
+    """Per-item margins, basket sizes and weekday/hour heatmaps over order_items.
+
+    columns() streams order_items joined with orders through iter_query
+    (tuple rows, batch_size at a time) into SalesColumns. With a cache_dir
+    the arrays are saved as .npy files per database, and the next run only
+    reads the last reread_lines lines again plus those added since, so a
+    line committed late with a lower id is still picked up. The whole cache
+    is reloaded once it is reload_seconds old. Menu names, categories and
+    costs are looked up when a report runs, so edits to the menu show up
+    straight away without invalidating the cache.
+    """
+    CACHE_VERSION = 2
+
+    def __init__(self, db, cache_dir=None, batch_size=50000, reread_lines=10000,
+                 reload_seconds=24 * 3600):
+        load_numpy()
+        self.db = db
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.reread_lines = reread_lines
+        self.reload_seconds = reload_seconds
+        self._loaded_at = None # When the cached lines were last read in full
+
+    # --- Loading the columns ---
+    def columns(self, refresh=True):
+        """Every order line as SalesColumns; refresh=False skips the database if cached."""
+        cached = self._read_cache()
+        if cached is not None and not refresh:
+            return cached
+        if cached is not None:
+            rows = self.db.fetch_query("SELECT MAX(order_item_id) AS last_id FROM order_items")
+            if not rows or (rows[0]['last_id'] or 0) < cached.last_id:
+                cached = None # A different or rebuilt database; start again
+            elif time.time() - self._loaded_at >= self.reload_seconds:
+                cached = None # Catches late lines older than the re-read window
+        if cached is None:
+            self._loaded_at = time.time()
+            lines = self._fetch(0)
+            self._write_cache(lines)
+            return lines
+        # Drop the newest lines and read them again with whatever came after
+        kept, window = cached.split(max(0, cached.last_id - self.reread_lines))
+        fresh = self._fetch(kept.last_id)
+        if numpy.array_equal(window['order_item_id'], fresh['order_item_id']):
+            return cached # Nothing new, nothing late
+        lines = kept.extend(fresh)
+        self._write_cache(lines)
+        return lines
+
+    def _fetch(self, after_id):
+        backend = self.db.backend
+        query = ("SELECT oi.order_item_id, oi.order_id, oi.item_id, oi.quantity, oi.price_per_item, "
+                 f"{backend.EPOCH_DAY_SQL}, {backend.HOUR_SQL}, {backend.WEEKDAY_SQL} "
+                 "FROM order_items oi JOIN orders o ON o.order_id = oi.order_id "
+                 "WHERE oi.order_item_id > %s ORDER BY oi.order_item_id")
+        parts = {name: [] for name, _ in SALES_LINE_COLUMNS}
+        rows = self.db.iter_query(query, (after_id,), rows='tuple', batch_size=self.batch_size)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            # One conversion per batch; Decimal prices from MySQL become floats
+            block = numpy.array(batch, dtype=numpy.float64)
+            block[:, 4] = numpy.rint(block[:, 4] * 100)
+            for index, (name, dtype) in enumerate(SALES_LINE_COLUMNS):
+                parts[name].append(block[:, index].astype(dtype))
+        return SalesColumns({name: numpy.concatenate(parts[name]) if parts[name]
+                             else numpy.empty(0, dtype=dtype)
+                             for name, dtype in SALES_LINE_COLUMNS})
+
+    def _cache_path(self):
+        config = self.db.config
+        source = config.get('path')
+        source = os.path.abspath(source) if source else f"{config.get('host')}/{config.get('database')}"
+        key = hashlib.sha256(f"{self.db.backend.name}:{source}".encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"order_lines-{key}")
+
+    def _read_cache(self):
+        if not self.cache_dir:
+            return None
+        path = self._cache_path()
+        try:
+            with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != self.CACHE_VERSION:
+                return None
+            arrays = {}
+            for name, dtype in SALES_LINE_COLUMNS:
+                # meta.json names the set of files it was written with, so a
+                # write cut short never mixes old and new columns
+                array = numpy.load(os.path.join(path, f"{name}.{meta['files']}.npy"))
+                if array.dtype != numpy.dtype(dtype) or len(array) != meta['rows']:
+                    return None
+                arrays[name] = array
+            self._loaded_at = meta['loaded_at']
+            return SalesColumns(arrays)
+        except (OSError, ValueError, KeyError) as err:
+            if not isinstance(err, FileNotFoundError):
+                print(f"Ignoring report cache: {err}")
+            return None
+
+    def _write_cache(self, lines):
+        if not self.cache_dir:
+            return
+        path = self._cache_path()
+        files = uuid.uuid4().hex[:12]
+        try:
+            os.makedirs(path, exist_ok=True)
+            for name, _ in SALES_LINE_COLUMNS:
+                numpy.save(os.path.join(path, f"{name}.{files}.npy"), lines[name])
+            temp_path = os.path.join(path, 'meta.json.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.CACHE_VERSION, 'rows': len(lines), 'files': files,
+                           'last_id': lines.last_id, 'loaded_at': self._loaded_at}, f)
+            os.replace(temp_path, os.path.join(path, 'meta.json'))
+            for entry in os.listdir(path):
+                if entry.endswith('.npy') and not entry.endswith(f".{files}.npy"):
+                    os.remove(os.path.join(path, entry))
+        except OSError as err:
+            print(f"Could not save the report cache: {err}")
+
+    def menu_lookup(self):
+        """(item_id -> menu row, unit cost in cents per item_id with NaN where unknown)."""
+        rows = self.db.fetch_query("SELECT item_id, name, category, cost FROM menu_items")
+        menu = {row['item_id']: row for row in rows}
+        costs = numpy.full(max(menu, default=0) + 1, numpy.nan)
+        for item_id, row in menu.items():
+            if row['cost'] is not None:
+                costs[item_id] = to_cents(row['cost'])
+        return menu, costs
+
+    # --- Reports ---
+    def item_margins(self, lines):
+        """Quantity, revenue, cost and margin per item, best margin first.
+
+        Cost is the item's current cost times the quantity sold; items
+        without a cost get None for cost and margin.
+        """
+        menu, costs = self.menu_lookup()
+        item_id = lines['item_id']
+        size = max(int(item_id.max()) + 1 if len(item_id) else 0, len(costs))
+        quantity = numpy.bincount(item_id, weights=lines['quantity'], minlength=size)
+        revenue = numpy.bincount(item_id, weights=lines['quantity'] * lines['price_cents'],
+                                 minlength=size)
+        unit_cost = numpy.full(size, numpy.nan)
+        unit_cost[:len(costs)] = costs
+        margin = revenue - quantity * unit_cost
+        sold = numpy.flatnonzero(quantity)
+        # Unknown margins (NaN) sort last
+        sold = sold[numpy.argsort(-numpy.nan_to_num(margin[sold], nan=-numpy.inf), kind='stable')]
+        report = []
+        for index in sold.tolist():
+            known = not numpy.isnan(unit_cost[index])
+            row = menu.get(index, {})
+            report.append({
+                'item_id': index,
+                'name': row.get('name') or f"Item {index}",
+                'category': row.get('category'),
+                'quantity': int(quantity[index]),
+                'revenue_cents': int(round(revenue[index])),
+                'cost_cents': int(round(quantity[index] * unit_cost[index])) if known else None,
+                'margin_cents': int(round(margin[index])) if known else None,
+                'margin_pct': (float(margin[index] / revenue[index] * 100)
+                               if known and revenue[index] else None),
+            })
+        return report
+
+    def basket_sizes(self, lines, percentiles=BASKET_PERCENTILES):
+        """Distribution of items and value per order.
+
+        Returns the order count, mean items per order, percentiles of
+        items and of value (cents) per order, and a histogram as
+        (items in the order, number of orders) pairs.
+        """
+        if not len(lines):
+            return {'orders': 0, 'mean_items': 0.0, 'item_percentiles': {},
+                    'value_percentiles': {}, 'histogram': []}
+        _, order_index = numpy.unique(lines['order_id'], return_inverse=True)
+        items = numpy.bincount(order_index, weights=lines['quantity']).astype(numpy.int64)
+        value = numpy.bincount(order_index, weights=lines['quantity'] * lines['price_cents'])
+        counts = numpy.bincount(items)
+        return {
+            'orders': len(items),
+            'mean_items': float(items.mean()),
+            'item_percentiles': dict(zip(percentiles, numpy.percentile(items, percentiles).tolist())),
+            'value_percentiles': dict(zip(percentiles,
+                                          numpy.rint(numpy.percentile(value, percentiles)).astype(int).tolist())),
+            'histogram': [(size, int(counts[size])) for size in numpy.flatnonzero(counts).tolist()],
+        }
+
+    def heatmap(self, lines):
+        """7 x 24 arrays (weekday x hour) of 'orders', 'quantity' and 'revenue_cents'."""
+        cell = lines['weekday'].astype(numpy.intp) * 24 + lines['hour']
+        _, first_line = numpy.unique(lines['order_id'], return_index=True)
+        shape = (7, 24)
+        return {
+            'orders': numpy.bincount(cell[first_line], minlength=168).reshape(shape),
+            'quantity': numpy.bincount(cell, weights=lines['quantity'],
+                                       minlength=168).astype(numpy.int64).reshape(shape),
+            'revenue_cents': numpy.rint(numpy.bincount(cell, weights=lines['quantity'] * lines['price_cents'],
+                                                       minlength=168)).astype(numpy.int64).reshape(shape),
+        }
+
+
+def print_margins(report):
+    print(f"{'Item':<30}{'Qty':>8}{'Revenue':>14}{'Cost':>14}{'Margin':>14}{'Margin %':>10}")
+    for row in report:
+        cost = format_cents(row['cost_cents']) if row['cost_cents'] is not None else "-"
+        margin = format_cents(row['margin_cents']) if row['margin_cents'] is not None else "-"
+        pct = f"{row['margin_pct']:.1f}" if row['margin_pct'] is not None else "-"
+        print(f"{row['name'][:29]:<30}{row['quantity']:>8}{format_cents(row['revenue_cents']):>14}"
+              f"{cost:>14}{margin:>14}{pct:>10}")
+
+
+def print_baskets(report):
+    print(f"Orders: {report['orders']}    Mean items per order: {report['mean_items']:.2f}")
+    for p, items in report['item_percentiles'].items():
+        print(f"  p{p:<3} {items:8.1f} items  {format_cents(report['value_percentiles'][p]):>12}")
+    print("Items per order:")
+    for size, orders in report['histogram']:
+        print(f"  {size:>4}  {orders}")
+
+
+def print_heatmap(report, measure='revenue_cents'):
+    grid = report[measure]
+    print(f"{measure} by weekday (rows) and hour (columns)")
+    print("     " + "".join(f"{hour:>8}" for hour in range(24)))
+    for weekday, name in enumerate(WEEKDAY_NAMES):
+        print(f"{name:<5}" + "".join(f"{int(value):>8}" for value in grid[weekday]))
+
+
+def report_command(args):
+    try:
+        load_numpy()
+    except ImportError:
+        print("The reports need NumPy: pip install numpy")
+        return 1
+    try:
+        db = open_database()
+    except DatabaseStartupError as err:
+        print(f"{err.title}: {err}")
+        return 1
+    try:
+        start = time.perf_counter()
+        reports = ColumnarReports(db, cache_dir=None if args.no_cache else REPORT_CONFIG['cache_dir'],
+                                  batch_size=REPORT_CONFIG['batch_size'],
+                                  reread_lines=REPORT_CONFIG['reread_lines'],
+                                  reload_seconds=REPORT_CONFIG['reload_seconds'])
+        lines = reports.columns().between(args.since, args.until)
+        loaded = time.perf_counter()
+        if args.report == 'margins':
+            print_margins(reports.item_margins(lines))
+        elif args.report == 'baskets':
+            print_baskets(reports.basket_sizes(lines))
+        else:
+            print_heatmap(reports.heatmap(lines), args.measure)
+        print(f"{len(lines)} order line(s); loaded in {loaded - start:.2f}s, "
+              f"computed in {time.perf_counter() - loaded:.2f}s")
+    except Exception as err:
+        print(f"Report Error: {err}")
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+# --- PARALLEL PERIOD REPORTS ---
+# Long-range breakdowns split the order_date range into shards of a few
+# days. Each shard is aggregated by a worker process on its own database
+# connection, and the parent adds the partial results together by key.
+# Each report is (key columns, SELECT); every report counts orders,
+# quantity and revenue_cents. Shards never split an order, so
+# COUNT(DISTINCT order_id) adds up across them.
+_PERIOD_MEASURES = ("COUNT(DISTINCT o.order_id), SUM(oi.quantity), "
+                    "SUM(ROUND(oi.quantity * oi.price_per_item * 100))")
+_PERIOD_SOURCE = ("FROM orders o JOIN order_items oi ON oi.order_id = o.order_id "
+                  "WHERE o.order_date >= %s AND o.order_date < %s")
+
+PERIOD_MEASURES = ('orders', 'quantity', 'revenue_cents')
+
+PERIOD_REPORTS = {
+    'daily': (('sale_date',),
+              f"SELECT {{day}}, {_PERIOD_MEASURES} {_PERIOD_SOURCE} GROUP BY 1"),
+    'hourly': (('sale_date', 'sale_hour'),
+               f"SELECT {{day}}, {{hour}}, {_PERIOD_MEASURES} {_PERIOD_SOURCE} GROUP BY 1, 2"),
+    'items': (('item_id',),
+              f"SELECT oi.item_id, {_PERIOD_MEASURES} {_PERIOD_SOURCE} GROUP BY 1"),
+    'heatmap': (('weekday', 'sale_hour'),
+                f"SELECT {{weekday}}, {{hour}}, {_PERIOD_MEASURES} {_PERIOD_SOURCE} GROUP BY 1, 2"),
+}
+
+_report_worker_backend = None # The database connection of a report worker process
+
+
+def _init_report_worker(backend_name, config):
+    """Runs once in each worker process: opens that process's own connection."""
+    global _report_worker_backend
+    sys.stdout = sys.stderr # Keep connection messages out of the report
+    _report_worker_backend = BACKENDS[backend_name](config, {'size': 1, 'timeout': 30.0,
+                                                             'idle_check_after': 30.0, 'retries': 1})
+    _report_worker_backend.connect()
+
+
+def _run_report_shard(report, start, end):
+    """Aggregates one shard in a worker; returns {key tuple: [measures]}."""
+    backend = _report_worker_backend
+    keys, query = PERIOD_REPORTS[report]
+    query = query.format(day=backend.DAY_SQL, hour=backend.HOUR_SQL, weekday=backend.WEEKDAY_SQL)
+    params = (backend.order_time_param(start), backend.order_time_param(end))
+    partial = {}
+    for row in backend.iter_query(query, params, rows='tuple'):
+        partial[tuple(row[:len(keys)])] = [int(value or 0) for value in row[len(keys):]]
+    return partial
+
+
+class ParallelReportRunner:
+    """Runs a PERIOD_REPORTS report over a date range on a pool of processes.
+
+    The range is cut into shard_days-day shards, handed out to `workers`
+    processes (each with its own connection, opened once), and the
+    partial aggregates are summed by key as shards finish.
+    progress(done, total) is called after each shard.
+    """
+    def __init__(self, db, workers=None, shard_days=7, progress=None):
+        self.db = db
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_days = max(1, shard_days)
+        self.progress = progress
+
+    def order_range(self):
+        """(first, last) order_date as local datetimes, or None with no orders."""
+        backend = self.db.backend
+        rows = list(backend.iter_query("SELECT MIN(order_date), MAX(order_date) FROM orders", rows='tuple'))
+        if not rows or rows[0][0] is None:
+            return None
+        return backend.parse_order_time(rows[0][0]), backend.parse_order_time(rows[0][1])
+
+    def shards(self, since=None, until=None):
+        """[start, end) local datetimes covering since..until (dates; default: every order)."""
+        if since is None or until is None:
+            found = self.order_range()
+            if found is None:
+                return []
+            since = since or found[0].date()
+            until = until or found[1].date()
+        start = datetime.combine(since, datetime.min.time())
+        stop = datetime.combine(until, datetime.min.time()) + timedelta(days=1)
+        step = timedelta(days=self.shard_days)
+        shards = []
+        while start < stop:
+            shards.append((start, min(start + step, stop)))
+            start += step
+        return shards
+
+    def run(self, report, since=None, until=None):
+        """Returns (column names, rows sorted by key) for the report."""
+        keys, _ = PERIOD_REPORTS[report]
+        shards = self.shards(since, until)
+        totals = {}
+        if shards:
+            backend = self.db.backend
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(shards)),
+                                     initializer=_init_report_worker,
+                                     initargs=(backend.name, self.db.config)) as pool:
+                futures = [pool.submit(_run_report_shard, report, start, end) for start, end in shards]
+                for done, future in enumerate(as_completed(futures), 1):
+                    for key, measures in future.result().items():
+                        merged = totals.get(key)
+                        if merged is None:
+                            totals[key] = measures
+                        else:
+                            for index, value in enumerate(measures):
+                                merged[index] += value
+                    if self.progress is not None:
+                        self.progress(done, len(shards))
+        rows = [key + tuple(measures) for key, measures in sorted(totals.items())]
+        return keys + PERIOD_MEASURES, rows
+
+
+def period_report_command(args):
+    try:
+        since = date.fromisoformat(args.since) if args.since else None
+        until = date.fromisoformat(args.until) if args.until else None
+    except ValueError as err:
+        print(f"Bad date: {err}")
+        return 1
+    # The report is written to stdout; everything else goes to stderr
+    with redirect_stdout(sys.stderr):
+        try:
+            columns, rows = run_period_report(args, since, until)
+        except DatabaseStartupError as err:
+            print(f"{err.title}: {err}")
+            return 1
+        except Exception as err:
+            print(f"Report Error: {err}")
+            return 1
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    finally:
+        if args.output:
+            output.close()
+    return 0
+
+
+def run_period_report(args, since, until):
+    """Runs the period-report command's report; returns (columns, rows)."""
+    db = open_database()
+    runner = ParallelReportRunner(
+        db, workers=args.workers or PERIOD_REPORT_CONFIG['workers'], shard_days=args.shard_days,
+        progress=lambda done, total: print(f"Shard {done}/{total} done ({done * 100 // total}%)"))
+    start = time.perf_counter()
+    try:
+        columns, rows = runner.run(args.report, since, until)
+    finally:
+        db.close()
+    print(f"{len(rows)} row(s) from {runner.workers} worker(s) in {time.perf_counter() - start:.1f}s")
+    return columns, rows
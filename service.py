@@ -0,0 +1,295 @@
+"""The order service tills connect to with --service, and the client they use."""
+import functools
+import asyncio
+import itertools
+import json
+import threading
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor
+from decimal import Decimal
+
+from database import (GROUP_COMMIT_CONFIG, POOL_CONFIG, DatabaseStartupError, MenuSearchIndex,
+                      open_database)
+
+# --- ORDER SERVICE (serve) ---
+# One process owns the database connections and the menu cache; the tills
+# connect to it (--service HOST:PORT) instead of to MySQL directly.
+SERVICE_CONFIG = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    'max_in_flight': 32,          # Requests one till may have pipelined at once
+    'max_request_bytes': 1 << 20, # Longest request line the service accepts
+    'timeout': 30.0               # Seconds a till waits for a reply
+}
+
+# --- ORDER SERVICE ---
+# Newline-delimited JSON over TCP. A request is {"id": 7, "op": "create_order",
+# "args": [...]} and its reply {"id": 7, "result": ...} or {"id": 7, "error":
+# "..."}. A client may send many requests without waiting; replies come back
+# as they finish, matched up by id.
+SERVICE_OPERATIONS = frozenset({
+    'validate_user', 'create_user', 'get_menu_items', 'get_menu_categories',
+    'get_menu_page', 'get_pricing_rules', 'create_order', 'save_keyed_orders',
+    'submit_feedback', 'health_stats', 'get_sales_report', 'suggest_items',
+})
+
+
+class ServiceError(Exception):
+    """An operation failed on the order service, or it couldn't be reached."""
+
+
+def _json_value(value):
+    # Decimal prices from MySQL travel as numbers, TIME/DATETIME values as text
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def encode_message(message):
+    return json.dumps(message, default=_json_value, separators=(',', ':')).encode('utf-8') + b"\n"
+
+
+class OrderService:
+    """Serves DatabaseManager operations to many tills over one pool.
+
+    Every till shares the same DatabaseManager, so MySQL sees at most the
+    pool's connections however many tills there are, and the menu cache
+    stays warm for all of them. Calls run on `workers` threads; a till may
+    pipeline up to max_in_flight requests before the service stops
+    reading from it.
+    """
+    def __init__(self, db, host='127.0.0.1', port=8765, workers=5, max_in_flight=32,
+                 max_request_bytes=1 << 20):
+        self.db = db
+        self.host = host
+        self.port = port
+        self.max_in_flight = max_in_flight
+        self.max_request_bytes = max_request_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='order-service')
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._handle, self.host, self.port,
+                                            limit=self.max_request_bytes)
+        addresses = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}"
+                              for sock in server.sockets)
+        print(f"Order service listening on {addresses}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    async def _handle(self, reader, writer):
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break # Request too long, or the till went away
+                if not line:
+                    break
+                await in_flight.acquire()
+                task = asyncio.ensure_future(self._reply(line, writer, write_lock, in_flight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def _reply(self, line, writer, write_lock, in_flight):
+        request_id = None
+        try:
+            # Amounts become Decimals again, as exact as the till sent them
+            request = json.loads(line, parse_float=Decimal)
+            request_id = request.get('id')
+            op = request['op']
+            if op not in SERVICE_OPERATIONS:
+                raise ServiceError(f"unknown operation {op!r}")
+            call = functools.partial(getattr(self.db, op), *request.get('args', ()))
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, call)
+            response = {'id': request_id, 'result': result}
+        except Exception as err:
+            response = {'id': request_id, 'error': f"{type(err).__name__}: {err}"}
+        try:
+            async with write_lock:
+                writer.write(encode_message(response))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            in_flight.release()
+
+
+class ServiceClient:
+    """Stands in for DatabaseManager in a till that uses an OrderService.
+
+    Calls from any thread share one connection: each is sent straight away
+    and waits only for its own reply, so the executor's workers pipeline
+    their requests. If the connection drops, waiting calls get a
+    ServiceError and the next call reconnects. Menu search runs on a local
+    index, filled by get_menu_items, as it does with a database.
+    """
+    def __init__(self, host='127.0.0.1', port=8765, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.menu_index = MenuSearchIndex()
+        self._menu_rows = None # The menu last put in menu_index
+        self._lock = threading.Lock() # Guards the socket, _pending and the ids
+        self._sock = None
+        self._pending = {} # request id -> Future, for the current connection
+        self._ids = itertools.count(1)
+
+    def _connect(self):
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as err:
+            raise ServiceError(f"can't reach the order service at {self.host}:{self.port}: {err}") from err
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._pending = {}
+        threading.Thread(target=self._read, args=(sock, self._pending),
+                         name='order-service-reader', daemon=True).start()
+
+    def _read(self, sock, pending):
+        try:
+            with sock.makefile('rb') as stream:
+                for line in stream:
+                    reply = json.loads(line)
+                    with self._lock:
+                        future = pending.pop(reply.get('id'), None)
+                    if future is not None:
+                        future.set_result(reply)
+            error = "the order service closed the connection"
+        except (OSError, ValueError) as err:
+            error = f"lost the order service connection: {err}"
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            waiting = list(pending.values())
+            pending.clear()
+        sock.close()
+        for future in waiting:
+            future.set_exception(ServiceError(error))
+
+    def call(self, op, *args):
+        """Runs one operation on the service and returns its result."""
+        future = Future()
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+            request_id = next(self._ids)
+            pending = self._pending
+            pending[request_id] = future
+            try:
+                self._sock.sendall(encode_message({'id': request_id, 'op': op, 'args': args}))
+            except OSError as err:
+                pending.pop(request_id, None)
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR) # The reader cleans up
+                except OSError:
+                    pass
+                raise ServiceError(f"lost the order service connection: {err}") from err
+        try:
+            reply = future.result(self.timeout)
+        except TimeoutError:
+            with self._lock:
+                pending.pop(request_id, None)
+            raise ServiceError(f"{op} timed out after {self.timeout:.0f}s") from None
+        if 'error' in reply:
+            raise ServiceError(reply['error'])
+        return reply['result']
+
+    def close(self):
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def health_stats(self):
+        return self.call('health_stats')
+
+    def create_user(self, username, password):
+        return self.call('create_user', username, password)
+
+    def validate_user(self, username, password):
+        return self.call('validate_user', username, password)
+
+    def get_menu_items(self):
+        rows = self.call('get_menu_items')
+        if rows != self._menu_rows: # The service sends the whole menu each time
+            self.menu_index.apply(rows, full=True)
+            self._menu_rows = rows
+        return rows
+
+    def search_menu(self, text):
+        return self.menu_index.search(text)
+
+    def menu_rows(self, item_ids):
+        return self.menu_index.rows(item_ids)
+
+    def get_menu_categories(self):
+        return self.call('get_menu_categories')
+
+    def get_menu_page(self, category, after_id=0, limit=50):
+        return self.call('get_menu_page', category, after_id, limit)
+
+    def get_pricing_rules(self):
+        return self.call('get_pricing_rules')
+
+    def create_order(self, user_id, total_amount, items):
+        return self.call('create_order', user_id, total_amount, items)
+
+    def save_keyed_orders(self, orders, keys):
+        return self.call('save_keyed_orders', orders, keys)
+
+    def submit_feedback(self, user_id, rating, comments):
+        return self.call('submit_feedback', user_id, rating, comments)
+
+    def get_sales_report(self, days=None):
+        return self.call('get_sales_report', days)
+
+    def suggest_items(self, item_ids, limit=None):
+        return self.call('suggest_items', list(item_ids), limit)
+
+
+def serve_command(args):
+    group_commit = dict(GROUP_COMMIT_CONFIG, enabled=True) if args.group_commit else None
+    try:
+        db = open_database(group_commit=group_commit)
+    except DatabaseStartupError as err:
+        print(f"{err.title}: {err}")
+        return 1
+    service = OrderService(db, args.host, args.port,
+                           workers=POOL_CONFIG['size'],
+                           max_in_flight=SERVICE_CONFIG['max_in_flight'],
+                           max_request_bytes=SERVICE_CONFIG['max_request_bytes'])
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        print("Order service stopped.")
+    except OSError as err:
+        print(f"Order service failed: {err}")
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+def open_service(host, port):
+    """Connects to an order service; raises DatabaseStartupError if it isn't there."""
+    client = ServiceClient(host, port, timeout=SERVICE_CONFIG['timeout'])
+    try:
+        client.health_stats()
+    except ServiceError as err:
+        client.close()
+        raise DatabaseStartupError("Service Unavailable", f"{err}\n\nIs 'serve' running?") from err
+    return client
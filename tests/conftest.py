@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, next to this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+@pytest.fixture
+def db(request, tmp_path):
+    """A DatabaseManager on a fresh SQLite file with one user and two menu items.
+
+    Parametrize it indirectly with True to turn group commit on.
+    """
+    group_commit = dict(database.GROUP_COMMIT_CONFIG, enabled=getattr(request, 'param', False))
+    manager = database.DatabaseManager({'path': str(tmp_path / 'restaurant.db')},
+                                       backend='sqlite', group_commit=group_commit)
+    manager.create_user('ann', 'secret')
+    add_menu_item(manager, 'Burger', '10.00', 'mains')
+    add_menu_item(manager, 'Soda', '2.50', 'drinks')
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def user_id(db):
+    return db.fetch_query("SELECT user_id FROM users")[0]['user_id']
+
+
+def add_menu_item(db, name, price, category=None):
+    db.execute_query("INSERT INTO menu_items (name, price, category) VALUES (%s, %s, %s)",
+                     (name, price, category))
+    return db.fetch_query("SELECT MAX(item_id) AS item_id FROM menu_items")[0]['item_id']
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from cart import Cart, format_cents, from_cents, to_cents
+
+BURGER = {'item_id': 1, 'name': 'Burger', 'category': 'mains', 'price': Decimal('10.00')}
+FRIES = {'item_id': 3, 'name': 'Fries', 'category': 'sides', 'price': '3.35'}
+
+
+# --- MONEY ---
+def test_to_cents_rounds_half_up_from_any_price_type():
+    assert to_cents(Decimal('2.675')) == 268
+    assert to_cents(0.1 + 0.2) == 30
+    assert to_cents('19.99') == 1999
+    assert to_cents(2.5) == 250
+
+
+def test_from_cents_is_exact():
+    assert from_cents(1999) == Decimal('19.99')
+    assert str(from_cents(5)) == '0.05'
+
+
+def test_format_cents():
+    assert format_cents(1999) == '$19.99'
+    assert format_cents(5) == '$0.05'
+    assert format_cents(-5) == '-$0.05'
+
+
+def test_cart_subtotal_tracks_edits():
+    cart = Cart()
+    cart.add(BURGER, 2)
+    cart.add(FRIES, 1)
+    cart.add(BURGER, 1)
+    assert (cart.subtotal_cents, cart.item_count) == (3335, 4)
+    cart.set_quantity(3, 4)
+    assert (cart.subtotal_cents, cart.item_count) == (4340, 7)
+    cart.set_quantity(1, 0)
+    assert (cart.subtotal_cents, cart.item_count) == (1340, 4)
+    assert cart.snapshot().items == [{'item_id': 3, 'quantity': 4, 'price': Decimal('3.35')}]
+
+
+def test_cart_listeners_hear_each_change():
+    cart = Cart()
+    events = []
+    cart.add_listener(lambda event, item_id: events.append((event, item_id)))
+    cart.add(BURGER, 1)
+    cart.add(BURGER, 1)
+    cart.set_quantity(1, 2) # Unchanged: no event
+    cart.remove(1)
+    cart.remove(1)
+    cart.clear()
+    assert events == [('add', 1), ('update', 1), ('remove', 1), ('clear', None)]
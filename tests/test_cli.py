@@ -0,0 +1,49 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from cli import order_from_record, read_orders_csv, read_orders_jsonl
+
+
+# --- BULK ORDER IMPORT ---
+def test_import_amounts_stay_exact(tmp_path):
+    path = tmp_path / 'orders.jsonl'
+    order = {'user_id': 1, 'items': [{'item_id': 3, 'quantity': 3, 'price': 0.1},
+                                     {'item_id': 4, 'quantity': 1, 'price': '19.99'}]}
+    path.write_text(json.dumps(order) + "\n", encoding='utf-8')
+    [(user_id, total_amount, items)] = read_orders_jsonl(str(path))
+    assert (user_id, total_amount) == (1, Decimal('20.29'))
+    assert [item['price'] for item in items] == [Decimal('0.10'), Decimal('19.99')]
+
+
+def test_csv_orders_are_grouped_by_reference(tmp_path):
+    path = tmp_path / 'orders.csv'
+    path.write_text("order_ref,user_id,item_id,quantity,price\n"
+                    "a,1,3,2,6.25\na,1,4,1,0.30\nb,2,3,1,6.25\n", encoding='utf-8')
+    orders = list(read_orders_csv(str(path)))
+    assert [(user_id, total) for user_id, total, _ in orders] == [(1, Decimal('12.80')),
+                                                                  (2, Decimal('6.25'))]
+
+
+def test_bad_records_are_skipped(tmp_path, capsys):
+    path = tmp_path / 'orders.jsonl'
+    path.write_text('{"user_id": 1, "items": []}\n'
+                    '{"user_id": 1, "items": [{"item_id": 3, "quantity": 1, "price": "abc"}]}\n'
+                    '{"user_id": 1, "items": [{"item_id": 3, "quantity": 1, "price": 2}]}\n',
+                    encoding='utf-8')
+    assert [total for _, total, _ in read_orders_jsonl(str(path))] == [Decimal('2.00')]
+    assert capsys.readouterr().out.count("Skipping line") == 2
+
+
+def test_supplied_total_is_kept_exact():
+    record = {'user_id': '1', 'total_amount': '6.25',
+              'items': [{'item_id': '3', 'quantity': '1', 'price': '6.25'}]}
+    assert order_from_record(record)[1] == Decimal('6.25')
+
+
+def test_total_must_match_the_items():
+    record = {'user_id': 1, 'total_amount': '6.20',
+              'items': [{'item_id': 3, 'quantity': 1, 'price': '6.25'}]}
+    with pytest.raises(ValueError, match="doesn't match"):
+        order_from_record(record)
@@ -0,0 +1,87 @@
+import csv
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from exports import ColumnarFileReader, ColumnarFileWriter, export_table
+
+COLUMNS = (('id', 'int'), ('price', 'money'), ('at', 'timestamp'), ('note', 'str'))
+
+
+def test_rcol_round_trip(tmp_path):
+    path = str(tmp_path / 't.rcol')
+    at = datetime(2026, 10, 12, 18, 30)
+    writer = ColumnarFileWriter(path, 't', COLUMNS)
+    writer.write_chunk([(1, 1250, at, 'crème brûlée'), (2, None, None, None)], 1, 2)
+    writer.write_chunk([(3, -5, at, '')], 3, 3)
+    writer.close()
+
+    reader = ColumnarFileReader(path)
+    assert (reader.table, reader.columns) == ('t', list(COLUMNS))
+    assert [(c['rows'], c['first_id'], c['last_id']) for c in reader.chunks] == [(2, 1, 2), (1, 3, 3)]
+    assert reader.read_chunk(0) == {'id': [1, 2], 'price': [1250, None],
+                                    'at': [int(at.timestamp()), None],
+                                    'note': ['crème brûlée', None]}
+    assert reader.read_chunk(1, columns={'price', 'note'}) == {'price': [-5], 'note': ['']}
+    reader.close()
+
+
+def test_rcol_reader_rejects_a_partial_file(tmp_path):
+    path = tmp_path / 't.rcol'
+    writer = ColumnarFileWriter(str(path), 't', COLUMNS)
+    writer.write_chunk([(1, 1250, None, 'x')], 1, 1)
+    writer.close()
+    path.write_bytes(path.read_bytes()[:-3])
+    with pytest.raises(ValueError):
+        ColumnarFileReader(str(path))
+
+
+def test_export_leaves_recent_rows_for_the_next_run(db, user_id, tmp_path):
+    items = [{'item_id': 1, 'quantity': 2, 'price': Decimal('10.00')}]
+    db.save_keyed_orders([(user_id, Decimal('20.00'), items)] * 2, ['a', 'b'])
+    db.create_order(user_id, Decimal('12.34'), items)
+    directory = tmp_path / 'exports'
+    directory.mkdir()
+
+    assert export_table(db, 'orders', str(directory), grace_seconds=3600) == (0, 0, [])
+    assert list(directory.iterdir()) == []
+
+    count, last_id, paths = export_table(db, 'orders', str(directory), chunk_rows=2, grace_seconds=0)
+    assert count == 3
+    rcol_path = next(path for path in paths if path.endswith('.rcol'))
+    reader = ColumnarFileReader(rcol_path)
+    assert len(reader.chunks) == 2
+    rows = [reader.read_chunk(i, columns={'total_amount', 'order_key'}) for i in range(2)]
+    reader.close()
+    assert rows[0] == {'total_amount': [2000, 2000], 'order_key': ['a', 'b']}
+    assert rows[1] == {'total_amount': [1234], 'order_key': [None]}
+
+    csv_path = next(path for path in paths if path.endswith('.csv'))
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        exported = list(csv.DictReader(f))
+    assert [row['total_amount'] for row in exported] == ['20.00', '20.00', '12.34']
+
+    assert export_table(db, 'orders', str(directory), after_id=last_id, grace_seconds=0)[0] == 0
+
+
+def test_failed_export_leaves_no_files(db, user_id, tmp_path, monkeypatch):
+    items = [{'item_id': 1, 'quantity': 1, 'price': Decimal('10.00')}]
+    for _ in range(3):
+        db.create_order(user_id, Decimal('10.00'), items)
+    written = []
+
+    def write_chunk(self, rows, first_id, last_id):
+        if written: # The first chunk is already on disk
+            raise OSError("disk full")
+        written.append(rows)
+        original(self, rows, first_id, last_id)
+
+    original = ColumnarFileWriter.write_chunk
+    monkeypatch.setattr(ColumnarFileWriter, 'write_chunk', write_chunk)
+    directory = tmp_path / 'exports'
+    directory.mkdir()
+    with pytest.raises(OSError):
+        export_table(db, 'orders', str(directory), chunk_rows=2, grace_seconds=0)
+    assert len(written) == 1
+    assert list(directory.iterdir()) == []
@@ -0,0 +1,237 @@
+import json
+import time
+from decimal import Decimal
+
+import pytest
+
+from database import JournalReplayer, OrderJournal, till_journal_path
+
+ITEMS = [{'item_id': 1, 'quantity': 2, 'price': Decimal('10.00')},
+         {'item_id': 2, 'quantity': 1, 'price': Decimal('2.50')}]
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'till.journal')
+
+
+def open_journal(path):
+    return OrderJournal(path, fsync='never')
+
+
+def lines(path):
+    with open(path, 'rb') as f:
+        return f.read().splitlines()
+
+
+def count_orders(db):
+    return db.fetch_query("SELECT COUNT(*) AS n FROM orders")[0]['n']
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+# --- ORDER JOURNAL ---
+def test_pending_orders_survive_a_reopen(journal_path):
+    journal = open_journal(journal_path)
+    first = journal.append(1, Decimal('22.50'), ITEMS)
+    second = journal.append(1, Decimal('2.50'), ITEMS[1:])
+    journal.close()
+
+    journal = open_journal(journal_path)
+    assert journal.counts() == (2, 0)
+    assert journal.next_batch(10) == [(first, (1, Decimal('22.50'), ITEMS)),
+                                      (second, (1, Decimal('2.50'), ITEMS[1:]))]
+    journal.close()
+
+
+def test_amounts_are_written_as_exact_text(journal_path):
+    journal = open_journal(journal_path)
+    journal.append(1, Decimal('0.10'), [{'item_id': 1, 'quantity': 3, 'price': Decimal('0.10')}])
+    journal.close()
+    record = json.loads(lines(journal_path)[0])
+    assert record['total_amount'] == '0.10'
+    assert record['items'][0]['price'] == '0.10'
+
+
+def test_torn_last_line_is_dropped(journal_path):
+    journal = open_journal(journal_path)
+    key = journal.append(1, Decimal('22.50'), ITEMS)
+    journal.close()
+    good = lines(journal_path)
+    with open(journal_path, 'ab') as f:
+        f.write(b'{"op":"order","key":"torn","user_id":1,"tot') # Crash mid-write
+
+    journal = open_journal(journal_path)
+    assert [k for k, _ in journal.next_batch(10)] == [key]
+    assert lines(journal_path) == good
+    later = journal.append(1, Decimal('2.50'), ITEMS[1:])
+    journal.close()
+
+    journal = open_journal(journal_path)
+    assert [k for k, _ in journal.next_batch(10)] == [key, later]
+    journal.close()
+
+
+def test_saved_orders_are_not_replayed(journal_path):
+    journal = open_journal(journal_path)
+    saved = journal.append(1, Decimal('22.50'), ITEMS)
+    pending = journal.append(1, Decimal('2.50'), ITEMS[1:])
+    journal.record_results([(saved, 17)])
+    journal.close()
+
+    journal = open_journal(journal_path)
+    assert [k for k, _ in journal.next_batch(10)] == [pending]
+    journal.close()
+
+
+def test_rejected_orders_fail_after_max_attempts_and_can_be_retried(journal_path):
+    journal = open_journal(journal_path)
+    key = journal.append(1, Decimal('22.50'), ITEMS)
+    journal.record_results([(key, False)], max_attempts=2)
+    assert journal.counts() == (1, 0)
+    journal.record_results([(key, False)], max_attempts=2)
+    assert journal.counts() == (0, 1)
+    assert journal.next_batch(10) == []
+    journal.close()
+
+    journal = open_journal(journal_path)
+    assert journal.counts() == (0, 1)
+    assert journal.retry_failed() == 1
+    assert journal.counts() == (1, 0)
+    journal.record_results([(key, 5)])
+    assert journal.counts() == (0, 0)
+    journal.close()
+
+
+def test_compaction_keeps_only_outstanding_orders(journal_path):
+    journal = open_journal(journal_path)
+    saved = journal.append(1, Decimal('22.50'), ITEMS)
+    failed = journal.append(1, Decimal('1.00'), ITEMS[1:])
+    pending = journal.append(1, Decimal('2.50'), ITEMS[1:])
+    journal.record_results([(saved, 3), (failed, False)], max_attempts=1)
+    assert not journal.compact(min_bytes=1 << 20)
+    assert journal.compact()
+    assert len(lines(journal_path)) == 3 # Two orders and the failed mark
+    journal.close()
+
+    journal = open_journal(journal_path)
+    assert journal.counts() == (1, 1)
+    assert [(status, r['key']) for status, r in journal.backlog()] == [('pending', pending),
+                                                                        ('failed', failed)]
+    journal.close()
+
+
+def test_a_journal_can_only_be_open_once(journal_path):
+    journal = open_journal(journal_path)
+    with pytest.raises(OSError, match="--till"):
+        open_journal(journal_path)
+    journal.close()
+    open_journal(journal_path).close()
+
+
+def test_fsync_mode_is_checked(journal_path):
+    with pytest.raises(ValueError):
+        OrderJournal(journal_path, fsync='sometimes')
+
+
+def test_tills_get_their_own_journals():
+    assert till_journal_path('till 1') != till_journal_path('till 2')
+    assert till_journal_path('../bar').endswith('.._bar.journal')
+
+
+# --- REPLAY ---
+# Every replay test runs with and without the group committer
+with_group_commit = pytest.mark.parametrize('db', [False, True], indirect=True,
+                                            ids=['direct', 'group-commit'])
+
+
+@with_group_commit
+def test_keyed_orders_are_saved_once(db, user_id):
+    orders = [(user_id, Decimal('22.50'), ITEMS), (user_id, Decimal('2.50'), ITEMS[1:])]
+    first = db.save_keyed_orders(orders, ['a', 'b'])
+    assert all(first)
+    assert db.save_keyed_orders(orders, ['a', 'b']) == first
+    assert db.save_keyed_orders(orders[1:], ['b']) == first[1:]
+    assert count_orders(db) == 2
+    lines_saved = db.fetch_query("SELECT COUNT(*) AS n FROM order_items")[0]['n']
+    assert lines_saved == 3
+
+
+@with_group_commit
+def test_keyed_orders_raise_while_the_database_is_down(db, user_id):
+    def down(work, write=True):
+        raise db.backend.Error("database is down")
+
+    db.backend.run = down
+    with pytest.raises(db.backend.Error):
+        db.save_keyed_orders([(user_id, Decimal('2.50'), ITEMS[1:])], ['a'])
+
+
+@with_group_commit
+def test_replayer_saves_journaled_orders(db, user_id, journal_path):
+    journal = open_journal(journal_path)
+    for _ in range(5):
+        journal.append(user_id, Decimal('22.50'), ITEMS)
+    replayer = JournalReplayer(journal, db, batch_size=2, interval=0.01)
+    try:
+        wait_until(lambda: journal.counts() == (0, 0))
+    finally:
+        replayer.close()
+        journal.close()
+    assert count_orders(db) == 5
+    totals = db.fetch_query("SELECT total_amount FROM orders")
+    assert {Decimal(str(row['total_amount'])) for row in totals} == {Decimal('22.50')}
+
+
+@with_group_commit
+def test_replay_after_a_crash_does_not_duplicate(db, user_id, journal_path):
+    journal = open_journal(journal_path)
+    committed = journal.append(user_id, Decimal('22.50'), ITEMS)
+    journal.append(user_id, Decimal('2.50'), ITEMS[1:])
+    # The till committed the first order, then died before journaling 'saved'
+    [(key, order)] = journal.next_batch(1)
+    [order_id] = db.save_keyed_orders([order], [key])
+    journal.close()
+
+    journal = open_journal(journal_path)
+    assert journal.counts() == (2, 0)
+    replayer = JournalReplayer(journal, db, interval=0.01)
+    try:
+        wait_until(lambda: journal.counts() == (0, 0))
+    finally:
+        replayer.close()
+        journal.close()
+    assert count_orders(db) == 2
+    assert db.fetch_query("SELECT order_id FROM orders WHERE order_key = %s",
+                          (committed,)) == [{'order_id': order_id}]
+
+
+@with_group_commit
+def test_replayer_waits_out_an_outage(db, user_id, journal_path):
+    journal = open_journal(journal_path)
+    journal.append(user_id, Decimal('22.50'), ITEMS)
+    save = db.save_keyed_orders
+    calls = []
+
+    def flaky(orders, keys):
+        calls.append(keys)
+        if len(calls) == 1:
+            raise db.backend.Error("database is down")
+        return save(orders, keys)
+
+    db.save_keyed_orders = flaky
+    replayer = JournalReplayer(journal, db, interval=0.01)
+    try:
+        wait_until(lambda: journal.counts() == (0, 0))
+    finally:
+        replayer.close()
+        journal.close()
+    assert len(calls) == 2 and calls[0] == calls[1]
+    assert replayer.last_error is None
+    assert count_orders(db) == 1
@@ -0,0 +1,104 @@
+from database import MenuSearchIndex
+
+
+# --- MENU CACHE ---
+def listen(db):
+    changes = []
+    db.menu_cache.add_listener(lambda rows, removed, full: changes.append(
+        (sorted(row['name'] for row in rows), sorted(removed), full)))
+    return changes
+
+
+def test_menu_cache_reloads_only_what_changed(db):
+    changes = listen(db)
+    assert [row['name'] for row in db.get_menu_items()] == ['Burger', 'Soda']
+    assert changes == [(['Burger', 'Soda'], [], True)]
+
+    db.get_menu_items()
+    assert len(changes) == 1 # Same catalog version: nothing reloaded
+
+    db.execute_query("INSERT INTO menu_items (name, price, category) VALUES ('Pie', 4.99, 'mains')")
+    db.update_menu_item_price(2, '2.75')
+    items = db.get_menu_items()
+    assert changes[-1] == (['Pie', 'Soda'], [], False)
+    assert [(row['name'], row['price']) for row in items] == [('Burger', 10), ('Soda', 2.75),
+                                                              ('Pie', 4.99)]
+
+    db.execute_query("DELETE FROM menu_items WHERE item_id = 1")
+    assert [row['name'] for row in db.get_menu_items()] == ['Soda', 'Pie']
+    assert changes[-1] == (['Pie', 'Soda'], [], True) # A deletion reloads the lot
+
+
+def test_invalidate_reloads_an_item_the_version_missed(db):
+    db.get_menu_items()
+    # An edit that slipped past the catalog version triggers
+    db.execute_query("UPDATE menu_items SET price = 11, row_version = -1 WHERE item_id = 1")
+    assert db.get_menu_items()[0]['price'] == 10
+    db.menu_cache.invalidate(1)
+    assert db.get_menu_items()[0]['price'] == 11
+
+
+def test_invalidate_everything_reloads_the_whole_menu(db):
+    changes = listen(db)
+    db.get_menu_items()
+    db.menu_cache.invalidate()
+    db.get_menu_items()
+    assert [full for _, _, full in changes] == [True, True]
+
+
+# --- MENU SEARCH ---
+MENU = [{'item_id': 1, 'name': 'Cheese Burger', 'description': 'Beef, cheddar', 'category': 'mains'},
+        {'item_id': 2, 'name': 'Cherry Soda', 'description': None, 'category': 'drinks'},
+        {'item_id': 3, 'name': 'Chicken Burger', 'description': 'Crispy chicken', 'category': 'mains'}]
+
+
+def test_search_matches_word_prefixes_of_every_term():
+    index = MenuSearchIndex()
+    index.apply(MENU, full=True)
+    assert index.search("ch") == {1, 2, 3}
+    assert index.search("chee") == {1}
+    assert index.search("burger CHIC") == {3}
+    assert index.search("main") == {1, 3}
+    assert index.search("burger soda") == set()
+    assert index.search("  ,") is None
+    assert [row['name'] for row in index.rows({3, 1, 9})] == ['Cheese Burger', 'Chicken Burger']
+
+
+def test_search_follows_incremental_changes():
+    index = MenuSearchIndex()
+    index.apply(MENU, full=True)
+    version = index.version
+    index.apply([dict(MENU[1], name='Cola', category='drinks')], removed_ids=[3])
+    assert index.version > version
+    assert index.search("cherry") == set()
+    assert index.search("cola") == {2}
+    assert index.search("chicken") == set()
+    assert index.search("burger") == {1}
+    assert len(index) == 2
+    index.apply([{'item_id': 4, 'name': 'Chickpea Salad', 'category': 'sides'}])
+    assert index.search("chick") == {4}
+
+
+def test_search_sees_menu_edits_through_the_cache(db):
+    db.get_menu_items()
+    assert db.search_menu("burg") == {1}
+    db.execute_query("UPDATE menu_items SET name = 'Veggie Burger' WHERE item_id = 2")
+    db.get_menu_items()
+    assert db.search_menu("burg") == {1, 2}
+    assert db.search_menu("soda") == set()
+
+
+# --- MENU PAGES ---
+def test_menu_pages_by_category_and_item_id(db):
+    for name in ('Pie', 'Pasta', 'Steak'):
+        db.execute_query("INSERT INTO menu_items (name, price, category) VALUES (%s, 9, 'mains')",
+                         (name,))
+    db.execute_query("INSERT INTO menu_items (name, price) VALUES ('Mystery', 1)")
+    assert db.get_menu_categories() == ['drinks', 'mains', None]
+
+    first = db.get_menu_page('mains', limit=2)
+    assert [row['name'] for row in first] == ['Burger', 'Pie']
+    second = db.get_menu_page('mains', after_id=first[-1]['item_id'], limit=2)
+    assert [row['name'] for row in second] == ['Pasta', 'Steak']
+    assert db.get_menu_page('mains', after_id=second[-1]['item_id'], limit=2) == []
+    assert [row['name'] for row in db.get_menu_page(None)] == ['Mystery']
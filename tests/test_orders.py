@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+import pytest
+
+ITEMS = [{'item_id': 1, 'quantity': 2, 'price': Decimal('10.00')},
+         {'item_id': 2, 'quantity': 1, 'price': Decimal('2.50')}]
+
+
+def count(db, table):
+    return db.fetch_query(f"SELECT COUNT(*) AS n FROM {table}")[0]['n']
+
+
+# --- GROUP COMMIT ---
+def test_a_bad_order_does_not_roll_back_its_group(db, user_id):
+    orders = [(user_id, Decimal('22.50'), ITEMS),
+              (user_id, None, ITEMS),           # NOT NULL total_amount
+              (user_id, Decimal('2.50'), ITEMS[1:])]
+    good, bad, last = db.backend.create_order_group(orders)
+    assert bad is False and good and last
+    assert count(db, 'orders') == 2
+    assert count(db, 'order_items') == 3
+
+
+@pytest.mark.parametrize('db', [True], indirect=True)
+def test_group_committer_answers_each_order(db, user_id):
+    futures = [db.order_committer.submit(user_id, total, ITEMS)
+               for total in (Decimal('22.50'), None, Decimal('22.50'), Decimal('22.50'))]
+    results = [future.result(5) for future in futures]
+    assert results[1] is False
+    assert all(results[:1] + results[2:]) and len(set(results)) == 4
+    assert count(db, 'orders') == 3
+
+
+# --- BULK ORDERS ---
+def bulk_order(user_id, quantity, item_id=1):
+    return (user_id, Decimal('10.00') * quantity,
+            [{'item_id': item_id, 'quantity': quantity, 'price': Decimal('10.00')}])
+
+
+def saved_orders(db):
+    rows = db.fetch_query("SELECT o.total_amount, oi.quantity FROM orders o "
+                          "JOIN order_items oi ON oi.order_id = o.order_id ORDER BY o.order_id")
+    return [(Decimal(str(row['total_amount'])), row['quantity']) for row in rows]
+
+
+def test_create_orders_maps_lines_to_their_orders(db, user_id):
+    orders = (bulk_order(user_id, quantity) for quantity in range(1, 6))
+    assert db.create_orders(orders, chunk_size=2) == (5, 0)
+    assert saved_orders(db) == [(Decimal(10 * q), q) for q in range(1, 6)]
+
+
+def test_a_failed_chunk_is_saved_order_by_order(db, user_id, capsys):
+    orders = [bulk_order(user_id, 1), bulk_order(user_id, 2, item_id=999), bulk_order(user_id, 3),
+              bulk_order(user_id, 4)]
+    assert db.create_orders(orders, chunk_size=3) == (3, 1)
+    assert "saving this chunk order by order" in capsys.readouterr().out
+    assert saved_orders(db) == [(Decimal(10), 1), (Decimal(30), 3), (Decimal(40), 4)]
@@ -0,0 +1,63 @@
+import threading
+from decimal import Decimal
+
+from conftest import add_menu_item
+
+
+def order(db, user_id, *item_ids):
+    items = [{'item_id': item_id, 'quantity': 1, 'price': Decimal('1.00')} for item_id in item_ids]
+    return db.create_order(user_id, Decimal(len(items)), items)
+
+
+def test_suggestions_follow_saved_orders(db, user_id):
+    pie = add_menu_item(db, 'Pie', '4.00', 'desserts')
+    assert db.suggest_items([1]) == []
+    order(db, user_id, 1, 2)
+    order(db, user_id, 1, 2, pie)
+    order(db, user_id, 1, pie)
+    order(db, user_id, 1, 2)
+    assert db.pair_index.suggest([1]) == [2, pie]
+    assert db.pair_index.suggest([1], limit=1) == [2]
+    assert db.pair_index.suggest([1, 2]) == [pie] # Never one of the items asked about
+    assert [row['name'] for row in db.suggest_items([pie])] == ['Burger', 'Soda']
+
+
+def test_rebuild_recounts_every_order(db, user_id):
+    order(db, user_id, 1, 2)
+    order(db, user_id, 1, 2)
+    db.execute_query("UPDATE item_pairs SET order_count = 100 WHERE item_id = 2")
+    db.execute_query("DELETE FROM item_pairs WHERE item_id = 1")
+    progress = []
+    assert db.rebuild_item_pairs(chunk_size=1, progress=lambda *done: progress.append(done)) == 2
+    assert progress == [(1, 2), (2, 2)]
+    assert sorted((row['item_id'], row['other_id'], row['order_count'])
+                  for row in db.fetch_query("SELECT * FROM item_pairs")) == [(1, 2, 2), (2, 1, 2)]
+    assert db.pair_index.suggest([1]) == [2] # The index re-reads the rebuilt table
+
+
+def test_lookups_dont_wait_for_a_refresh(db, user_id, monkeypatch):
+    order(db, user_id, 1, 2)
+    index = db.pair_index
+    assert index.suggest([1]) == [2]
+    pie = add_menu_item(db, 'Pie', '4.00', 'desserts')
+    order(db, user_id, 1, pie)
+    started, release = threading.Event(), threading.Event()
+    run = index.backend.run
+
+    def slow_run(work, **kwargs):
+        started.set()
+        release.wait(5)
+        return run(work, **kwargs)
+
+    monkeypatch.setattr(index.backend, 'run', slow_run)
+    refresher = threading.Thread(target=index.suggest, args=([1],))
+    refresher.start()
+    try:
+        assert started.wait(5)
+        assert index.suggest([1]) == [2] # Served from the current lists meanwhile
+        index.invalidate()
+    finally:
+        release.set()
+        refresher.join()
+    assert index._seen_to is None # The invalidation outlived the refresh
+    assert index.suggest([1]) == [2, pie]
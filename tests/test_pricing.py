@@ -0,0 +1,160 @@
+import random
+from datetime import datetime
+from decimal import Decimal
+
+from cart import Cart, CartPricer, PricedTotals, PricingEngine, percent_of
+
+BURGER = {'item_id': 1, 'name': 'Burger', 'category': 'mains', 'price': Decimal('10.00')}
+SODA = {'item_id': 2, 'name': 'Soda', 'category': 'drinks', 'price': 2.5}
+FRIES = {'item_id': 3, 'name': 'Fries', 'category': 'sides', 'price': '3.35'}
+
+MONDAY = datetime(2026, 10, 12, 12, 0)
+SATURDAY = datetime(2026, 10, 17, 12, 0)
+
+
+def rule(rule_id, kind, value, **fields):
+    return dict({'rule_id': rule_id, 'name': f"rule {rule_id}", 'kind': kind, 'value': value},
+                **fields)
+
+
+def priced(rules, *lines, now=MONDAY):
+    cart = Cart()
+    pricer = CartPricer(cart, PricingEngine(rules))
+    for item, quantity in lines:
+        cart.add(item, quantity)
+    return pricer.totals(now)
+
+
+# --- RULES ---
+def test_percent_of_rounds_half_up():
+    assert percent_of(1050, 1000) == 105
+    assert percent_of(5, 1000) == 1   # 0.5 cent rounds up
+    assert percent_of(4, 1000) == 0   # 0.4 cent rounds down
+    assert percent_of(335, 825) == 28 # 27.6375 cents
+
+
+def test_no_rules_prices_at_the_subtotal():
+    assert priced([], (BURGER, 2), (SODA, 1)) == PricedTotals(2250, 0, 0, 2250)
+
+
+def test_only_the_best_discount_applies():
+    rules = [rule(1, 'percent', 10, category='mains'), rule(2, 'amount', '1.50', item_id=1)]
+    # 10% of 20.00 is 2.00; 1.50 a unit is 3.00, which wins instead of stacking
+    assert priced(rules, (BURGER, 2)) == PricedTotals(2000, 300, 0, 1700)
+    assert priced(rules, (BURGER, 2), (SODA, 1)).discount == 300
+
+
+def test_tax_is_charged_after_the_discount_and_rates_add_up():
+    rules = [rule(1, 'amount', '1.50', item_id=1), rule(2, 'tax', 8),
+             rule(3, 'tax', '2.5', category='drinks')]
+    totals = priced(rules, (BURGER, 2), (SODA, 3))
+    # Burgers: 8% of 17.00 = 1.36; sodas: 10.5% of 7.50 = 0.7875 -> 0.79
+    assert totals == PricedTotals(2750, 300, 136 + 79, 2750 - 300 + 215)
+
+
+def test_amount_discount_is_capped_at_the_price():
+    rules = [rule(1, 'amount', 5, item_id=2)]
+    assert priced(rules, (SODA, 2), (BURGER, 1)) == PricedTotals(1500, 500, 0, 1000)
+
+
+def test_order_discount_never_takes_the_total_below_zero():
+    rules = [rule(1, 'amount', '5.00')]
+    assert priced(rules, (BURGER, 1)) == PricedTotals(1000, 500, 0, 500)
+    assert priced(rules, (SODA, 1)) == PricedTotals(250, 250, 0, 0)
+    assert priced(rules) == PricedTotals(0, 0, 0, 0)
+
+
+def test_combo_counts_complete_sets():
+    rules = [rule(1, 'combo', '1.00', combo_items='1,2')]
+    assert priced(rules, (BURGER, 3), (SODA, 2)).discount == 200
+    assert priced(rules, (BURGER, 3)).discount == 0
+
+
+def test_combo_follows_cart_edits():
+    cart = Cart()
+    pricer = CartPricer(cart, PricingEngine([rule(1, 'combo', '1.00', combo_items='1, 2')]))
+    cart.add(BURGER, 2)
+    assert pricer.totals(MONDAY).discount == 0
+    cart.add(SODA, 1)
+    assert pricer.totals(MONDAY).discount == 100
+    cart.set_quantity(2, 5)
+    assert pricer.totals(MONDAY).discount == 200
+    cart.remove(1)
+    assert pricer.totals(MONDAY).discount == 0
+
+
+def test_bad_rules_are_skipped():
+    engine = PricingEngine([rule(1, 'bogus', 5), {'rule_id': 2}, rule(3, 'percent', 10)])
+    assert [r.rule_id for r in engine.rules] == [3]
+
+
+# --- TIME WINDOWS ---
+def test_window_applies_only_inside_it():
+    rules = [rule(1, 'percent', 50, category='drinks', starts_at='17:00', ends_at='19:00')]
+    assert priced(rules, (SODA, 2), now=MONDAY.replace(hour=16, minute=59)).discount == 0
+    assert priced(rules, (SODA, 2), now=MONDAY.replace(hour=17)).discount == 250
+    assert priced(rules, (SODA, 2), now=MONDAY.replace(hour=18, minute=59)).discount == 250
+    assert priced(rules, (SODA, 2), now=MONDAY.replace(hour=19)).discount == 0
+
+
+def test_window_may_cross_midnight():
+    rules = [rule(1, 'percent', 50, starts_at='22:00', ends_at='02:00:00')]
+    for hour, discount in ((21, 0), (22, 500), (23, 500), (0, 500), (1, 500), (2, 0), (12, 0)):
+        assert priced(rules, (BURGER, 1), now=MONDAY.replace(hour=hour)).discount == discount, hour
+
+
+def test_days_limit_a_rule():
+    rules = [rule(1, 'percent', 10, days='56')] # Weekends
+    assert priced(rules, (BURGER, 1), now=MONDAY).discount == 0
+    assert priced(rules, (BURGER, 1), now=SATURDAY).discount == 100
+
+
+def test_plan_lasts_until_the_next_window_edge():
+    engine = PricingEngine([rule(1, 'percent', 50, starts_at='17:00', ends_at='19:00')])
+    morning = engine.plan(MONDAY)
+    assert morning.expires == MONDAY.replace(hour=17)
+    assert engine.plan(MONDAY.replace(hour=16, minute=59)) is morning
+    happy_hour = engine.plan(MONDAY.replace(hour=17))
+    assert happy_hour is not morning and happy_hour.everywhere
+    assert happy_hour.expires == MONDAY.replace(hour=19)
+    evening = engine.plan(MONDAY.replace(hour=19))
+    assert not evening.everywhere
+    assert evening.expires == datetime(2026, 10, 13, 0, 0)
+
+
+def test_pricer_reprices_when_the_plan_changes():
+    cart = Cart()
+    pricer = CartPricer(cart, PricingEngine([rule(1, 'percent', 50, starts_at='17:00',
+                                                  ends_at='19:00')]))
+    cart.add(BURGER, 1)
+    assert pricer.totals(MONDAY.replace(hour=16)).total == 1000
+    assert pricer.totals(MONDAY.replace(hour=17, minute=30)).total == 500
+    assert pricer.totals(MONDAY.replace(hour=20)).total == 1000
+
+
+# --- INCREMENTAL PRICING ---
+def test_incremental_totals_match_a_full_reprice():
+    rules = [rule(1, 'percent', 10, category='mains'), rule(2, 'amount', '0.75', item_id=3),
+             rule(3, 'percent', '12.5', item_id=3), rule(4, 'tax', '8.25'),
+             rule(5, 'tax', 2, category='drinks'), rule(6, 'combo', '1.20', combo_items='1,3'),
+             rule(7, 'combo', '0.40', combo_items='2,3'), rule(8, 'amount', '0.30')]
+    engine = PricingEngine(rules)
+    menu = [BURGER, SODA, FRIES,
+            {'item_id': 4, 'name': 'Pie', 'category': 'mains', 'price': '4.99'}]
+    cart = Cart()
+    pricer = CartPricer(cart, engine)
+    rng = random.Random(7)
+    for _ in range(300):
+        item = rng.choice(menu)
+        action = rng.random()
+        if action < 0.5:
+            cart.add(item, rng.randint(1, 3))
+        elif action < 0.8:
+            cart.set_quantity(item['item_id'], rng.randint(0, 4))
+        elif action < 0.97:
+            cart.remove(item['item_id'])
+        else:
+            cart.clear()
+        fresh = CartPricer(cart, engine)
+        cart.remove_listener(fresh.on_cart_change)
+        assert pricer.totals() == fresh.totals()
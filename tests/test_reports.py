@@ -0,0 +1,123 @@
+import os
+from decimal import Decimal
+
+import pytest
+
+from reports import (PERIOD_MEASURES, PERIOD_REPORTS, SALES_LINE_COLUMNS, ColumnarReports,
+                     ParallelReportRunner)
+
+pytest.importorskip('numpy') # Optional: only the reports need it
+
+
+@pytest.fixture
+def sales(db, user_id):
+    """Two orders: 2 burgers and a soda, then 3 sodas. Burgers cost 4.00."""
+    db.execute_query("UPDATE menu_items SET cost = 4 WHERE item_id = 1")
+    db.create_order(user_id, Decimal('22.50'),
+                    [{'item_id': 1, 'quantity': 2, 'price': Decimal('10.00')},
+                     {'item_id': 2, 'quantity': 1, 'price': Decimal('2.50')}])
+    db.create_order(user_id, Decimal('7.50'), [{'item_id': 2, 'quantity': 3, 'price': Decimal('2.50')}])
+    return db
+
+
+def line_ids(lines):
+    return lines['order_item_id'].tolist()
+
+
+# --- COLUMNAR REPORTS ---
+def test_item_margins(sales):
+    reports = ColumnarReports(sales)
+    margins = reports.item_margins(reports.columns())
+    assert [(row['name'], row['quantity'], row['revenue_cents'], row['cost_cents'],
+             row['margin_cents'], row['margin_pct']) for row in margins] == [
+        ('Burger', 2, 2000, 800, 1200, 60.0),
+        ('Soda', 4, 1000, None, None, None), # No cost: sorted last
+    ]
+
+
+def test_basket_sizes_and_heatmap(sales):
+    reports = ColumnarReports(sales)
+    lines = reports.columns()
+    baskets = reports.basket_sizes(lines, percentiles=(50,))
+    assert (baskets['orders'], baskets['mean_items'], baskets['histogram']) == (2, 3.0, [(3, 2)])
+    assert baskets['value_percentiles'] == {50: 1500}
+    heatmap = reports.heatmap(lines)
+    assert (heatmap['orders'].sum(), heatmap['quantity'].sum(), heatmap['revenue_cents'].sum()) == \
+        (2, 6, 3000)
+
+
+def test_cache_is_topped_up_with_new_lines(sales, user_id, tmp_path):
+    reports = ColumnarReports(sales, cache_dir=str(tmp_path / 'cache'), reread_lines=1)
+    assert line_ids(reports.columns()) == [1, 2, 3]
+    sales.create_order(user_id, Decimal('10.00'), [{'item_id': 1, 'quantity': 1, 'price': 10}])
+
+    again = ColumnarReports(sales, cache_dir=str(tmp_path / 'cache'), reread_lines=1)
+    assert line_ids(again.columns(refresh=False)) == [1, 2, 3] # Cached, no database read
+    assert line_ids(again.columns()) == [1, 2, 3, 4]
+    [cache] = os.listdir(tmp_path / 'cache')
+    files = os.listdir(tmp_path / 'cache' / cache)
+    # One set of arrays: those written before the top-up are removed
+    assert len([name for name in files if name.endswith('.npy')]) == len(SALES_LINE_COLUMNS)
+
+
+def test_late_lines_are_picked_up(sales, tmp_path):
+    late = sales.fetch_query("SELECT * FROM order_items WHERE order_item_id = 2")[0]
+    sales.execute_query("DELETE FROM order_items WHERE order_item_id = 2") # Not committed yet
+    assert line_ids(ColumnarReports(sales, cache_dir=str(tmp_path / 'cache')).columns()) == [1, 3]
+    sales.execute_query("INSERT INTO order_items (order_item_id, order_id, item_id, quantity, "
+                        "price_per_item) VALUES (%s, %s, %s, %s, %s)",
+                        (2, late['order_id'], late['item_id'], late['quantity'], late['price_per_item']))
+
+    outside = ColumnarReports(sales, cache_dir=str(tmp_path / 'cache'), reread_lines=0)
+    assert line_ids(outside.columns()) == [1, 3] # Older than the re-read window
+    inside = ColumnarReports(sales, cache_dir=str(tmp_path / 'cache'), reread_lines=2)
+    assert line_ids(inside.columns()) == [1, 2, 3]
+
+
+def test_old_cache_is_reloaded_in_full(sales, tmp_path):
+    late = sales.fetch_query("SELECT * FROM order_items WHERE order_item_id = 1")[0]
+    sales.execute_query("DELETE FROM order_items WHERE order_item_id = 1")
+    assert line_ids(ColumnarReports(sales, cache_dir=str(tmp_path / 'cache')).columns()) == [2, 3]
+    sales.execute_query("INSERT INTO order_items (order_item_id, order_id, item_id, quantity, "
+                        "price_per_item) VALUES (%s, %s, %s, %s, %s)",
+                        (1, late['order_id'], late['item_id'], late['quantity'], late['price_per_item']))
+    stale = ColumnarReports(sales, cache_dir=str(tmp_path / 'cache'), reread_lines=0, reload_seconds=0)
+    assert line_ids(stale.columns()) == [1, 2, 3]
+
+
+# --- PARALLEL PERIOD REPORTS ---
+@pytest.fixture
+def spread_sales(sales, user_id):
+    """sales plus a few more orders, moved out over ten days of October."""
+    for quantity in range(1, 5):
+        sales.create_order(user_id, Decimal('10.00') * quantity,
+                           [{'item_id': 1, 'quantity': quantity, 'price': Decimal('10.00')}])
+    for order_id, day in zip(range(1, 7), (1, 1, 3, 4, 8, 10)):
+        sales.execute_query("UPDATE orders SET order_date = %s WHERE order_id = %s",
+                            (f"2026-10-{day:02d} {9 + order_id}:30:00", order_id))
+    return sales
+
+
+@pytest.mark.parametrize('report', sorted(PERIOD_REPORTS))
+def test_sharded_report_matches_a_serial_run(spread_sales, report):
+    progress = []
+    sharded = ParallelReportRunner(spread_sales, workers=2, shard_days=2,
+                                   progress=lambda done, total: progress.append((done, total)))
+    serial = ParallelReportRunner(spread_sales, workers=1, shard_days=365)
+    columns, rows = sharded.run(report)
+    assert (columns, rows) == serial.run(report)
+    assert len(progress) == len(sharded.shards()) > 1
+    assert progress[-1] == (len(progress), len(progress))
+    # Orders aren't summed: 'items' counts an order once per item in it
+    assert [sum(row[index] for row in rows) for index in (-2, -1)] == [16, 13000]
+
+
+def test_items_report_adds_up_across_shards(spread_sales):
+    columns, rows = ParallelReportRunner(spread_sales, workers=2, shard_days=1).run('items')
+    assert columns == ('item_id', 'orders', 'quantity', 'revenue_cents')
+    assert rows == [(1, 5, 12, 12000), (2, 2, 4, 1000)]
+
+
+def test_no_orders_no_shards(db):
+    assert ParallelReportRunner(db).run('daily') == (('sale_date',) + PERIOD_MEASURES, [])
+
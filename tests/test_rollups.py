@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+ITEMS = [{'item_id': 1, 'quantity': 2, 'price': Decimal('10.00')},
+         {'item_id': 2, 'quantity': 1, 'price': Decimal('2.50')}]
+
+
+def totals(db):
+    row = db.get_sales_report(days=1)['totals']
+    return int(row['order_count']), int(row['quantity']), int(row['net_cents'])
+
+
+# --- SALES ROLLUPS ---
+def test_orders_are_rolled_up_as_they_are_saved(db, user_id):
+    db.create_order(user_id, Decimal('22.50'), ITEMS)
+    db.create_orders([(user_id, Decimal('2.50'), ITEMS[1:])] * 2)
+    assert totals(db) == (3, 5, 2750)
+    report = db.get_sales_report()
+    assert [(row['category'], int(row['revenue_cents'])) for row in report['categories']] == \
+        [('mains', 2000), ('drinks', 750)]
+    assert sum(int(row['order_count']) for row in report['hours']) == 3
+    assert [(row['name'], int(row['quantity'])) for row in report['items']] == [('Burger', 2),
+                                                                               ('Soda', 3)]
+    assert report['history_pending'] == 0
+
+
+def test_rollups_commit_or_roll_back_with_their_order(db, user_id):
+    def fail(cursor, where, params):
+        raise db.backend.Error("disk full")
+
+    db.backend.count_item_pairs = fail # Runs after the rollups, in the same transaction
+    assert db.create_order(user_id, Decimal('22.50'), ITEMS) is False
+    assert db.fetch_query("SELECT COUNT(*) AS n FROM sales_daily")[0]['n'] == 0
+    assert db.fetch_query("SELECT COUNT(*) AS n FROM orders")[0]['n'] == 0
+
+
+def test_catch_up_rolls_up_old_orders_once(db, user_id):
+    # Orders written behind the rollups' back, as before the tables existed
+    for _ in range(5):
+        db.execute_query("INSERT INTO orders (user_id, total_amount) VALUES (%s, 12.50)", (user_id,))
+    db.execute_query("INSERT INTO order_items (order_id, item_id, quantity, price_per_item) "
+                     "SELECT order_id, 2, 5, 2.50 FROM orders")
+    db.execute_query("UPDATE sales_rollup_state SET history_to = 5, rolled_up_to = 1 WHERE id = 1")
+    assert db.get_sales_report()['history_pending'] == 4
+
+    progress = []
+    assert db.catch_up_rollups(chunk_size=3, progress=lambda *p: progress.append(p)) == 4
+    assert progress == [(4, 5), (5, 5)]
+    assert totals(db) == (4, 20, 5000) # Order 1 was below the watermark already
+    assert db.catch_up_rollups() == 0
+    assert totals(db) == (4, 20, 5000)
+    assert db.get_sales_report()['history_pending'] == 0
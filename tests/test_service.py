@@ -0,0 +1,87 @@
+import asyncio
+import socket
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+from service import OrderService, ServiceClient, ServiceError
+
+
+@pytest.fixture
+def client(db):
+    """A ServiceClient talking to an OrderService over `db` on a free local port."""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    service = OrderService(db, '127.0.0.1', port, workers=4)
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(service.serve_forever())
+    thread = threading.Thread(target=lambda: loop.run_until_complete(asyncio.wait([task])),
+                              daemon=True)
+    thread.start()
+    client = ServiceClient('127.0.0.1', port, timeout=5.0)
+    deadline = time.monotonic() + 5.0
+    while True:
+        try:
+            client.health_stats()
+            break
+        except ServiceError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.02)
+    yield client
+    client.close()
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join()
+    loop.close()
+
+
+def test_service_round_trip(client, db, user_id):
+    assert [row['name'] for row in client.get_menu_items()] == ['Burger', 'Soda']
+    assert client.search_menu("bur") == {1}
+    assert client.validate_user('ann', 'secret')
+    items = [{'item_id': 1, 'quantity': 2, 'price': Decimal('10.10')}]
+    order_id = client.create_order(user_id, Decimal('20.20'), items)
+    row = db.fetch_query("SELECT total_amount FROM orders WHERE order_id = %s", (order_id,))[0]
+    assert Decimal(str(row['total_amount'])) == Decimal('20.20')
+    assert client.save_keyed_orders([[user_id, '20.20', items]], ['k']) == \
+        client.save_keyed_orders([[user_id, '20.20', items]], ['k'])
+
+
+def test_unknown_operations_are_refused(client):
+    with pytest.raises(ServiceError, match="unknown operation"):
+        client.call('execute_query', "DELETE FROM users")
+    assert client.get_menu_categories() == ['drinks', 'mains']
+
+
+def test_replies_are_matched_to_pipelined_requests(client, db):
+    release = threading.Event()
+    categories = db.get_menu_categories
+    db.get_menu_categories = lambda: release.wait(5) and categories()
+    slow = []
+    waiting = threading.Thread(target=lambda: slow.append(client.get_menu_categories()))
+    waiting.start()
+    # Answered while the slow request is still outstanding on the same connection
+    pages = [client.get_menu_page(category) for category in ('mains', 'drinks')]
+    assert [[row['name'] for row in page] for page in pages] == [['Burger'], ['Soda']]
+    assert not slow
+    release.set()
+    waiting.join()
+    assert slow == [['drinks', 'mains']]
+
+
+class BrokenSocket:
+    def sendall(self, data):
+        raise OSError("connection reset")
+
+    def shutdown(self, how):
+        raise OSError("not connected")
+
+
+def test_a_failed_send_raises_service_error():
+    client = ServiceClient('127.0.0.1', 9)
+    client._sock = BrokenSocket()
+    with pytest.raises(ServiceError, match="lost the order service connection"):
+        client.call('health_stats')
@@ -0,0 +1,187 @@
+import threading
+
+import pytest
+
+from database import (MIGRATIONS, ConnectionPool, DatabaseManager, MySQLStatementCursor, PoolStats,
+                      PoolTimeoutError)
+
+
+class FakeConnection:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+# --- CONNECTION POOL ---
+def test_pool_times_out_when_every_connection_is_leased():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+    held = pool.checkout()
+    with pytest.raises(PoolTimeoutError):
+        pool.checkout()
+    pool.checkin(held)
+    assert pool.checkout() is held
+
+
+def test_pool_hands_a_returned_connection_to_a_waiting_thread():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=5.0)
+    held = pool.checkout()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout()))
+    waiter.start()
+    pool.checkin(held)
+    waiter.join()
+    assert got == [held]
+
+
+def test_nested_leases_share_a_connection():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+    with pool.lease() as outer:
+        with pool.lease() as inner:
+            assert inner is outer
+    with pool.lease() as again:
+        assert again is outer
+
+
+def test_a_discarded_connection_frees_its_slot():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+    broken = pool.checkout()
+    pool.checkin(broken, discard=True)
+    assert broken.closed
+    assert pool.checkout() is not broken
+
+
+# --- CONNECTION HEALTH ---
+def test_recently_used_connections_are_not_probed():
+    probes = []
+    pool = ConnectionPool(FakeConnection, size=1, validate=probes.append, idle_check_after=60.0)
+    pool.checkin(pool.checkout())
+    pool.checkin(pool.checkout())
+    assert probes == []
+    assert pool.stats.snapshot() == {'checkouts': 2, 'probes_run': 0, 'probes_skipped': 1,
+                                     'reconnects': 0}
+
+
+def test_a_dead_idle_connection_is_replaced():
+    pool = ConnectionPool(FakeConnection, size=1, validate=lambda connection: False,
+                          idle_check_after=0.0)
+    dead = pool.checkout()
+    pool.checkin(dead)
+    fresh = pool.checkout()
+    assert fresh is not dead and dead.closed
+    stats = pool.stats.snapshot()
+    assert (stats['probes_run'], stats['reconnects']) == (1, 1)
+
+
+def test_idle_connections_are_probed_after_another_one_dies():
+    probes = []
+    pool = ConnectionPool(FakeConnection, size=2, validate=lambda c: probes.append(c) or True,
+                          idle_check_after=60.0)
+    idle, broken = pool.checkout(), pool.checkout()
+    pool.checkin(idle)
+    pool.checkin(broken, discard=True)
+    assert pool.checkout() is idle
+    assert probes == [idle]
+    assert pool.stats.snapshot()['reconnects'] == 1
+
+
+def test_close_returns_the_health_stats_quietly(tmp_path, capsys):
+    manager = DatabaseManager({'path': str(tmp_path / 'restaurant.db')}, backend='sqlite')
+    manager.get_menu_categories()
+    capsys.readouterr()
+    stats = manager.close()
+    assert stats['checkouts'] >= 1 and set(stats) == set(PoolStats.FIELDS)
+    assert capsys.readouterr().out == ''
+
+
+# --- PREPARED STATEMENTS ---
+class FakeMySQLConnection:
+    """Just enough of a mysql.connector connection for MySQLStatementCursor."""
+    def __init__(self):
+        self.unread_result = False
+
+    def cursor(self, **options):
+        return FakeUnbufferedCursor(self)
+
+
+class FakeUnbufferedCursor:
+    column_names = ('order_id',)
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, params=()):
+        if self.connection.unread_result:
+            raise RuntimeError("Unread result found")
+        self.rows = [(7,), (8,)]
+        self.connection.unread_result = True
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        self.connection.unread_result = False
+        return rows
+
+
+def test_fetchone_leaves_the_connection_ready_for_the_next_statement():
+    cursor = MySQLStatementCursor(FakeMySQLConnection(), {})
+    cursor.execute_named('order_by_key', ('abc',))
+    assert cursor.fetchone() == {'order_id': 7}
+    cursor.execute("SAVEPOINT order_1")
+
+
+# --- SCHEMA MIGRATIONS ---
+def recorded_versions(db):
+    rows = db.fetch_query("SELECT version FROM schema_version ORDER BY version")
+    return [row['version'] for row in rows]
+
+
+def test_every_migration_is_recorded(db):
+    assert recorded_versions(db) == [migration['version'] for migration in MIGRATIONS]
+
+
+def test_a_current_schema_is_left_alone(db, capsys):
+    capsys.readouterr()
+    again = DatabaseManager(db.config, backend='sqlite')
+    assert "Applying migration" not in capsys.readouterr().out
+    assert recorded_versions(again) == recorded_versions(db)
+    again.close()
+
+
+def test_running_a_migration_twice_is_harmless(db, capsys):
+    last = MIGRATIONS[-1]['version']
+    db.execute_query("DELETE FROM schema_version WHERE version = %s", (last,))
+    capsys.readouterr()
+    again = DatabaseManager(db.config, backend='sqlite')
+    assert capsys.readouterr().out.count("Applying migration") == 1
+    assert recorded_versions(again)[-1] == last
+    assert [row['name'] for row in again.get_menu_items()] == ['Burger', 'Soda']
+    again.close()
+
+
+# --- STREAMING QUERIES ---
+MENU_QUERY = "SELECT item_id, name FROM menu_items ORDER BY item_id"
+
+
+def test_iter_query_row_formats(db):
+    assert list(db.iter_query(MENU_QUERY, batch_size=1)) == [{'item_id': 1, 'name': 'Burger'},
+                                                             {'item_id': 2, 'name': 'Soda'}]
+    assert list(db.iter_query(MENU_QUERY, rows='tuple')) == [(1, 'Burger'), (2, 'Soda')]
+    rows = list(db.iter_query(MENU_QUERY, rows='namedtuple'))
+    assert [(row.item_id, row.name) for row in rows] == [(1, 'Burger'), (2, 'Soda')]
+    with pytest.raises(ValueError):
+        db.iter_query(MENU_QUERY, rows='list')
+
+
+def test_iter_query_raises_errors_and_frees_its_connection(db):
+    with pytest.raises(db.backend.Error):
+        list(db.iter_query("SELECT nothing FROM nowhere"))
+    single = DatabaseManager(db.config, pool_config={'size': 1, 'timeout': 0.5}, backend='sqlite')
+    scan = single.iter_query(MENU_QUERY, rows='tuple', batch_size=1)
+    assert next(scan) == (1, 'Burger')
+    scan.close() # Stopped early: the pool's only connection must come back
+    assert single.get_menu_categories() == ['drinks', 'mains']
+    single.close()